@@ -0,0 +1 @@
+"""POMS domain modules shared by the Streamlit app (poms_app.py) and the batch CLI (python -m poms)."""
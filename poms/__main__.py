@@ -0,0 +1,125 @@
+"""Headless batch jobs over the app's shard store: `python -m poms batch <job> [options]`.
+
+Jobs run without Streamlit against the same store, audit trail and backups as the app
+(run them from the app's working directory, or pass --root). They are meant for cron:
+
+    python -m poms batch room-accrual --all-wards
+    python -m poms batch report --ward "Pediatric Oncology" --out report.json
+    python -m poms batch integrity --all-wards --repair
+    python -m poms batch export --out - > ward.json
+
+The exit status is 1 if an integrity check found problems it did not repair, 2 on bad
+arguments or an exceeded time limit.
+"""
+import argparse
+import json
+import signal
+import sys
+import time
+from datetime import date
+
+from poms.services import WardSession, accrue_rooms, build_report, check_ward, export_ward
+from poms.storage import DEFAULT_WARD, ShardedStore
+
+SHARD_DIR = "poms_shards"  # the app's default shard root
+
+JOBS = {
+    "room-accrual": lambda session, args: accrue_rooms(session, args.date, dry_run=args.dry_run),
+    "report": lambda session, args: build_report(session, args.date, args.days),
+    "integrity": lambda session, args: check_ward(session, repair=args.repair),
+    "export": lambda session, args: export_ward(session),
+}
+WRITES_FILE = ("report", "export")  # jobs whose result is written to --out
+
+
+class TimeLimitExceeded(Exception):
+    pass
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m poms", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    batch = commands.add_parser("batch", help="run a batch job against the shard store")
+    batch.add_argument("job", choices=sorted(JOBS))
+    batch.add_argument("--root", default=SHARD_DIR, help=f"shard store directory (default: {SHARD_DIR})")
+    wards = batch.add_mutually_exclusive_group()
+    wards.add_argument("--ward", help="ward to run on (default: the first ward in the store)")
+    wards.add_argument("--all-wards", action="store_true", help="run on every ward in turn")
+    batch.add_argument("--date", type=date.fromisoformat, help="business date, YYYY-MM-DD (default: today)")
+    batch.add_argument("--days", type=int, default=30, help="report: room utilisation window in days (default: 30)")
+    batch.add_argument("--out", help="report/export: output file, '-' for stdout (default: none)")
+    batch.add_argument("--dry-run", action="store_true", help="room-accrual: list the charges without saving them")
+    batch.add_argument("--repair", action="store_true", help="integrity: repair dangling references and save")
+    batch.add_argument("--actor", default="batch", help="user recorded in the audit trail (default: batch)")
+    batch.add_argument("--max-memory-mb", type=int, help="address-space limit for the job (where supported)")
+    batch.add_argument("--time-limit", type=int, help="abort the job after this many seconds (where supported)")
+    return parser.parse_args(argv)
+
+
+def apply_limits(max_memory_mb=None, time_limit=None):
+    """Caps the process with setrlimit/alarm; silently skipped on platforms without them."""
+    if max_memory_mb:
+        try:
+            import resource
+        except ImportError:
+            resource = None
+        if resource is not None:
+            limit = max_memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    if time_limit and hasattr(signal, "SIGALRM"):
+        def on_alarm(signum, frame):
+            raise TimeLimitExceeded(f"time limit of {time_limit}s exceeded")
+        signal.signal(signal.SIGALRM, on_alarm)
+        signal.alarm(time_limit)
+
+
+def write_output(out, results):
+    """Writes one ward's result as-is, or {ward: result} for several."""
+    payload = next(iter(results.values())) if len(results) == 1 else results
+    text = json.dumps(payload, indent=2, default=str)
+    if out == "-":
+        sys.stdout.write(text + "\n")
+    else:
+        with open(out, "w") as f:
+            f.write(text)
+
+
+def run_batch(args):
+    store = ShardedStore(args.root)
+    wards = store.list_wards() or [DEFAULT_WARD]
+    if args.ward:
+        if not store.has_ward(args.ward):
+            print(f"No ward named {args.ward!r} in {args.root}", file=sys.stderr)
+            return 2
+        wards = [args.ward]
+    elif not args.all_wards:
+        wards = wards[:1]
+    log = sys.stderr if args.out == "-" else sys.stdout  # keep stdout clean for the JSON
+    results, failed = {}, False
+    for ward in wards:
+        started = time.perf_counter()
+        summary, result = JOBS[args.job](WardSession(args.root, ward, actor=args.actor), args)
+        print(f"[{args.job}] {ward}: {summary} ({time.perf_counter() - started:.2f}s)", file=log)
+        if args.job == "integrity" and not result.ok and not args.repair:
+            failed = True
+        results[ward] = result
+    if args.out and args.job in WRITES_FILE:
+        write_output(args.out, results)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    apply_limits(args.max_memory_mb, args.time_limit)
+    try:
+        return run_batch(args)
+    except TimeLimitExceeded as e:
+        print(f"[{args.job}] aborted: {e}", file=sys.stderr)
+        return 2
+    except MemoryError:
+        print(f"[{args.job}] aborted: memory limit of {args.max_memory_mb} MB exceeded", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
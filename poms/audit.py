@@ -0,0 +1,219 @@
+"""Append-only audit trail: one NDJSON segment per day plus small index sidecars.
+
+Each mutation appends one compact line to `YYYY-MM-DD.ndjson` (a create keeps the new
+record, a delete the old one, an update only the changed fields as [before, after]).
+Alongside it, `YYYY-MM-DD.idx` gets one line `[entity, entity_id, action, offset]`, so the
+in-memory indexes by entity id and by (date, action) can be rebuilt from the sidecars
+without reading the segments. Appends are O(1); queries seek straight to the matching lines.
+
+Several processes may append to one trail (the app and the batch CLI): an append holds an
+flock on the day's segment (where the platform has it), and every query first indexes the
+sidecar lines other processes appended since - only sidecars whose size or mtime changed
+are read, from where the last read stopped.
+"""
+import json
+import os
+import threading
+from dataclasses import fields
+from datetime import date, datetime
+
+from poms.events import RecordsDeleted, RecordsUpdated, event_record
+from poms.storage import ID_FIELDS
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): appends are serialised within the process only
+    fcntl = None
+
+ACTIONS = ("create", "update", "delete", "discharge", "assign", "vacate", "import", "clear", "restore")
+_CREATE_SUFFIXES = ("Created", "Admitted", "Scheduled", "Recorded")
+
+
+def record_diff(before, after):
+    """{field: [old, new]} for the fields whose value changed."""
+    keys = list(before) + [k for k in after if k not in before]
+    return {k: [before.get(k), after.get(k)] for k in keys if before.get(k) != after.get(k)}
+
+
+def entry_from_event(event):
+    """Maps a domain event to (action, entity, entity_id, changes), or None if it is not audited."""
+    name = event.name
+    values = {f.name: getattr(event, f.name) for f in fields(event) if f.init}
+    if name == "DataReplaced":
+        return (values["source"] if values["source"] in ACTIONS else "import"), "ward", None, {}
+    changed = event_record(event)
+    if changed is None:
+        return None
+    entity, record = changed
+    entity_id = record.get(ID_FIELDS[entity])
+    if name == "RoomAssigned":
+        return "assign", entity, entity_id, {"patient_id": [None, values["patient_id"]],
+                                             "from_room_id": values["from_room_id"]}
+    if name == "RoomVacated":
+        return "vacate", entity, entity_id, {"patient_id": [values["patient_id"], None]}
+    if name == "PatientDischarged":
+        return "discharge", entity, entity_id, {"discharge_date": record.get("discharge_date")}
+    if name.endswith("Updated"):
+        return "update", entity, entity_id, record_diff(values["before"], record)
+    if name.endswith("Deleted"):
+        return "delete", entity, entity_id, {"before": record}
+    if name.endswith(_CREATE_SUFFIXES):
+        return "create", entity, entity_id, {"after": record}
+    return None
+
+
+def entries_from_event(event):
+    """Like entry_from_event, as a list: bulk events give one entry per record they touched."""
+    if isinstance(event, RecordsUpdated):
+        id_field = ID_FIELDS[event.collection]
+        entries = []
+        for before, record in zip(event.before, event.records):
+            entries.append(("update", event.collection, record.get(id_field), record_diff(before, record)))
+            if event.action == "discharge":  # as a single discharge: PatientUpdated, then PatientDischarged
+                entries.append(("discharge", event.collection, record.get(id_field),
+                                {"discharge_date": record.get("discharge_date")}))
+        return entries
+    if isinstance(event, RecordsDeleted):
+        id_field = ID_FIELDS[event.collection]
+        return [("delete", event.collection, record.get(id_field), {"before": record}) for record in event.records]
+    entry = entry_from_event(event)
+    return [entry] if entry is not None else []
+
+
+class AuditLog:
+    """Daily NDJSON segments with entity-id and date/action indexes kept in memory."""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self.by_entity = {}  # (entity, entity_id) -> [(day, offset), ...]
+        self.by_day = {}     # day -> {action: [offset, ...]}
+        self.entries = 0
+        self._sidecars = {}  # day -> (size, mtime_ns, bytes indexed) of its .idx file as last read
+        os.makedirs(root, exist_ok=True)
+        self.refresh()
+
+    def _segment_path(self, day, ext="ndjson"):
+        return os.path.join(self.root, f"{day}.{ext}")
+
+    def _index(self, day, entity, entity_id, action, offset):
+        self.by_entity.setdefault((entity, entity_id), []).append((day, offset))
+        self.by_day.setdefault(day, {}).setdefault(action, []).append(offset)
+        self.entries += 1
+
+    def _drop_day(self, day):
+        """Forgets a day's index entries (its sidecar was rewritten, not appended to)."""
+        self.entries -= sum(len(offsets) for offsets in self.by_day.pop(day, {}).values())
+        for key, positions in list(self.by_entity.items()):
+            kept = [position for position in positions if position[0] != day]
+            if len(kept) != len(positions):
+                if kept:
+                    self.by_entity[key] = kept
+                else:
+                    del self.by_entity[key]
+
+    def _catch_up(self, day):
+        """Indexes the lines appended to the day's sidecar since it was last read (call under the lock)."""
+        path = self._segment_path(day, "idx")
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        size, mtime, done = self._sidecars.get(day, (0, None, 0))
+        if (stat.st_size, stat.st_mtime_ns) == (size, mtime):
+            return
+        if stat.st_size < done:
+            self._drop_day(day)
+            done = 0
+        with open(path, 'rb') as f:
+            f.seek(done)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]  # a line still being written is read next time
+        for line in complete.splitlines():
+            entity, entity_id, action, offset = json.loads(line)
+            self._index(day, entity, entity_id, action, offset)
+        self._sidecars[day] = (stat.st_size, stat.st_mtime_ns, done + len(complete))
+
+    def refresh(self):
+        """Indexes entries other processes (e.g. batch jobs) appended since the sidecars were last read."""
+        with self._lock:
+            for name in sorted(os.listdir(self.root)):
+                if name.endswith(".idx"):
+                    self._catch_up(name[:-4])
+
+    def append(self, action, entity, entity_id, changes, actor=None, ward=None, timestamp=None):
+        """Appends one entry to today's segment and its index sidecar."""
+        return self.append_many([(action, entity, entity_id, changes)], actor, ward, timestamp)[0]
+
+    def append_many(self, entries, actor=None, ward=None, timestamp=None):
+        """Appends (action, entity, entity_id, changes) entries with one write per file (bulk actions)."""
+        timestamp = timestamp or datetime.now()
+        day = timestamp.date().isoformat()
+        written = [{
+            "ts": timestamp.isoformat(timespec='seconds'),
+            "actor": actor,
+            "ward": ward,
+            "action": action,
+            "entity": entity,
+            "id": entity_id,
+            "changes": changes,
+        } for action, entity, entity_id, changes in entries]
+        lines = [(json.dumps(entry, separators=(',', ':'), default=str) + "\n").encode('utf-8') for entry in written]
+        with self._lock:
+            with open(self._segment_path(day), 'ab') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)  # released on close, after the sidecar is written
+                offset = f.seek(0, os.SEEK_END)  # another process may have appended since open
+                f.write(b"".join(lines))
+                f.flush()
+                index_lines = []
+                for entry, line in zip(written, lines):
+                    index_lines.append(json.dumps([entry["entity"], entry["id"], entry["action"], offset]) + "\n")
+                    offset += len(line)
+                with open(self._segment_path(day, "idx"), 'a') as idx:
+                    idx.write("".join(index_lines))
+            self._catch_up(day)  # indexes these entries (and any appended by other processes before them)
+        return written
+
+    def _read(self, day, offsets):
+        with open(self._segment_path(day), 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                yield json.loads(f.readline())
+
+    def query(self, entity=None, entity_id=None, actions=None, start=None, end=None):
+        """Entries matching every given filter, oldest first. `start`/`end` are inclusive dates.
+
+        With an entity id only that record's lines are read; otherwise only the segments in
+        the date range, and within them only the offsets indexed under the wanted actions.
+        """
+        start = start.isoformat() if isinstance(start, date) else start
+        end = end.isoformat() if isinstance(end, date) else end
+        wanted = set(actions) if actions else None
+        self.refresh()
+        with self._lock:
+            if entity is not None and entity_id is not None:
+                by_day = {}
+                for day, offset in self.by_entity.get((entity, entity_id), []):
+                    by_day.setdefault(day, []).append(offset)
+            else:
+                by_day = {day: sorted(o for action, offs in per_action.items()
+                                      if wanted is None or action in wanted for o in offs)
+                          for day, per_action in self.by_day.items()}
+        results = []
+        for day in sorted(by_day):
+            if (start and day < start) or (end and day > end) or not by_day[day]:
+                continue
+            for entry in self._read(day, by_day[day]):
+                if wanted is not None and entry["action"] not in wanted:
+                    continue
+                if entity is not None and entry["entity"] != entity:
+                    continue
+                results.append(entry)
+        return results
+
+    def days(self):
+        """Dates that have a segment, newest first."""
+        self.refresh()
+        return sorted(self.by_day, reverse=True)
+
@@ -0,0 +1,201 @@
+"""Rotating compressed backups of each ward: periodic full snapshots plus incremental diffs.
+
+A ward's backups form chains: one gzipped full copy of every collection, followed by
+diffs that hold only the records added or changed (keyed by primary key) and the ids
+deleted since the previous backup. After `full_every` diffs the next backup starts a new
+chain, and only the newest `keep_chains` chains are kept, so storage grows with the rate
+of change rather than with dataset size times the number of backups.
+
+The background writer reports each completed save with `record_save`; the saved
+collections are marked dirty and backed up (read back from the shard) once
+`min_interval` seconds have passed since the ward's last backup. `snapshot` forces a
+backup, e.g. before an import or a clear. `restore` replays a chain up to the chosen
+backup - the ward's own collections, unless the shared doctors are asked for
+explicitly (they belong to every ward). Each ward directory keeps an `index.json` describing its backup files.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+from poms.storage import COLLECTIONS, ID_FIELDS, WARD_COLLECTIONS
+
+DEFAULT_FULL_EVERY = 24  # diffs after a full snapshot before the next full one
+DEFAULT_KEEP_CHAINS = 7  # full snapshots (each with its diffs) kept per ward
+DEFAULT_MIN_INTERVAL = 300  # seconds between automatic backups of a ward
+INDEX_FILE = "index.json"
+
+
+def _slug(ward):
+    return re.sub(r'[^a-z0-9]+', '_', ward.lower()).strip('_') or 'ward'
+
+
+def _keyed(collection, records):
+    id_field = ID_FIELDS[collection]
+    return {r.get(id_field): r for r in records}
+
+
+def diff_collection(collection, before, after):
+    """{'upsert': records added or changed, 'delete': ids removed} between two keyed states, or None if equal."""
+    upsert = [r for key, r in after.items() if before.get(key) != r]
+    delete = [key for key in before if key not in after]
+    if not upsert and not delete:
+        return None
+    return {"upsert": upsert, "delete": delete}
+
+
+def apply_diff(collection, state, change):
+    """Applies one collection diff to a keyed state in place (changed records keep their position)."""
+    id_field = ID_FIELDS[collection]
+    for key in change["delete"]:
+        state.pop(key, None)
+    for record in change["upsert"]:
+        state[record.get(id_field)] = record
+
+
+class BackupManager:
+    """Backups of every ward under `root`, shared by the sessions and the writer thread."""
+
+    def __init__(self, root, store, full_every=DEFAULT_FULL_EVERY, keep_chains=DEFAULT_KEEP_CHAINS,
+                 min_interval=DEFAULT_MIN_INTERVAL):
+        self.root = root
+        self.store = store
+        self.full_every = full_every
+        self.keep_chains = keep_chains
+        self.min_interval = min_interval
+        self.last_error = None
+        self._state = {}  # ward -> {collection: {id: record}} as of the ward's latest backup
+        self._dirty = {}  # ward -> collections saved since the latest backup
+        self._last_backup = {}  # ward -> monotonic time of the latest backup
+        self._lock = threading.RLock()
+
+    # --- Files ---
+    def _dir(self, ward):
+        return os.path.join(self.root, _slug(ward))
+
+    def backups(self, ward):
+        """The ward's backups, oldest first: dicts with seq, kind, file, taken_at, reason, bytes and records."""
+        path = os.path.join(self._dir(ward), INDEX_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_index(self, ward, entries):
+        path = os.path.join(self._dir(ward), INDEX_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=1)
+        os.replace(f"{path}.tmp", path)
+
+    def _write(self, ward, entries, kind, reason, collections):
+        seq = entries[-1]["seq"] + 1 if entries else 1
+        taken_at = datetime.now()
+        name = f"{seq:06d}-{kind}-{taken_at:%Y%m%d-%H%M%S}.json.gz"
+        path = os.path.join(self._dir(ward), name)
+        os.makedirs(self._dir(ward), exist_ok=True)
+        payload = {"ward": ward, "kind": kind, "taken_at": taken_at.isoformat(timespec='seconds'), "collections": collections}
+        with gzip.open(f"{path}.tmp", "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(payload, f, separators=(',', ':'), default=str)
+        os.replace(f"{path}.tmp", path)
+        if kind == "full":
+            records = sum(len(records) for records in collections.values())
+        else:
+            records = sum(len(c["upsert"]) + len(c["delete"]) for c in collections.values())
+        entry = {"seq": seq, "kind": kind, "file": name, "taken_at": payload["taken_at"], "reason": reason,
+                 "bytes": os.path.getsize(path), "records": records}
+        entries.append(entry)
+        self._prune(ward, entries)
+        self._save_index(ward, entries)
+        return entry
+
+    def _read(self, ward, entry):
+        with gzip.open(os.path.join(self._dir(ward), entry["file"]), "rt", encoding="utf-8") as f:
+            return json.load(f)["collections"]
+
+    def _prune(self, ward, entries):
+        """Retention: drops every chain older than the newest `keep_chains` full snapshots."""
+        fulls = [i for i, entry in enumerate(entries) if entry["kind"] == "full"]
+        if len(fulls) <= self.keep_chains:
+            return
+        cut = fulls[-self.keep_chains]
+        for entry in entries[:cut]:
+            try:
+                os.remove(os.path.join(self._dir(ward), entry["file"]))
+            except FileNotFoundError:
+                pass
+        del entries[:cut]
+
+    # --- Taking backups ---
+    def record_save(self, ward, collections):
+        """Writer hook: marks `collections` dirty and backs the ward up if `min_interval` has passed."""
+        with self._lock:
+            self._dirty.setdefault(ward, set()).update(collections)
+            last = self._last_backup.get(ward)
+            if last is not None and time.monotonic() - last < self.min_interval:
+                return None
+        return self.snapshot(ward, reason="periodic")
+
+    def snapshot(self, ward, reason="manual", full=False):
+        """Backs up the ward now (a diff, or a full snapshot when a chain is due); None if nothing changed."""
+        try:
+            with self._lock:
+                entries = self.backups(ward)
+                state = self._state.get(ward)
+                if state is None and entries:
+                    state = self._state[ward] = {name: _keyed(name, records)
+                                                 for name, records in self._replay(ward, entries, entries[-1]["seq"]).items()}
+                chain_length = len(entries) - max((i for i, e in enumerate(entries) if e["kind"] == "full"), default=len(entries))
+                if full or state is None or chain_length > self.full_every:
+                    data = self.store.load_ward(ward)
+                    entry = self._write(ward, entries, "full", reason, data)
+                    self._state[ward] = {name: _keyed(name, records) for name, records in data.items()}
+                else:
+                    dirty = self._dirty.get(ward, set()) if reason == "periodic" else set(COLLECTIONS)
+                    changes = {}
+                    for name, records in self.store.load_collections(ward, sorted(dirty)).items():
+                        after = _keyed(name, records)
+                        change = diff_collection(name, state.get(name, {}), after)
+                        if change is not None:
+                            changes[name] = change
+                            state[name] = after
+                    entry = self._write(ward, entries, "diff", reason, changes) if changes else None
+                self._dirty.pop(ward, None)
+                self._last_backup[ward] = time.monotonic()
+                self.last_error = None
+                return entry
+        except Exception as e:  # a failed backup must never fail the save that triggered it
+            self.last_error = f"{ward}: {e}"
+            return None
+
+    # --- Restoring ---
+    def _replay(self, ward, entries, seq):
+        start = max(i for i, e in enumerate(entries) if e["kind"] == "full" and e["seq"] <= seq)
+        state = {}
+        for entry in entries[start:]:
+            if entry["seq"] > seq:
+                break
+            collections = self._read(ward, entry)
+            if entry["kind"] == "full":
+                state = {name: _keyed(name, records) for name, records in collections.items()}
+                continue
+            for name, change in collections.items():
+                apply_diff(name, state.setdefault(name, {}), change)
+        return {name: list(keyed.values()) for name, keyed in state.items()}
+
+    def restore(self, ward, seq, collections=WARD_COLLECTIONS):
+        """`collections` of the ward as of backup `seq`, rebuilt from its chain's full snapshot and diffs.
+
+        Only the ward's own collections by default: the shared doctors backed up with a ward
+        are the hospital-wide list as it was then, and restoring them rolls back every ward."""
+        with self._lock:
+            entries = self.backups(ward)
+            if not any(e["seq"] == seq for e in entries):
+                raise KeyError(f"No backup {seq} for {ward}")
+            state = self._replay(ward, entries, seq)
+            return {name: state.get(name, []) for name in collections}
+
+    def storage_bytes(self, ward):
+        return sum(entry["bytes"] for entry in self.backups(ward))
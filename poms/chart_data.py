@@ -0,0 +1,111 @@
+"""Chart data pipeline: pick an aggregation level for the requested range, then cap the points.
+
+A long daily series is first rolled up to the finest calendar level (day, week, month,
+quarter, year) that fits the chart's bucket budget over the range it covers. If a series
+is still over the point budget (for example an explicit "Daily" over several years), it
+is downsampled: LTTB (largest-triangle-three-buckets) keeps the visual shape of a line,
+bucket min/max keeps every spike. Both are vectorised per bucket, so the browser never
+receives more than about `max_points` points per series whatever the data size.
+"""
+import numpy as np
+
+from poms.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+LEVELS = ("Daily", "Weekly", "Monthly", "Quarterly", "Yearly")
+LEVEL_CHOICES = ("Auto",) + LEVELS
+LEVEL_RULES = {"Daily": "D", "Weekly": "W-MON", "Monthly": "MS", "Quarterly": "QS", "Yearly": "YS"}
+LEVEL_DAYS = {"Daily": 1, "Weekly": 7, "Monthly": 30.44, "Quarterly": 91.31, "Yearly": 365.25}
+LEVEL_AXIS = {"Daily": "Day", "Weekly": "Week", "Monthly": "Month", "Quarterly": "Quarter", "Yearly": "Year"}
+DEFAULT_MAX_POINTS = 500  # per series sent to the browser
+
+
+def choose_level(start, end, max_buckets, levels=LEVELS):
+    """The finest level in `levels` with at most `max_buckets` buckets over [start, end]."""
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    for level in levels:
+        if days / LEVEL_DAYS[level] <= max_buckets:
+            return level
+    return levels[-1]
+
+
+def aggregate(frame, date_col, value_cols, level, how="sum"):
+    """Rolls `frame` up to `level` buckets of `date_col`, labelled by bucket start (empty buckets included).
+
+    Use how='sum' for counts and amounts, how='mean' for levels such as occupied beds."""
+    dates = pd.to_datetime(frame[date_col])
+    rolled = (frame.assign(**{date_col: dates}).set_index(date_col)[list(value_cols)]
+              .resample(LEVEL_RULES[level], label="left", closed="left").agg(how))
+    if how == "sum":
+        rolled = rolled.fillna(0)
+    return rolled.reset_index()
+
+
+def lttb_indices(x, y, max_points):
+    """Row positions kept by LTTB: the first and last point plus one per bucket in between."""
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)  # max_points - 2 buckets over 1..n-2
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Twice the triangle area between the last kept point, each candidate and the next bucket's centroid
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def minmax_indices(y, max_points):
+    """Row positions of the minimum and maximum of each of max_points / 2 buckets, in order."""
+    n = len(y)
+    if n <= max_points or max_points < 2:
+        return np.arange(n)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    edges = np.linspace(0, n, max_points // 2 + 1).astype(np.int64)
+    keep = set()
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        keep.add(lo + int(np.argmin(y[lo:hi])))
+        keep.add(lo + int(np.argmax(y[lo:hi])))
+    return np.array(sorted(keep), dtype=np.int64)
+
+
+def downsample(frame, x_col, value_cols, max_points=DEFAULT_MAX_POINTS, method="lttb"):
+    """Rows of `frame` kept so each value column has at most about `max_points` points.
+
+    Positions chosen for each column are unioned, so series plotted together keep a shared x."""
+    if len(frame) <= max_points:
+        return frame
+    x = pd.to_datetime(frame[x_col]).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    keep = set()
+    for col in value_cols:
+        y = frame[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        positions = lttb_indices(x, y, max_points) if method == "lttb" else minmax_indices(y, max_points)
+        keep.update(positions.tolist())
+    return frame.iloc[sorted(keep)].reset_index(drop=True)
+
+
+def prepare_series(frame, date_col, value_cols, level="Auto", how="sum", max_buckets=DEFAULT_MAX_POINTS,
+                   levels=LEVELS, start=None, end=None, max_points=DEFAULT_MAX_POINTS, method="lttb"):
+    """Aggregates a dated frame to `level` (or the level 'Auto' picks for the range) and caps its points.
+
+    Returns (frame, level, downsampled). The range defaults to the span of `date_col`."""
+    if frame.empty:
+        return frame, (levels[0] if level == "Auto" else level), False
+    if level == "Auto":
+        dates = pd.to_datetime(frame[date_col])
+        level = choose_level(start if start is not None else dates.min(), end if end is not None else dates.max(),
+                             max_buckets, levels)
+    rolled = aggregate(frame, date_col, value_cols, level, how)
+    capped = downsample(rolled, date_col, value_cols, max_points, method)
+    return capped, level, len(capped) < len(rolled)
@@ -0,0 +1,249 @@
+"""Columnar in-memory tables for the page views.
+
+A `ColumnarTable` keeps one preallocated NumPy buffer per field instead of one dict per
+row: low-cardinality text fields are stored as categorical codes, ids and ages as
+nullable integers (values + mask), money as float64 and everything else as objects. A
+numeric column that meets a value of another type (e.g. a string id from an imported
+file) becomes an object column, so values are stored as given, never converted.
+Appends grow the buffers geometrically, updates write in place and deletes shift the
+tail down, so row order matches the source list. `frame()` hands out a shallow copy of a
+DataFrame wrapping the live slices: no row data is copied, and because the copy shares
+its blocks with the cached base frame, pandas Copy-on-Write copies a column before any
+page-side edit could write into the buffers.
+
+The tables are a read model: the session's lists of dicts stay the source of truth for
+forms, saves and events, and each table mirrors one of them. They make page views cheap
+(no DataFrame is rebuilt from dicts on a rerun) at the cost of a second, compact copy of
+the data, so a loaded collection takes more memory than the dicts alone, not less.
+"""
+import numpy as np
+
+from poms.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+CATEGORICAL_FIELDS = {"status", "gender", "room_type", "diagnosis_type", "specialization", "occupancy_status"}
+FLOAT_FIELDS = {"amount", "cost_per_day"}
+INITIAL_CAPACITY = 64
+
+
+def _kind(field):
+    if field in CATEGORICAL_FIELDS:
+        return "category"
+    if field in FLOAT_FIELDS:
+        return "float"
+    if field.endswith("_id") or field == "age":
+        return "int"
+    return "object"
+
+
+class _Column:
+    """Growable buffer for one field; `kind` is 'category', 'int', 'float' or 'object'."""
+
+    def __init__(self, kind, capacity):
+        self.kind = kind
+        self.categories = []
+        self._codes = {}
+        if kind == "category":
+            self.values = np.full(capacity, -1, dtype=np.int32)
+        elif kind == "int":
+            self.values = np.zeros(capacity, dtype=np.int64)
+            self.mask = np.ones(capacity, dtype=bool)
+        elif kind == "float":
+            self.values = np.full(capacity, np.nan, dtype=np.float64)
+        else:
+            self.values = np.full(capacity, None, dtype=object)
+
+    def grow(self, capacity):
+        old = len(self.values)
+        fill = {"category": -1, "int": 0, "float": np.nan, "object": None}[self.kind]
+        values = np.full(capacity, fill, dtype=self.values.dtype)
+        values[:old] = self.values
+        self.values = values
+        if self.kind == "int":
+            mask = np.ones(capacity, dtype=bool)
+            mask[:old] = self.mask
+            self.mask = mask
+
+    def set(self, row, value):
+        """Stores `value` at `row`, which may also be an array of rows (one fancy-index write)."""
+        if self.kind == "category":
+            if value is None:
+                self.values[row] = -1
+                return
+            code = self._codes.get(value)
+            if code is None:
+                code = self._codes[value] = len(self.categories)
+                self.categories.append(value)
+            self.values[row] = code
+        elif self.kind == "int":
+            missing = value is None or value == ""
+            if not missing and type(value) is not int:
+                self._to_object()
+                self.values[row] = value
+                return
+            self.mask[row] = missing
+            self.values[row] = 0 if missing else value
+        elif self.kind == "float":
+            missing = value is None or value == ""
+            if not missing and type(value) not in (int, float):
+                self._to_object()
+                self.values[row] = value
+                return
+            self.values[row] = np.nan if missing else float(value)
+        else:
+            self.values[row] = value
+
+    def _to_object(self):
+        """Turns a numeric column into an object column holding the same values (missing ones as None)."""
+        values = self.values.astype(object)
+        missing = self.mask if self.kind == "int" else np.isnan(self.values)
+        values[missing] = None
+        self.values = values
+        self.kind = "object"
+
+    def copy(self):
+        clone = _Column.__new__(_Column)
+        clone.kind = self.kind
+        clone.categories = list(self.categories)
+        clone._codes = dict(self._codes)
+        clone.values = self.values.copy()
+        if self.kind == "int":
+            clone.mask = self.mask.copy()
+        return clone
+
+    def shift_down(self, row, n):
+        """Removes `row` by moving rows row+1..n-1 up one slot (a memmove for numeric buffers)."""
+        self.values[row:n - 1] = self.values[row + 1:n]
+        if self.kind == "int":
+            self.mask[row:n - 1] = self.mask[row + 1:n]
+        self.set(n - 1, None)
+
+    def compact(self, keep, n):
+        """Keeps the first n rows where `keep` is True, in order, and clears the freed tail."""
+        m = int(keep.sum())
+        self.values[:m] = self.values[:n][keep]
+        if self.kind == "int":
+            self.mask[:m] = self.mask[:n][keep]
+            self.mask[m:n] = True
+        fill = {"category": -1, "int": 0, "float": np.nan, "object": None}[self.kind]
+        self.values[m:n] = fill
+
+    def view(self, n):
+        if self.kind == "category":
+            dtype = pd.CategoricalDtype(self.categories)
+            return pd.Categorical.from_codes(self.values[:n], dtype=dtype, validate=False)
+        if self.kind == "int":
+            return pd.arrays.IntegerArray(self.values[:n], self.mask[:n])
+        if self.kind == "object":
+            return pd.Series(self.values[:n], dtype=object, copy=False)
+        return self.values[:n]
+
+
+class ColumnarTable:
+    """One collection as typed column buffers, keyed by its primary-key field."""
+
+    def __init__(self, id_field, records=()):
+        self.id_field = id_field
+        self.capacity = INITIAL_CAPACITY
+        self.n = 0
+        self.columns = {}  # field -> _Column, in first-seen order
+        self._row_of = {}  # primary key -> row number
+        self._keys = []  # row number -> primary key
+        self.version = 0
+        self._base = None  # (version, DataFrame over the buffers)
+        self.source = None  # the record list this table mirrors, set by the owner
+        self._add_column(id_field)
+        for record in records:
+            self.upsert(record)
+
+    def __len__(self):
+        return self.n
+
+    def _add_column(self, field):
+        column = _Column(_kind(field), self.capacity)
+        self.columns[field] = column
+        return column
+
+    def upsert(self, record):
+        """Appends a new record or overwrites the row with the same primary key in place."""
+        key = record.get(self.id_field)
+        row = self._row_of.get(key)
+        if row is None:
+            if self.n == self.capacity:
+                self.capacity *= 2
+                for column in self.columns.values():
+                    column.grow(self.capacity)
+            row = self.n
+            self.n += 1
+            self._row_of[key] = row
+            self._keys.append(key)
+        for field, value in record.items():
+            column = self.columns.get(field) or self._add_column(field)
+            column.set(row, value)
+        self.version += 1
+
+    def fork(self):
+        """An independent copy to update when this table is shared (buffers are memcpy'd, not rebuilt)."""
+        clone = ColumnarTable.__new__(ColumnarTable)
+        clone.__dict__.update(self.__dict__)
+        clone.columns = {field: column.copy() for field, column in self.columns.items()}
+        clone._row_of = dict(self._row_of)
+        clone._keys = list(self._keys)
+        clone._base = None
+        return clone
+
+    def delete(self, key):
+        """Removes the row with this primary key, keeping the remaining rows in order."""
+        row = self._row_of.pop(key, None)
+        if row is None:
+            return
+        for column in self.columns.values():
+            column.shift_down(row, self.n)
+        self.n -= 1
+        del self._keys[row]
+        for r in range(row, self.n):  # only the rows after the deleted one move up
+            self._row_of[self._keys[r]] = r
+        self.version += 1
+
+    def rows_of(self, keys):
+        """Row numbers of the given primary keys (unknown keys are skipped), in the order given."""
+        return np.fromiter((self._row_of[k] for k in keys if k in self._row_of), dtype=np.int64)
+
+    def assign(self, keys, changes):
+        """Writes the same field values into many rows: one vectorised write per changed column."""
+        rows = self.rows_of(keys)
+        if len(rows) == 0:
+            return
+        for field, value in changes.items():
+            column = self.columns.get(field) or self._add_column(field)
+            column.set(rows, value)
+        self.version += 1
+
+    def delete_many(self, keys):
+        """Removes many rows in one compaction pass per column instead of one shift per row."""
+        rows = self.rows_of(keys)
+        if len(rows) == 0:
+            return
+        keep = np.ones(self.n, dtype=bool)
+        keep[rows] = False
+        for column in self.columns.values():
+            column.compact(keep, self.n)
+        self._keys = [key for key, kept in zip(self._keys, keep) if kept]
+        self._row_of = {key: i for i, key in enumerate(self._keys)}
+        self.n = len(self._keys)
+        self.version += 1
+
+    def frame(self):
+        """A zero-copy DataFrame view of the table; edits to it never reach the buffers."""
+        if self._base is None or self._base[0] != self.version:
+            base = pd.DataFrame({field: column.view(self.n) for field, column in self.columns.items()}, copy=False)
+            self._base = (self.version, base)
+        return self._base[1].copy(deep=False)
+
+    def memory_bytes(self):
+        """Bytes held by the column buffers (object columns count their pointer arrays only)."""
+        total = 0
+        for column in self.columns.values():
+            total += column.values.nbytes + (column.mask.nbytes if column.kind == "int" else 0)
+        return total
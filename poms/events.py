@@ -0,0 +1,283 @@
+"""In-process domain event bus.
+
+Every create, update and delete publishes a typed event. Subscribers are either
+*immediate* (cheap index maintenance that must be current for the rest of the rerun)
+or *deferred* (billing rules, persistence). Deferred subscribers run when the
+outermost unit of work ends, in priority order, each receiving the batch of events
+it subscribed to - so e.g. persistence writes once per form submit, after the
+billing rules have added their bills.
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Optional
+
+
+@dataclass(frozen=True)
+class DomainEvent:
+    occurred_at: datetime = field(default_factory=datetime.now, init=False)
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+
+# --- Patients ---
+@dataclass(frozen=True)
+class PatientAdmitted(DomainEvent):
+    patient: dict
+
+
+@dataclass(frozen=True)
+class PatientUpdated(DomainEvent):
+    before: dict
+    patient: dict
+
+
+@dataclass(frozen=True)
+class PatientDischarged(DomainEvent):
+    patient: dict
+
+
+@dataclass(frozen=True)
+class PatientDeleted(DomainEvent):
+    patient: dict
+
+
+# --- Doctors ---
+@dataclass(frozen=True)
+class DoctorCreated(DomainEvent):
+    doctor: dict
+
+
+@dataclass(frozen=True)
+class DoctorUpdated(DomainEvent):
+    before: dict
+    doctor: dict
+
+
+@dataclass(frozen=True)
+class DoctorDeleted(DomainEvent):
+    doctor: dict
+
+
+# --- Rooms ---
+@dataclass(frozen=True)
+class RoomCreated(DomainEvent):
+    room: dict
+
+
+@dataclass(frozen=True)
+class RoomUpdated(DomainEvent):
+    before: dict
+    room: dict
+
+
+@dataclass(frozen=True)
+class RoomDeleted(DomainEvent):
+    room: dict
+
+
+@dataclass(frozen=True)
+class RoomAssigned(DomainEvent):
+    """A patient moved into `room` (from `from_room_id` when it is a transfer)."""
+    room: dict
+    patient_id: Any
+    from_room_id: Optional[Any] = None
+    charge_room: bool = True  # False for manual occupancy edits on the Rooms page
+
+
+@dataclass(frozen=True)
+class RoomVacated(DomainEvent):
+    room: dict
+    patient_id: Any
+
+
+# --- Clinical records ---
+@dataclass(frozen=True)
+class AppointmentScheduled(DomainEvent):
+    appointment: dict
+
+
+@dataclass(frozen=True)
+class AppointmentUpdated(DomainEvent):
+    before: dict
+    appointment: dict
+
+
+@dataclass(frozen=True)
+class AppointmentDeleted(DomainEvent):
+    appointment: dict
+
+
+@dataclass(frozen=True)
+class TreatmentPlanCreated(DomainEvent):
+    plan: dict
+
+
+@dataclass(frozen=True)
+class TreatmentPlanUpdated(DomainEvent):
+    before: dict
+    plan: dict
+
+
+@dataclass(frozen=True)
+class TreatmentPlanDeleted(DomainEvent):
+    plan: dict
+
+
+@dataclass(frozen=True)
+class DiagnosisRecorded(DomainEvent):
+    diagnosis: dict
+
+
+@dataclass(frozen=True)
+class DiagnosisUpdated(DomainEvent):
+    before: dict
+    diagnosis: dict
+
+
+@dataclass(frozen=True)
+class DiagnosisDeleted(DomainEvent):
+    diagnosis: dict
+
+
+# --- Billing ---
+@dataclass(frozen=True)
+class BillCreated(DomainEvent):
+    bill: dict
+
+
+@dataclass(frozen=True)
+class BillUpdated(DomainEvent):
+    before: dict
+    bill: dict
+
+
+@dataclass(frozen=True)
+class BillDeleted(DomainEvent):
+    bill: dict
+
+
+# --- Bulk data operations ---
+@dataclass(frozen=True)
+class RecordsUpdated(DomainEvent):
+    """One action applied the same `changes` to many records of `collection` (a bulk edit)."""
+    collection: str
+    before: tuple  # copies of the records before the change, aligned with `records`
+    records: tuple
+    changes: dict
+    action: str = "update"  # audit action per record, e.g. "discharge" for a bulk discharge
+
+
+@dataclass(frozen=True)
+class RecordsDeleted(DomainEvent):
+    """One action removed many records of `collection` (a bulk delete)."""
+    collection: str
+    records: tuple
+
+
+@dataclass(frozen=True)
+class DataReplaced(DomainEvent):
+    """Collections were replaced wholesale (import, clear, restore); derived indexes must rebuild."""
+    source: str
+
+
+# Event field holding the changed record -> the collection it belongs to
+RECORD_FIELDS = {
+    "patient": "patients",
+    "doctor": "doctors",
+    "room": "rooms",
+    "appointment": "appointments",
+    "plan": "treatment_plans",
+    "diagnosis": "diagnosis",
+    "bill": "billing",
+}
+
+
+def event_record(event):
+    """(collection, record) for events about a single record, else None (bulk events, DataReplaced)."""
+    for field_name, collection in RECORD_FIELDS.items():
+        record = getattr(event, field_name, None)
+        if isinstance(record, dict):
+            return collection, record
+    return None
+
+
+@dataclass
+class _Subscription:
+    event_types: tuple
+    handler: Any
+    priority: int
+    deferred: bool
+
+
+class EventBus:
+    """Synchronous publish/subscribe with deferred, priority-ordered batch subscribers."""
+
+    def __init__(self):
+        self._subscriptions = []
+        self._pending = []
+        self._depth = 0
+
+    def subscribe(self, event_types, handler, priority=100, deferred=False):
+        """Registers handler(event) - or handler([events]) when deferred - for the given event classes."""
+        if isinstance(event_types, type):
+            event_types = (event_types,)
+        self._subscriptions.append(_Subscription(tuple(event_types), handler, priority, deferred))
+        self._subscriptions.sort(key=lambda s: s.priority)
+
+    def publish(self, event):
+        for sub in self._subscriptions:
+            if not sub.deferred and isinstance(event, sub.event_types):
+                sub.handler(event)
+        self._pending.append(event)
+        if self._depth == 0:
+            self.flush()
+
+    def notify(self, event, handlers):
+        """Runs only the given immediate subscribers for `event`: nothing is queued for the deferred ones."""
+        for sub in self._subscriptions:
+            if not sub.deferred and sub.handler in handlers and isinstance(event, sub.event_types):
+                sub.handler(event)
+
+    @contextmanager
+    def unit_of_work(self):
+        """Defers the deferred subscribers until the outermost block exits without an error."""
+        self._depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._depth -= 1
+            if self._depth == 0:
+                self._pending = []
+            raise
+        self._depth -= 1
+        if self._depth == 0:
+            self.flush()
+
+    def flush(self):
+        """Runs deferred subscribers in priority order until no subscriber has unseen events.
+
+        After any handler runs, dispatch restarts from the highest priority, so events it
+        published (e.g. a BillCreated from a billing rule) reach the higher-priority
+        subscribers before lower-priority ones like persistence see the batch.
+        """
+        deferred = [s for s in self._subscriptions if s.deferred]
+        cursors = {id(s): 0 for s in deferred}
+        self._depth += 1  # events published by handlers join this flush
+        try:
+            progressed = True
+            while progressed:
+                progressed = False
+                for sub in deferred:
+                    unseen = self._pending[cursors[id(sub)]:]
+                    cursors[id(sub)] = len(self._pending)
+                    batch = [e for e in unseen if isinstance(e, sub.event_types)]
+                    if batch:
+                        sub.handler(batch)
+                        progressed = True
+                        break
+        finally:
+            self._depth -= 1
+            self._pending = []
@@ -0,0 +1,49 @@
+"""Process-wide LRU of built chart figures, shared by every session.
+
+A figure is keyed by (chart id, ward, versions of the collections it reads, parameters).
+Committed collection versions come from the shared snapshots, so two sessions looking at
+the same data hit the same entry, and any commit to an input collection changes the key;
+nothing has to be invalidated explicitly. Superseded versions simply age out of the LRU.
+Cached figures are shared: callers must treat them as read-only.
+"""
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 128
+
+
+class FigureCache:
+    """Thread-safe LRU mapping a hashable key to whatever `build()` returned (a figure or None)."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_build(self, key, build):
+        """The cached value for `key`, or `build()` stored as the most recent entry."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        # Built outside the lock: two sessions missing the same key at once both build, last one wins
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
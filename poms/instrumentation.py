@@ -0,0 +1,118 @@
+"""Lightweight timing hooks and memory estimates for the Performance page.
+
+`timed(name)` works as a context manager and as a decorator. When instrumentation is
+off it costs one attribute check; when on, one perf_counter pair and a deque append.
+Inside a sampled trace it also opens a tracing span (see poms.tracing), so every timed
+operation shows up nested in the trace of the rerun that ran it.
+Each operation keeps a rolling window of its latest durations, so p50/p95 reflect
+current behaviour rather than the whole process lifetime. Set POMS_INSTRUMENTATION=1
+to start with it switched on (it can also be toggled at runtime from the page).
+"""
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from poms.tracing import TRACER
+
+ENV_FLAG = "POMS_INSTRUMENTATION"
+WINDOW = 200  # latest samples kept per operation
+SESSION_TIMEOUT_SECONDS = 300
+
+
+class Timings:
+    """Rolling duration samples per operation name, shared by every session and thread."""
+
+    def __init__(self, window=WINDOW, enabled=None):
+        self.window = window
+        self.enabled = os.environ.get(ENV_FLAG, "0") == "1" if enabled is None else enabled
+        self._samples = {}
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+            self._calls[name] = self._calls.get(name, 0) + 1
+
+    def summary(self):
+        """One row per operation: calls, p50/p95/max over the window and the latest duration (ms)."""
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+            calls = dict(self._calls)
+        rows = []
+        for name in sorted(snapshot):
+            ms = np.asarray(snapshot[name]) * 1000
+            p50, p95 = np.percentile(ms, [50, 95])
+            rows.append({"operation": name, "calls": calls[name], "p50_ms": p50, "p95_ms": p95,
+                         "max_ms": ms.max(), "last_ms": ms[-1]})
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._calls.clear()
+
+
+class SessionTracker:
+    """Counts sessions that rendered a page recently (Streamlit has no public live-session API)."""
+
+    def __init__(self, timeout=SESSION_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._last_seen = {}
+        self._lock = threading.Lock()
+
+    def touch(self, session_id):
+        with self._lock:
+            self._last_seen[session_id] = time.monotonic()
+
+    def live(self):
+        cutoff = time.monotonic() - self.timeout
+        with self._lock:
+            for session_id in [s for s, seen in self._last_seen.items() if seen < cutoff]:
+                del self._last_seen[session_id]
+            return len(self._last_seen)
+
+
+TIMINGS = Timings()
+SESSIONS = SessionTracker()
+STARTUP = {}  # startup phase -> seconds the first time it ran in this process (the cold start)
+
+
+def record_startup(phase, seconds):
+    """Keeps the first (cold) duration of a startup phase; later runs go to the rolling timings."""
+    STARTUP.setdefault(phase, seconds)
+    if TIMINGS.enabled:
+        TIMINGS.record(f"startup.{phase}", seconds)
+
+
+@contextmanager
+def timed(name, **attrs):
+    """Records the duration of the block (or decorated call) under `name` when instrumentation is on,
+    and as a span (with `attrs`) when the current rerun is being traced."""
+    with TRACER.span(name, **attrs):
+        if not TIMINGS.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            TIMINGS.record(name, time.perf_counter() - start)
+
+
+def estimate_records_bytes(records, sample=200):
+    """Approximate memory of a list of flat record dicts, extrapolated from the first `sample` records."""
+    n = len(records)
+    if n == 0:
+        return sys.getsizeof(records)
+    head = records[:sample]
+    per_record = sum(sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r.values()) for r in head) / len(head)
+    return int(sys.getsizeof(records) + per_record * n)
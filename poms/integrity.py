@@ -0,0 +1,219 @@
+"""Referential-integrity checks over whole collections, vectorised per foreign key.
+
+Each foreign key is checked as one set-membership join: the referencing field and the
+referenced primary keys are pulled into NumPy arrays once and `np.isin` marks the
+dangling rows (sort-based, so millions of rows take well under a second per key).
+Duplicate primary keys are found the same way with `np.unique`. The result is an
+`IntegrityReport` of `Violation`s, each naming the records involved and the repair that
+applies: clear an optional reference, vacate a room, or delete a record that cannot
+exist without its patient (the same cascade as deleting the patient). `repair_records`
+applies the repairs to plain record lists (imports, batch jobs); the app applies them
+through its bulk procedures so the usual events, audit entries and save follow.
+
+The room event log is history and may name deleted patients and rooms, so it is not checked.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from poms.lazy import lazy_import
+from poms.storage import ID_FIELDS
+
+pd = lazy_import("pandas")
+
+SAMPLE_IDS = 10  # offending ids shown per violation in reports
+
+
+@dataclass(frozen=True)
+class ForeignKey:
+    collection: str
+    field: str
+    references: str
+    repair: str  # 'nullify', 'vacate' or 'delete'
+
+
+FOREIGN_KEYS = (
+    ForeignKey("patients", "doctor_id", "doctors", "nullify"),
+    ForeignKey("rooms", "patient_id", "patients", "vacate"),
+    ForeignKey("appointments", "patient_id", "patients", "delete"),
+    ForeignKey("appointments", "doctor_id", "doctors", "nullify"),
+    ForeignKey("treatment_plans", "patient_id", "patients", "delete"),
+    ForeignKey("treatment_plans", "doctor_id", "doctors", "nullify"),
+    ForeignKey("treatment_plans", "diagnosis_id", "diagnosis", "nullify"),
+    ForeignKey("diagnosis", "patient_id", "patients", "delete"),
+    ForeignKey("billing", "patient_id", "patients", "delete"),
+)
+
+
+@dataclass(frozen=True)
+class Violation:
+    collection: str
+    field: str
+    references: Optional[str]  # None for duplicate primary keys
+    problem: str  # 'dangling' or 'duplicate'
+    ids: tuple  # primary keys of the offending records
+    values: tuple  # distinct offending field values
+    repair: Optional[str]  # None when only a person can decide (duplicates)
+
+    def row(self):
+        """Flat dict for a report table."""
+        sample = ", ".join(str(i) for i in self.ids[:SAMPLE_IDS]) + (" …" if len(self.ids) > SAMPLE_IDS else "")
+        return {"Collection": self.collection, "Field": self.field, "References": self.references or "-",
+                "Problem": self.problem, "Records": len(self.ids), "Record IDs": sample,
+                "Repair": self.repair or "manual"}
+
+
+@dataclass
+class IntegrityReport:
+    violations: list = field(default_factory=list)
+    checked: dict = field(default_factory=dict)  # (collection, field) -> rows checked
+    skipped: list = field(default_factory=list)  # foreign keys whose collections were not supplied
+    seconds: float = 0.0
+
+    @property
+    def ok(self):
+        return not self.violations
+
+    @property
+    def rows_checked(self):
+        return sum(self.checked.values())
+
+    @property
+    def keys_checked(self):
+        return len(self.checked)
+
+    @property
+    def problems(self):
+        """Number of offending records over all violations."""
+        return sum(len(v.ids) for v in self.violations)
+
+    @property
+    def repairable(self):
+        return [v for v in self.violations if v.repair is not None]
+
+    def rows(self):
+        return [v.row() for v in self.violations]
+
+    def merge(self, newer):
+        """This report updated with a partial check: `newer`'s results replace those of the keys it checked.
+
+        Violations (and skips) of keys `newer` did not check are kept, so checking a few
+        collections never clears problems found elsewhere."""
+        kept = [v for v in self.violations if (v.collection, v.field) not in newer.checked]
+        skipped = [fk for fk in self.skipped if (fk.collection, fk.field) not in newer.checked and fk not in newer.skipped]
+        return IntegrityReport(violations=kept + newer.violations, checked={**self.checked, **newer.checked},
+                               skipped=skipped + newer.skipped, seconds=newer.seconds)
+
+
+def key_array(records, field):
+    """(values, present) for `field` over `records`; None, '' and missing keys are not present.
+
+    Keys that are all real integers come back as int64. Anything else (e.g. string ids in an
+    imported file) stays as the original objects, compared as the app compares them (==):
+    '5' or 1.7 is never taken for the id 5 or 1."""
+    raw = [r.get(field) for r in records]
+    if all(type(v) is int for v in raw):  # bools and numeric strings must not pass as ints
+        try:
+            return np.array(raw, dtype=np.int64), np.ones(len(raw), dtype=bool)
+        except OverflowError:
+            pass
+    values = np.empty(len(raw), dtype=object)
+    values[:] = raw
+    present = (values != None) & (values != "")  # noqa: E711 - elementwise comparison
+    if all(type(v) is int for v in values[present]):
+        try:
+            filled = values.copy()
+            filled[~present] = 0
+            return filled.astype(np.int64), present
+        except OverflowError:
+            pass
+    return values, present
+
+
+def _duplicates(values):
+    """Values occurring more than once (hash-based for object keys, which may not be mutually orderable)."""
+    if values.dtype == np.int64:
+        unique, counts = np.unique(values, return_counts=True)
+        return unique[counts > 1].tolist()
+    counts = pd.Series(values, dtype=object).value_counts(sort=False)
+    return counts.index[counts.to_numpy() > 1].tolist()
+
+
+def _isin(values, targets):
+    if values.dtype == np.int64 and targets.dtype == np.int64:
+        return np.isin(values, targets)
+    return pd.Index(values).isin(pd.Index(targets))  # hash join for mixed or string ids
+
+
+def check(data, collections=None, foreign_keys=FOREIGN_KEYS):
+    """Checks the primary and foreign keys of `data` ({collection: records}).
+
+    With `collections`, only keys that read or point at one of them are checked (e.g. the
+    collections just loaded). Foreign keys whose collections are missing from `data` are skipped."""
+    started = time.perf_counter()
+    report = IntegrityReport()
+    wanted = set(data) if collections is None else set(collections)
+    columns = {}
+
+    def column(collection, field):
+        if (collection, field) not in columns:
+            columns[collection, field] = key_array(data[collection], field)
+        return columns[collection, field]
+
+    for collection in sorted(wanted & set(data)):
+        id_field = ID_FIELDS.get(collection)
+        if id_field is None:
+            continue
+        ids, present = column(collection, id_field)
+        duplicated = _duplicates(ids[present])
+        report.checked[collection, id_field] = len(ids)
+        if duplicated:
+            report.violations.append(Violation(collection, id_field, None, "duplicate",
+                                               tuple(duplicated), tuple(duplicated), None))
+
+    for fk in foreign_keys:
+        if fk.collection not in wanted and fk.references not in wanted:
+            continue
+        if fk.collection not in data or fk.references not in data:
+            report.skipped.append(fk)
+            continue
+        values, present = column(fk.collection, fk.field)
+        targets, target_present = column(fk.references, ID_FIELDS[fk.references])
+        dangling = present & ~np.asarray(_isin(values, targets[target_present]))
+        report.checked[fk.collection, fk.field] = len(values)
+        if dangling.any():
+            ids, _ = column(fk.collection, ID_FIELDS[fk.collection])
+            report.violations.append(Violation(fk.collection, fk.field, fk.references, "dangling",
+                                               tuple(ids[dangling].tolist()),
+                                               tuple(pd.unique(values[dangling]).tolist()), fk.repair))
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def repair_plan(report):
+    """The repairs for `report` as (action, collection, field, values) steps, deletes first.
+
+    'delete' removes the records of `collection` whose `field` is in `values`; 'nullify' clears
+    `field` where it holds one of `values`; 'vacate' also marks those rooms Vacant."""
+    steps = [(v.repair, v.collection, v.field, v.values) for v in report.repairable]
+    return sorted(steps, key=lambda step: step[0] != "delete")
+
+
+def repair_records(data, report):
+    """Applies `report`'s repairs to plain record lists and returns the repaired copy of `data`.
+
+    Records are copied before they are changed; lists that need no repair are passed through."""
+    repaired = dict(data)
+    for action, collection, field, values in repair_plan(report):
+        wanted = set(values)
+        records = repaired[collection]
+        if action == "delete":
+            repaired[collection] = [r for r in records if r.get(field) not in wanted]
+            continue
+        changes = {field: None}
+        if action == "vacate":
+            changes["occupancy_status"] = "Vacant"
+        repaired[collection] = [{**r, **changes} if r.get(field) in wanted else r for r in records]
+    return repaired
@@ -0,0 +1,174 @@
+"""Interval index over treatment-plan windows: active-on-date, overlap and ending-within queries.
+
+A plan's window is [start_date, end_date], both inclusive; a plan without an end date is
+open-ended and stays active from its start onwards. Windows are kept in a centered
+interval tree over day numbers: every node has a fixed centre (the midpoint of its day
+range, so nodes never rebalance and are created only when a window lands in them) and
+holds the windows containing that centre, sorted by start and by end. A point query walks
+one root-to-leaf path (at most ~22 nodes for every representable date) and stops reading
+each node's list at the first window that misses, so it costs O(log D + k). An overlap
+query for [a, b] is the point query at `a` plus the windows starting in (a, b], read off
+a sorted list of starts; "ending within" is a range of a sorted list of ends.
+
+Inserts and deletes are a bisect into the node's lists and the sorted lists. Plans
+without a start date, or ending before they start, are not indexed (no date is in them).
+"""
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+
+OPEN_END = date.max.toordinal()  # the end day of an open-ended plan
+
+
+def day_number(value):
+    """Ordinal of an ISO date string (or date), or None if it is missing or not a date."""
+    if not value:
+        return None
+    try:
+        return (value if isinstance(value, date) else date.fromisoformat(str(value)[:10])).toordinal()
+    except ValueError:
+        return None
+
+
+class _Node:
+    __slots__ = ("centre", "lo", "hi", "by_start", "by_end", "left", "right")
+
+    def __init__(self, lo, hi):
+        self.lo, self.hi = lo, hi
+        self.centre = (lo + hi) // 2
+        self.by_start = []  # (start, plan_id), ascending
+        self.by_end = []  # (-end, plan_id), i.e. latest end first
+        self.left = self.right = None
+
+
+class PlanIntervalIndex:
+    """Treatment plans by window, maintained by delta."""
+
+    def __init__(self, plans=()):
+        self._root = _Node(1, OPEN_END)
+        self._windows = {}  # plan_id -> (start, end)
+        self._starts = []  # (start, plan_id), ascending
+        self._ends = []  # (end, plan_id), ascending, open-ended plans excluded
+        nodes = set()
+        for plan in plans:  # append everything, then one sort per list instead of an insert per plan
+            window = self._window(plan)
+            plan_id = plan.get('plan_id')
+            if window is None or plan_id in self._windows:
+                continue
+            start, end = window
+            node = self._node_for(start, end, create=True)
+            node.by_start.append((start, plan_id))
+            node.by_end.append((-end, plan_id))
+            nodes.add(node)
+            self._starts.append((start, plan_id))
+            if end != OPEN_END:
+                self._ends.append((end, plan_id))
+            self._windows[plan_id] = (start, end)
+        for items in [self._starts, self._ends] + [n.by_start for n in nodes] + [n.by_end for n in nodes]:
+            items.sort()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def _node_for(self, start, end, create=False):
+        """The node whose centre lies in [start, end] (the first one met going down)."""
+        node = self._root
+        while True:
+            if end < node.centre:
+                side, lo, hi = "left", node.lo, node.centre - 1
+            elif start > node.centre:
+                side, lo, hi = "right", node.centre + 1, node.hi
+            else:
+                return node
+            child = getattr(node, side)
+            if child is None:
+                if not create:
+                    return None
+                child = _Node(lo, hi)
+                setattr(node, side, child)
+            node = child
+
+    @staticmethod
+    def _window(plan):
+        """(start, end) day numbers of the plan, or None if it cannot be indexed."""
+        start, end = day_number(plan.get('start_date')), day_number(plan.get('end_date')) or OPEN_END
+        return None if start is None or end < start else (start, end)
+
+    def add(self, plan):
+        plan_id = plan.get('plan_id')
+        if plan_id in self._windows:
+            self.remove(plan)
+        window = self._window(plan)
+        if window is None:
+            return
+        start, end = window
+        node = self._node_for(start, end, create=True)
+        insort(node.by_start, (start, plan_id))
+        insort(node.by_end, (-end, plan_id))
+        insort(self._starts, (start, plan_id))
+        if end != OPEN_END:
+            insort(self._ends, (end, plan_id))
+        self._windows[plan_id] = (start, end)
+
+    def remove(self, plan):
+        """Removes the plan's window (as indexed, whatever its record now says)."""
+        plan_id = plan.get('plan_id')
+        window = self._windows.pop(plan_id, None)
+        if window is None:
+            return
+        start, end = window
+        node = self._node_for(start, end)
+        for items, key in ((node.by_start, (start, plan_id)), (node.by_end, (-end, plan_id)),
+                           (self._starts, (start, plan_id)), (self._ends, (end, plan_id))):
+            i = bisect_left(items, key)
+            if i < len(items) and items[i] == key:
+                del items[i]
+
+    def update(self, before, after):
+        self.remove(before)
+        self.add(after)
+
+    def _stab(self, day):
+        """Ids of the plans whose window contains `day`."""
+        found = []
+        node = self._root
+        while node is not None:
+            if day < node.centre:
+                # Every window here ends at or after the centre: it contains `day` iff it starts by then
+                for start, plan_id in node.by_start:
+                    if start > day:
+                        break
+                    found.append(plan_id)
+                node = node.left
+            elif day > node.centre:
+                for neg_end, plan_id in node.by_end:
+                    if -neg_end < day:
+                        break
+                    found.append(plan_id)
+                node = node.right
+            else:
+                found.extend(plan_id for _, plan_id in node.by_start)
+                break
+        return found
+
+    def active_on(self, day):
+        """Ids of the plans active on `day` (a date or ISO string)."""
+        day = day_number(day)
+        return [] if day is None else self._stab(day)
+
+    def overlapping(self, first, last):
+        """Ids of the plans whose window shares at least one day with [first, last]."""
+        first, last = day_number(first), day_number(last)
+        if first is None or last is None or last < first:
+            return []
+        found = self._stab(first)
+        i, j = bisect_right(self._starts, (first, float('inf'))), bisect_right(self._starts, (last, float('inf')))
+        found.extend(plan_id for _, plan_id in self._starts[i:j])
+        return found
+
+    def ending_within(self, first, last):
+        """Ids of the plans whose end date lies in [first, last] (open-ended plans never end)."""
+        first, last = day_number(first), day_number(last)
+        if first is None or last is None:
+            return []
+        i, j = bisect_left(self._ends, (first, float('-inf'))), bisect_right(self._ends, (last, float('inf')))
+        return [plan_id for _, plan_id in self._ends[i:j]]
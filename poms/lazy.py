@@ -0,0 +1,49 @@
+"""Deferred imports for heavy optional-at-startup modules (pandas, plotly).
+
+`lazy_import("pandas")` returns a stand-in that imports the real module on first
+attribute access, so `pd.DataFrame(...)` call sites stay unchanged while a rerun that
+never builds a frame (or a chart) never pays for the import.
+"""
+import importlib
+import threading
+
+_proxies = {}
+_proxies_lock = threading.Lock()
+
+
+class LazyModule:
+    """Module proxy; the import runs once, under a lock, the first time an attribute is read."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                module = self._module
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+
+def lazy_import(name):
+    """The process-wide LazyModule for `name` ("plotly.express" works too).
+
+    Streamlit re-executes the app script on every rerun; sharing one proxy per name keeps
+    reruns from rebuilding it and lets `loaded` report whether any rerun has needed it."""
+    with _proxies_lock:
+        proxy = _proxies.get(name)
+        if proxy is None:
+            proxy = _proxies[name] = LazyModule(name)
+        return proxy
@@ -0,0 +1,158 @@
+"""Append-only room occupancy event log and bed-day utilisation analytics.
+
+Rooms only hold their *current* occupant, so every occupy / vacate / transfer is also
+recorded as an event. Utilisation questions are answered by replaying the log into
+stays and sweeping over their endpoints (O(E log E) for E events, O(D) per day series).
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+
+EVENT_TYPES = ("occupy", "vacate", "transfer")
+
+
+def make_room_event(event_id, event_type, room_id, patient_id, from_room_id=None, timestamp=None):
+    """Builds one log record. A transfer moves `patient_id` from `from_room_id` into `room_id`."""
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Unknown room event type: {event_type}")
+    return {
+        "event_id": event_id,
+        "timestamp": (timestamp or datetime.now()).isoformat(timespec='seconds'),
+        "event": event_type,
+        "room_id": room_id,
+        "patient_id": patient_id,
+        "from_room_id": from_room_id
+    }
+
+
+def seed_events_from_rooms(rooms, patients):
+    """Baseline 'occupy' events for rooms already occupied before the log existed (dated at admission)."""
+    admissions = {p['patient_id']: p.get('admission_date') for p in patients}
+    events = []
+    for r in rooms:
+        if r.get('occupancy_status') != 'Occupied':
+            continue
+        try:
+            when = datetime.strptime(admissions.get(r.get('patient_id')), "%Y-%m-%d")
+        except (TypeError, ValueError):
+            when = datetime.now()
+        events.append(make_room_event(0, "occupy", r['room_id'], r.get('patient_id'), timestamp=when))
+    events.sort(key=lambda e: e['timestamp'])
+    for i, e in enumerate(events, start=1):
+        e['event_id'] = i
+    return events
+
+
+def occupancy_intervals(events, until=None):
+    """Replays the log into [(room_id, start, end), ...] stays. Stays still open end at `until`."""
+    until = until or datetime.now()
+    open_stays = {}
+    intervals = []
+    for e in sorted(events, key=lambda e: (e['timestamp'], e['event_id'])):
+        t = datetime.fromisoformat(e['timestamp'])
+        if e['event'] in ("vacate", "transfer"):
+            room_id = e['from_room_id'] if e['event'] == "transfer" else e['room_id']
+            start = open_stays.pop(room_id, None)
+            if start is not None:
+                intervals.append((room_id, start, t))
+        if e['event'] in ("occupy", "transfer"):
+            # A second occupy without a vacate (manual room edit) closes the earlier stay
+            start = open_stays.pop(e['room_id'], None)
+            if start is not None:
+                intervals.append((e['room_id'], start, t))
+            open_stays[e['room_id']] = t
+    for room_id, start in open_stays.items():
+        if start < until:
+            intervals.append((room_id, start, until))
+    return intervals
+
+
+def _window(start, end):
+    """Normalises date/datetime bounds to a half-open [start, end) datetime window."""
+    if not isinstance(start, datetime):
+        start = datetime.combine(start, time.min)
+    if not isinstance(end, datetime):
+        end = datetime.combine(end, time.min) + timedelta(days=1)
+    return start, end
+
+
+def _clipped_stays(events, rooms, start, end, room_type=None):
+    room_types = {r['room_id']: r.get('room_type', 'Unknown') for r in rooms}
+    for room_id, s, e in occupancy_intervals(events, until=min(end, datetime.now())):
+        rtype = room_types.get(room_id, 'Unknown')
+        if room_type and rtype != room_type:
+            continue
+        s, e = max(s, start), min(e, end)
+        if s < e:
+            yield rtype, s, e
+
+
+def utilisation_report(events, rooms, start, end):
+    """Bed-days, occupancy rate and peak concurrent occupancy per room type over [start, end)."""
+    start, end = _window(start, end)
+    capacity = Counter(r.get('room_type', 'Unknown') for r in rooms)
+    bed_days = defaultdict(float)
+    points = []
+    for rtype, s, e in _clipped_stays(events, rooms, start, end):
+        bed_days[rtype] += (e - s).total_seconds() / 86400
+        points.append((s, 1, rtype))
+        points.append((e, -1, rtype))
+
+    # Sweep line: a vacate and an occupy at the same instant must not count as overlap
+    points.sort(key=lambda p: (p[0], p[1]))
+    current, peak = Counter(), Counter()
+    total = peak_total = 0
+    for _, delta, rtype in points:
+        current[rtype] += delta
+        total += delta
+        peak[rtype] = max(peak[rtype], current[rtype])
+        peak_total = max(peak_total, total)
+
+    window_days = (end - start).total_seconds() / 86400
+    rows = []
+    for rtype in sorted(set(capacity) | set(bed_days)):
+        n = capacity.get(rtype, 0)
+        rows.append({
+            "room_type": rtype,
+            "rooms": n,
+            "bed_days": round(bed_days[rtype], 2),
+            "occupancy_rate": bed_days[rtype] / (n * window_days) if n and window_days > 0 else 0.0,
+            "peak_concurrent": peak[rtype]
+        })
+    return {
+        "by_room_type": rows,
+        "bed_days": round(sum(bed_days.values()), 2),
+        "peak_concurrent": peak_total,
+        "window_days": window_days
+    }
+
+
+def daily_occupancy(events, rooms, start, end, room_type=None):
+    """Average occupied beds per calendar day in the window, as [(date, beds), ...].
+
+    Uses a difference array for whole days and adds the partial days at each stay's
+    edges directly, so the cost is O(stays + days) rather than O(stays * days).
+    """
+    start, end = _window(start, end)
+    n_days = (end.date() - start.date()).days
+    if n_days <= 0:
+        return []
+    partial = [0.0] * (n_days + 1)
+    diff = [0] * (n_days + 1)
+    for _, s, e in _clipped_stays(events, rooms, start, end, room_type):
+        i0 = (s.date() - start.date()).days
+        i1 = (e.date() - start.date()).days
+        if i0 == i1:
+            partial[i0] += (e - s).total_seconds() / 86400
+            continue
+        next_midnight = datetime.combine(s.date() + timedelta(days=1), time.min)
+        partial[i0] += (next_midnight - s).total_seconds() / 86400
+        diff[i0 + 1] += 1
+        diff[i1] -= 1
+        partial[i1] += (e - datetime.combine(e.date(), time.min)).total_seconds() / 86400
+
+    series = []
+    running = 0
+    for i in range(n_days):
+        running += diff[i]
+        series.append((start.date() + timedelta(days=i), running + partial[i]))
+    return series
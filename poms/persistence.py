@@ -0,0 +1,124 @@
+"""Background persistence: a writer thread that takes shard saves off the request path.
+
+Sessions hand a snapshot of the collections they changed to `BackgroundWriter.submit`
+and return immediately. The writer waits a short coalescing window, merges every save
+queued for the same ward (the newest copy of a collection wins) and writes each ward
+once. The queue is bounded, so a burst of saves applies back-pressure instead of
+growing memory without limit; `flush` blocks until everything queued is on disk.
+"""
+import queue
+import threading
+import time
+from datetime import datetime
+
+from poms.instrumentation import timed
+from poms.tracing import TRACER
+
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_COALESCE_SECONDS = 0.25
+
+
+def snapshot_collections(data):
+    """Copies each record dict so later in-place edits by the session cannot race the writer."""
+    return {name: [dict(record) for record in records] for name, records in data.items()}
+
+
+class BackgroundWriter:
+    """Single daemon thread draining a bounded queue of (ward, collections) saves into a store."""
+
+    def __init__(self, store, max_queue=DEFAULT_QUEUE_SIZE, coalesce_seconds=DEFAULT_COALESCE_SECONDS, on_saved=None):
+        self.store = store
+        self.on_saved = on_saved  # called as on_saved(ward, collections) after each completed write
+        self.coalesce_seconds = coalesce_seconds
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._state_lock = threading.Lock()
+        self._pending = {}  # ward -> saves queued or being written
+        self.last_saved = {}  # ward -> datetime of the last completed write
+        self.last_error = None
+        self.writes = 0  # physical ward writes, after coalescing
+        self.submitted = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="poms-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, ward, data):
+        """Queues a save of `data` ({collection: records}, already snapshotted) for `ward`."""
+        if self._closed:
+            raise RuntimeError("BackgroundWriter is closed")
+        with self._state_lock:
+            self._pending[ward] = self._pending.get(ward, 0) + 1
+            self.submitted += 1
+        self._queue.put((ward, data))  # blocks only while the queue is full
+
+    def pending(self, ward=None):
+        """Number of saves not yet on disk, for one ward or in total."""
+        with self._state_lock:
+            if ward is not None:
+                return self._pending.get(ward, 0)
+            return sum(self._pending.values())
+
+    def flush(self):
+        """Blocks until every queued save has been written (read-your-writes before a shard load)."""
+        self._queue.join()
+
+    def close(self):
+        """Flushes and stops the writer thread. Registered as the shutdown hook."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            if first is not None:
+                # Coalescing window: gather whatever else arrives before writing
+                deadline = time.monotonic() + self.coalesce_seconds
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    batch.append(item)
+                    if item is None:
+                        break
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+            saves = [item for item in batch if item is not None]
+            with TRACER.trace("writer.batch", saves=len(saves)):
+                self._write_batch(saves)
+            for _ in batch:
+                self._queue.task_done()
+            if any(item is None for item in batch):
+                return
+
+    def _write_batch(self, batch):
+        merged = {}
+        counts = {}
+        for ward, data in batch:
+            merged.setdefault(ward, {}).update(data)
+            counts[ward] = counts.get(ward, 0) + 1
+        for ward, data in merged.items():
+            try:
+                with timed("backend.write", ward=ward, collections=sorted(data)):
+                    self.store.save_ward(ward, data)
+                self.last_saved[ward] = datetime.now()
+                self.writes += 1
+                self.last_error = None
+                if self.on_saved is not None:
+                    self.on_saved(ward, sorted(data))
+            except Exception as e:  # surfaced in the sidebar; the session keeps its data in memory
+                self.last_error = f"{ward}: {e}"
+            finally:
+                with self._state_lock:
+                    self._pending[ward] -= counts[ward]
+                    if self._pending[ward] <= 0:
+                        del self._pending[ward]
@@ -0,0 +1,87 @@
+"""Accounts-receivable engine: daily/monthly billing rollups and unpaid-bill aging.
+
+The rollups are maintained by delta (one bill in, one bill out), so the Reports page
+never has to rescan st.session_state.billing to draw its trend charts.
+"""
+from datetime import datetime
+
+# (label, min_days, max_days) - max_days None means open-ended
+AGING_BUCKETS = [("0-30", 0, 30), ("31-60", 31, 60), ("61-90", 61, 90), ("90+", 91, None)]
+
+
+def _empty_row():
+    return {"billed": 0.0, "paid": 0.0, "outstanding": 0.0, "bills": 0}
+
+
+class ReceivablesLedger:
+    """Incrementally maintained billed/paid/outstanding totals per day and per month."""
+
+    def __init__(self, bills=()):
+        self.daily = {}    # 'YYYY-MM-DD' -> row
+        self.monthly = {}  # 'YYYY-MM' -> row
+        self.version = 0
+        for bill in bills:
+            self.add_bill(bill)
+
+    def _apply(self, bill, sign):
+        date = str(bill.get('date') or '')
+        if not date:
+            return
+        amount = float(bill.get('amount') or 0.0) * sign
+        bucket = 'paid' if bill.get('status') == 'Paid' else 'outstanding'
+        for table, key in ((self.daily, date), (self.monthly, date[:7])):
+            row = table.setdefault(key, _empty_row())
+            row['billed'] += amount
+            row[bucket] += amount
+            row['bills'] += sign
+            if row['bills'] <= 0:
+                # Drop empty rows so float residue never shows up as a phantom balance
+                del table[key]
+        self.version += 1
+
+    def add_bill(self, bill):
+        """Delta for a newly inserted bill."""
+        self._apply(bill, 1)
+
+    def remove_bill(self, bill):
+        """Delta for a deleted bill."""
+        self._apply(bill, -1)
+
+    def update_bill(self, old_bill, new_bill):
+        """Delta for an edited bill (status change, amount or date correction)."""
+        self._apply(old_bill, -1)
+        self._apply(new_bill, 1)
+
+    def totals(self):
+        """Returns the overall billed/paid/outstanding row (sums the monthly rollup only)."""
+        total = _empty_row()
+        for row in self.monthly.values():
+            for key in total:
+                total[key] += row[key]
+        return total
+
+    def daily_series(self):
+        """Returns [(date, row), ...] sorted by date."""
+        return sorted(self.daily.items())
+
+    def monthly_series(self):
+        """Returns [(month, row), ...] sorted by month."""
+        return sorted(self.monthly.items())
+
+    def aging(self, as_of=None):
+        """Buckets outstanding amounts by days since the bill date, using the daily rollup."""
+        as_of = as_of or datetime.now().date()
+        buckets = {label: 0.0 for label, _, _ in AGING_BUCKETS}
+        for date_str, row in self.daily.items():
+            if row['outstanding'] <= 0:
+                continue
+            try:
+                age = (as_of - datetime.strptime(date_str, "%Y-%m-%d").date()).days
+            except ValueError:
+                continue
+            age = max(age, 0)
+            for label, low, high in AGING_BUCKETS:
+                if age >= low and (high is None or age <= high):
+                    buckets[label] += row['outstanding']
+                    break
+        return buckets
@@ -0,0 +1,121 @@
+"""Room/patient state reconciliation.
+
+A room's occupant should agree with the patient and with the occupancy log: only an
+Admitted, existing patient occupies a room, a patient occupies at most one room, a
+vacant room names nobody, and every occupied room's latest log entry is the occupy (or
+transfer) that put its occupant there. `reconcile` derives the expected state from the
+patients and the log and returns one `RoomIssue` per disagreement, each with its fix.
+
+Given `patient_ids`/`room_ids` it checks only the rooms those touch (the incremental check
+after a mutation); without them it checks every room. Rooms are few, so each check is a
+pass over the rooms plus a backwards scan of the log that stops once every checked room's
+latest entry is found.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+PROBLEMS = {
+    "discharged_occupant": "Occupied by a discharged patient",
+    "missing_occupant": "Occupied by a patient who does not exist",
+    "no_occupant": "Occupied without a patient",
+    "stale_patient": "Vacant but still names a patient",
+    "double_booked": "Patient also occupies a more recently assigned room",
+    "unlogged": "Occupant missing from the occupancy log",
+}
+FIXES = {
+    "discharged_occupant": "vacate",
+    "missing_occupant": "vacate",
+    "no_occupant": "vacate",
+    "stale_patient": "clear",
+    "double_booked": "vacate",
+    "unlogged": "log",
+}
+
+
+@dataclass(frozen=True)
+class RoomIssue:
+    room_id: int
+    patient_id: Optional[int]
+    problem: str  # a key of PROBLEMS
+
+    @property
+    def fix(self):
+        """'vacate' the room, 'clear' its stale patient id, or 'log' the occupant's assignment."""
+        return FIXES[self.problem]
+
+    def row(self):
+        return {"Room ID": self.room_id, "Patient ID": self.patient_id, "Problem": PROBLEMS[self.problem],
+                "Fix": self.fix}
+
+
+def patients_by_id(patients):
+    """A `find_patients` lookup over a plain patient list (one pass per call)."""
+    def find(ids):
+        return {p['patient_id']: p for p in patients if p.get('patient_id') in ids}
+    return find
+
+
+def latest_room_events(room_events, room_ids):
+    """{room_id: latest log entry touching it} for `room_ids`, scanning back from the newest entry."""
+    wanted = set(room_ids)
+    latest = {}
+    for position in range(len(room_events) - 1, -1, -1):
+        if not wanted:
+            break
+        event = room_events[position]
+        for room_id in (event['room_id'], event.get('from_room_id')):
+            if room_id in wanted:
+                latest[room_id] = (position, event)
+                wanted.discard(room_id)
+    return latest
+
+
+def _holds(entry, room_id, patient_id):
+    """True if the log entry is the assignment of `patient_id` to `room_id`."""
+    if entry is None:
+        return False
+    _, event = entry
+    return event['event'] in ("occupy", "transfer") and event['room_id'] == room_id and event['patient_id'] == patient_id
+
+
+def reconcile(rooms, find_patients, room_events, patient_ids=None, room_ids=None):
+    """Issues for every room, or only for rooms holding `patient_ids` or listed in `room_ids`.
+
+    `find_patients(ids)` returns {patient_id: record} for the ids that exist."""
+    if patient_ids is None and room_ids is None:
+        scoped = list(rooms)
+    else:
+        room_ids = set(room_ids or ())
+        patient_ids = set(patient_ids or ())
+        patient_ids.update(r.get('patient_id') for r in rooms if r['room_id'] in room_ids)
+        patient_ids.discard(None)
+        scoped = [r for r in rooms if r['room_id'] in room_ids or r.get('patient_id') in patient_ids]
+    occupied = [r for r in scoped if r.get('occupancy_status') == 'Occupied']
+    patients = find_patients({r.get('patient_id') for r in occupied} - {None})
+    latest = latest_room_events(room_events, [r['room_id'] for r in occupied])
+
+    issues = []
+    holding = {}  # patient_id -> occupied rooms that still look valid
+    for room in scoped:
+        room_id, patient_id = room['room_id'], room.get('patient_id')
+        if room.get('occupancy_status') != 'Occupied':
+            if patient_id is not None:
+                issues.append(RoomIssue(room_id, patient_id, "stale_patient"))
+        elif patient_id is None:
+            issues.append(RoomIssue(room_id, None, "no_occupant"))
+        elif patient_id not in patients:
+            issues.append(RoomIssue(room_id, patient_id, "missing_occupant"))
+        elif patients[patient_id].get('status') == 'Discharged':
+            issues.append(RoomIssue(room_id, patient_id, "discharged_occupant"))
+        else:
+            holding.setdefault(patient_id, []).append(room)
+
+    for patient_id, held in holding.items():
+        # The room with the newest logged assignment is the one the patient is in; rooms with none rank last
+        held.sort(key=lambda r: latest[r['room_id']][0] if _holds(latest.get(r['room_id']), r['room_id'], patient_id) else -1,
+                  reverse=True)
+        keep = held[0]
+        issues.extend(RoomIssue(r['room_id'], patient_id, "double_booked") for r in held[1:])
+        if not _holds(latest.get(keep['room_id']), keep['room_id'], patient_id):
+            issues.append(RoomIssue(keep['room_id'], patient_id, "unlogged"))
+    return sorted(issues, key=lambda issue: issue.room_id)
@@ -0,0 +1,25 @@
+"""First-run fixture: the sample ward seeded when no shard exists yet.
+
+The records live in sample_data.json next to this module and are read only when a ward
+is actually seeded, so neither the app script nor a normal startup carries them.
+A value of "@today" (the appointments due today) is replaced by today's date on load.
+"""
+import json
+import os
+from datetime import datetime
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "sample_data.json")
+TODAY = "@today"
+
+
+def load_sample_data(path=FIXTURE_PATH):
+    """{collection: records} from the fixture; every call returns fresh record dicts."""
+    today = datetime.now().strftime("%Y-%m-%d")
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    for records in data.values():
+        for record in records:
+            for field, value in record.items():
+                if value == TODAY:
+                    record[field] = today
+    return data
@@ -0,0 +1,222 @@
+"""Service layer: the ward data operations, importable without Streamlit.
+
+The functions here work on plain {collection: records} dicts. The app calls them from
+its pages and keeps its session-state, event and snapshot machinery around them; the
+batch CLI (`python -m poms batch <job>`, see poms/__main__.py) calls them through a
+`WardSession`, which opens one ward of the same store, audit trail and backups the app
+uses and saves only the collections a job changed. Ids come from the store's locked
+global sequences, and a save is merged with whatever the app wrote to the file since the
+job read it (poms.storage), so a job and the app can run at the same time. Running app
+sessions pick the job's changes up like any external edit (poms.watcher).
+"""
+import os
+from datetime import date, datetime, timedelta
+
+from poms.audit import AuditLog, entries_from_event
+from poms.backups import BackupManager
+from poms.events import BillCreated, RecordsDeleted, RecordsUpdated
+from poms.integrity import check as check_integrity, repair_records
+from poms.intervals import PlanIntervalIndex
+from poms.occupancy import make_room_event, seed_events_from_rooms, utilisation_report
+from poms.receivables import ReceivablesLedger
+from poms.storage import COLLECTIONS, ID_FIELDS, ShardedStore, max_id
+from poms.watcher import diff_records
+from poms.workload import COLLECTIONS as WORKLOAD_SOURCES, DoctorWorkload
+
+# Automatic charges (the app's billing rules and the nightly room accrual)
+APPOINTMENT_FEE = 1000.00
+TREATMENT_PLAN_FEE = 10000.00
+DIAGNOSIS_FEE = 5000.00
+ROOM_CHARGE = "Room & Board "  # record type of room bills (assignment day and nightly accrual)
+
+AUDIT_SUBDIR = "_audit"  # same layout as the app: <shard root>/_audit and <shard root>/_backups
+BACKUP_SUBDIR = "_backups"
+
+
+def make_bill(bill_id, patient_id, record_type, amount, day):
+    """A new unpaid bill record."""
+    return {"bill_id": bill_id, "patient_id": patient_id, "amount": amount, "status": "Unpaid",
+            "date": str(day), "description": f"{record_type}"}
+
+
+def summarise_ward(ward, data):
+    """One row of the hospital-wide ward report, computed from a single ward shard."""
+    return {
+        'Ward': ward,
+        'Patients': len(data.get('patients', [])),
+        'Admitted': sum(1 for p in data.get('patients', []) if p.get('status') == 'Admitted'),
+        'Rooms': len(data.get('rooms', [])),
+        'Occupied': sum(1 for r in data.get('rooms', []) if r.get('occupancy_status') == 'Occupied'),
+        'Billed': sum(b.get('amount', 0) for b in data.get('billing', [])),
+        'Outstanding': sum(b.get('amount', 0) for b in data.get('billing', []) if b.get('status') != 'Paid')
+    }
+
+
+# --- Import / Export ---
+def export_payload(data, ward, exported_at=None):
+    """The Data Management export: every collection plus the ward name and export time."""
+    payload = {name: data.get(name, []) for name in COLLECTIONS}
+    payload["ward"] = ward
+    payload["exportDate"] = (exported_at or datetime.now()).isoformat()
+    return payload
+
+
+def prepare_import(import_data, repair=False):
+    """(collections, integrity report) from an export file; broken references are repaired only with `repair`.
+
+    A file without a room event log gets one seeded from its room state."""
+    imported = {name: import_data.get(name) or [] for name in COLLECTIONS if name != 'room_events'}
+    report = check_integrity(imported)
+    if repair and report.repairable:
+        imported = repair_records(imported, report)
+    imported['room_events'] = import_data.get('room_events') or seed_events_from_rooms(imported['rooms'], imported['patients'])
+    return imported, report
+
+
+# --- Room accrual ---
+def is_room_charge(bill):
+    return str(bill.get('description') or '').strip() == ROOM_CHARGE.strip()
+
+
+def room_accrual(data, day, allocate_id):
+    """One day's room charge for every occupied room whose occupant is admitted and not yet charged for `day`.
+
+    A patient assigned a room on `day` already has that day's charge, so running the
+    accrual again (or on the assignment day) never bills a day twice."""
+    day = str(day)
+    admitted = {p['patient_id'] for p in data['patients'] if p.get('status') == 'Admitted'}
+    charged = {b.get('patient_id') for b in data['billing'] if b.get('date') == day and is_room_charge(b)}
+    bills = []
+    for room in data['rooms']:
+        patient_id = room.get('patient_id')
+        if room.get('occupancy_status') != 'Occupied' or patient_id not in admitted or patient_id in charged:
+            continue
+        bills.append(make_bill(allocate_id('billing'), patient_id, ROOM_CHARGE, float(room.get('cost_per_day') or 0.0), day))
+        charged.add(patient_id)
+    return bills
+
+
+# --- Reports ---
+def ward_report(ward, data, day=None, days=30):
+    """The Reports page figures for one ward as plain values (for files and nightly jobs)."""
+    from poms.stay_analytics import build_stay_frame, overall_summary  # pandas: only when a report is built
+
+    day = day or date.today()
+    ledger = ReceivablesLedger(data['billing'])
+    workload = DoctorWorkload({name: data[name] for name in WORKLOAD_SOURCES})
+    plans = PlanIntervalIndex(data['treatment_plans'])
+    return {
+        "ward": ward,
+        "date": str(day),
+        "summary": summarise_ward(ward, data),
+        "receivables": {"totals": ledger.totals(), "aging": ledger.aging(day),
+                        "monthly": [dict(row, month=month) for month, row in ledger.monthly_series()]},
+        "room_utilisation": utilisation_report(data['room_events'], data['rooms'], day - timedelta(days=days), day),
+        "length_of_stay": overall_summary(build_stay_frame(data['patients'])),
+        "doctor_workload": [dict(workload.row(d['doctor_id'], day), doctor_id=d['doctor_id'], name=d['name'])
+                            for d in data['doctors']],
+        "treatment_plans": {"active": len(plans.active_on(day)),
+                            "ending_within_7_days": len(plans.ending_within(day, day + timedelta(days=7)))},
+    }
+
+
+# --- Integrity ---
+def repair_events(data, repaired):
+    """Bulk events describing how `repaired` (from repair_records) differs from `data`, for the audit trail."""
+    events = []
+    for name in COLLECTIONS:
+        if repaired.get(name) is data.get(name):
+            continue
+        _, changes = diff_records(ID_FIELDS[name], data[name], repaired[name])
+        deleted = tuple(before for before, after in changes if after is None)
+        updated = [(before, after) for before, after in changes if before is not None and after is not None]
+        if deleted:
+            events.append(RecordsDeleted(collection=name, records=deleted))
+        if updated:
+            events.append(RecordsUpdated(collection=name, before=tuple(b for b, _ in updated),
+                                         records=tuple(a for _, a in updated), changes={}))
+    return events
+
+
+def vacate_events(before_rooms, after_rooms, allocate_id):
+    """Occupancy-log entries for rooms a repair vacated, with ids from `allocate_id` (the global sequence)."""
+    previous = {r['room_id']: r for r in before_rooms}
+    entries = []
+    for room in after_rooms:
+        old = previous.get(room['room_id'])
+        if old is not None and old.get('occupancy_status') == 'Occupied' and room.get('occupancy_status') != 'Occupied':
+            entries.append(make_room_event(allocate_id('room_events'), "vacate", room['room_id'], old.get('patient_id')))
+    return entries
+
+
+class WardSession:
+    """One ward of the shard store opened outside Streamlit, with the app's audit trail and backups."""
+
+    def __init__(self, root, ward, actor="batch"):
+        self.store = ShardedStore(root, fsync=True)
+        self.audit_log = AuditLog(os.path.join(root, AUDIT_SUBDIR))
+        self.backups = BackupManager(os.path.join(root, BACKUP_SUBDIR), self.store)
+        self.ward = ward
+        self.actor = actor
+        self.data = {}
+
+    def load(self, collections=COLLECTIONS):
+        """Reads the collections not read yet and returns every collection read so far."""
+        missing = [name for name in collections if name not in self.data]
+        if missing:
+            self.data.update(self.store.load_collections(self.ward, missing, track=True))
+        return self.data
+
+    def next_id(self, collection):
+        """Next primary key, from the same global sequences the app allocates from."""
+        return self.store.allocate_id(collection, max_id(self.data.get(collection, []), ID_FIELDS[collection]))
+
+    def commit(self, collections, events=()):
+        """Audits `events`, saves `collections` of the ward and lets the backups pick the change up."""
+        entries = [entry for event in events for entry in entries_from_event(event)]
+        if entries:
+            self.audit_log.append_many(entries, actor=self.actor, ward=self.ward)
+        self.store.save_ward(self.ward, {name: self.data[name] for name in collections})
+        self.backups.record_save(self.ward, sorted(collections))
+
+
+# --- Batch jobs: each takes a WardSession and returns (summary line, result) ---
+def accrue_rooms(session, day=None, dry_run=False):
+    day = day or date.today()
+    data = session.load(("patients", "rooms", "billing"))
+    bills = room_accrual(data, day, session.next_id)
+    if bills and not dry_run:
+        data['billing'] = data['billing'] + bills
+        session.commit(["billing"], [BillCreated(bill=bill) for bill in bills])
+    total = sum(bill['amount'] for bill in bills)
+    return f"{'Would charge' if dry_run else 'Charged'} {len(bills)} room(s) for {day}: ₹{total:,.0f}", bills
+
+
+def build_report(session, day=None, days=30):
+    report = ward_report(session.ward, session.load(), day, days)
+    summary = report["summary"]
+    return (f"{summary['Patients']} patients ({summary['Admitted']} admitted), {summary['Occupied']}/{summary['Rooms']} rooms "
+            f"occupied, ₹{summary['Outstanding']:,.0f} outstanding"), report
+
+
+def check_ward(session, repair=False):
+    data = session.load()
+    report = check_integrity(data)
+    if repair and report.repairable:
+        repaired = repair_records(data, report)
+        vacated = vacate_events(data['rooms'], repaired['rooms'], session.next_id)
+        if vacated:
+            repaired['room_events'] = data['room_events'] + vacated
+        events = repair_events(data, repaired)
+        changed = [name for name in COLLECTIONS if repaired[name] is not data[name]]
+        session.data = repaired
+        session.commit(changed, events)
+        return f"Repaired {sum(len(v.ids) for v in report.repairable)} record(s) in {', '.join(changed)}", report
+    if report.ok:
+        return f"OK: {report.keys_checked} keys over {report.rows_checked} rows in {report.seconds:.2f}s", report
+    return f"{report.problems} record(s) with integrity problems", report
+
+
+def export_ward(session):
+    payload = export_payload(session.load(), session.ward)
+    return f"Exported {sum(len(payload[name]) for name in COLLECTIONS)} records", payload
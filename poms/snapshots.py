@@ -0,0 +1,89 @@
+"""Copy-on-write snapshots of the collections, shared by every session in the process.
+
+The registry holds the latest committed version of each (ward, collection) as a tuple of
+record dicts. Sessions work on a list of *pointers* to those dicts, so N sessions viewing
+a ward hold one copy of its records. Records are never modified in place while shared:
+a session copies a record before its first edit (see `copy_for_edit`) and publishes a new
+version on commit, which reuses every untouched record from the previous version.
+A snapshot's columnar table is shared the same way: built once per version, and forked
+by the first session that needs to change it.
+"""
+import threading
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class Snapshot:
+    version: int
+    records: tuple
+    table: Any = None  # ColumnarTable mirroring exactly `records`; read-only while shared
+    changes: Any = None  # (previous version, ((before, after), ...)) when published as a delta, else None
+
+
+class SnapshotRegistry:
+    """Latest committed Snapshot per (ward, collection). Shared collections use ward None."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = {}
+
+    def get(self, ward, collection):
+        return self._snapshots.get((ward, collection))
+
+    def publish(self, ward, collection, records, table=None, changes=None):
+        """Commits `records` as the next version; last writer wins, as with the shard files.
+
+        `changes` lists the (before, after) record pairs that turn the previous version into
+        this one (None before an insert or after a delete), so readers can update by delta."""
+        with self._lock:
+            previous = self._snapshots.get((ward, collection))
+            version = previous.version if previous else 0
+            snapshot = Snapshot(version + 1, tuple(records), table, None if changes is None else (version, tuple(changes)))
+            self._snapshots[(ward, collection)] = snapshot
+            return snapshot
+
+    def publish_initial(self, ward, collection, records):
+        """The current snapshot, or `records` as version 1 if no session has loaded the collection yet."""
+        with self._lock:
+            snapshot = self._snapshots.get((ward, collection))
+            if snapshot is None:
+                snapshot = self._snapshots[(ward, collection)] = Snapshot(1, tuple(records))
+            return snapshot
+
+    def table(self, snapshot, build):
+        """The snapshot's shared columnar table, built by the first session that asks for it."""
+        if snapshot.table is None:
+            with self._lock:
+                if snapshot.table is None:
+                    snapshot.table = build(snapshot.records)
+        return snapshot.table
+
+
+def copy_for_edit(records, record, private_ids):
+    """Replaces a shared `record` in the session list `records` by a private copy and returns it.
+
+    `private_ids` holds the ids of records this session already copied since its last
+    commit; those are edited in place. Pass the record itself, not a copy of it.
+    """
+    if id(record) in private_ids:
+        return record
+    index = next(i for i, r in enumerate(records) if r is record)
+    copy = dict(record)
+    records[index] = copy
+    private_ids.add(id(copy))
+    return copy
+
+
+def copy_rows_for_edit(records, rows, private_ids):
+    """Batch `copy_for_edit` for the records at list positions `rows`; returns the private copies.
+
+    Positions come from the collection's columnar table, so no record is searched for."""
+    copies = []
+    for row in rows:
+        record = records[row]
+        if id(record) not in private_ids:
+            record = records[row] = dict(record)
+            private_ids.add(id(record))
+        copies.append(record)
+    return copies
@@ -0,0 +1,351 @@
+"""Ward-sharded JSON storage.
+
+Each ward's patients, rooms and dependent records (appointments, treatment plans,
+diagnosis, billing, room events) live in their own shard directory (one file per
+collection), so a session only reads and writes its own ward. Hospital-wide data
+(doctors) lives in a shared shard, and a small manifest holds the ward list and the
+global primary-key sequences. Cross-ward reports fan out over the shards with `fan_out`.
+
+The app and the batch CLI (`python -m poms`) can use one store from separate processes.
+Id allocation and every shard write hold an exclusive lock on `_store.lock` (flock, where
+the platform has it) as well as the in-process lock. A save merges rather than overwrites
+when another process wrote the file since this one last read or wrote it: the store
+remembers the records each tracked read or save left in memory (the base), and applies
+only the saver's changes against that base - inserts, edits and deletes by primary key -
+to the file as it is now. The merged file then differs from what this process holds, so
+it is reported as diverged until it is read again (the watcher reloads it).
+"""
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): only the in-process lock applies
+    fcntl = None
+
+DEFAULT_WARD = "Pediatric Oncology"
+
+ID_FIELDS = {
+    "patients": "patient_id",
+    "doctors": "doctor_id",
+    "rooms": "room_id",
+    "appointments": "appointment_id",
+    "treatment_plans": "plan_id",
+    "diagnosis": "diagnosis_id",
+    "billing": "bill_id",
+    "room_events": "event_id"
+}
+COLLECTIONS = list(ID_FIELDS)
+SHARED_COLLECTIONS = ["doctors"]
+WARD_COLLECTIONS = [c for c in COLLECTIONS if c not in SHARED_COLLECTIONS]
+
+MANIFEST_FILE = "_manifest.json"
+LOCK_FILE = "_store.lock"
+SHARED_DIR = "_shared"
+
+
+def _ward_slug(ward):
+    return re.sub(r'[^a-z0-9]+', '_', ward.lower()).strip('_') or 'ward'
+
+
+def _write_json(path, payload, fsync=False):
+    """Writes via a temp file + rename so a crash never leaves a half-written shard."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, indent=4)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def max_id(records, id_field):
+    """Largest integer primary key in `records`, 0 if none (string ids from imported files don't count)."""
+    return max((key for key in (r.get(id_field) for r in records) if type(key) is int), default=0)
+
+
+def _signature(stat):
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def merge_records(id_field, base, ours, theirs):
+    """`theirs` with the changes that turned `base` ({id: record}) into `ours` applied by primary key.
+
+    Records `ours` inserted or edited replace theirs (or are appended); records it deleted
+    are dropped; everything else - including what `theirs` added - is kept as it is."""
+    ours_by_id = {r.get(id_field): r for r in ours}
+    changed = {key: r for key, r in ours_by_id.items() if base.get(key) is not r and base.get(key) != r}
+    merged, seen = [], set()
+    for record in theirs:
+        key = record.get(id_field)
+        seen.add(key)
+        if key in base and key not in ours_by_id:
+            continue
+        merged.append(changed.get(key, record))
+    merged.extend(record for key, record in changed.items() if key not in seen)
+    return merged
+
+
+def partition_by_ward(data, default_ward=DEFAULT_WARD):
+    """Splits a full single-file dataset into {ward: {collection: [...]}} plus the shared collections.
+
+    Rooms and patients carry a 'ward' field (defaulted when missing); every dependent
+    record follows its patient's ward and room events follow their room's ward.
+    """
+    wards = {}
+
+    def shard(ward):
+        return wards.setdefault(ward, {c: [] for c in WARD_COLLECTIONS})
+
+    room_ward = {}
+    for r in data.get('rooms', []):
+        r.setdefault('ward', default_ward)
+        room_ward[r['room_id']] = r['ward']
+        shard(r['ward'])['rooms'].append(r)
+
+    occupied_room_ward = {r.get('patient_id'): r['ward'] for r in data.get('rooms', []) if r.get('patient_id') is not None}
+    patient_ward = {}
+    for p in data.get('patients', []):
+        p.setdefault('ward', occupied_room_ward.get(p['patient_id'], default_ward))
+        patient_ward[p['patient_id']] = p['ward']
+        shard(p['ward'])['patients'].append(p)
+
+    for collection in ("appointments", "treatment_plans", "diagnosis", "billing"):
+        for record in data.get(collection, []):
+            shard(patient_ward.get(record.get('patient_id'), default_ward))[collection].append(record)
+    for event in data.get('room_events') or []:
+        shard(room_ward.get(event.get('room_id'), default_ward))['room_events'].append(event)
+
+    shared = {c: data.get(c, []) for c in SHARED_COLLECTIONS}
+    return wards, shared
+
+
+class ShardedStore:
+    """One directory per ward with one JSON file per collection, plus a shared directory and a manifest.
+
+    Collections are stored separately so a page can load just the collections it uses
+    (`load_collections`) and a save only rewrites the collections the session holds.
+    Shard files are replaced atomically; the manifest's read-modify-write and every shard
+    write are locked across threads and processes, so the background writer thread, the
+    sessions and batch jobs can use one store concurrently.
+    """
+
+    def __init__(self, root, fsync=False):
+        self.root = root
+        self.fsync = fsync
+        self._shared_written = {}  # collection -> last serialised payload, to skip redundant writes
+        self._lock = threading.RLock()  # guards the manifest's read-modify-write and the shard writes
+        self._lock_depth = 0  # nesting of locked() in the thread holding _lock
+        self._lock_file = None
+        self._bases = {}  # (ward or None, collection) -> {id: record} as last read (tracked) or saved here
+        self._synced = {}  # (ward or None, collection) -> file signature while the file holds exactly the base
+        self._diverged = set()  # keys whose file was merged with another process's writes since
+        self._upgraded = set()  # wards whose on-disk layout has been checked by this store
+
+    @contextmanager
+    def locked(self):
+        """Exclusive access to the manifest and the shard files, across threads and processes (reentrant)."""
+        with self._lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                os.makedirs(self.root, exist_ok=True)
+                self._lock_file = open(self._path(LOCK_FILE), 'a')
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_file is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def _path(self, *names):
+        return os.path.join(self.root, *names)
+
+    @staticmethod
+    def _key(ward, collection):
+        return None if collection in SHARED_COLLECTIONS else ward, collection
+
+    def _ward_dir(self, ward):
+        return self._path(f"ward_{_ward_slug(ward)}")
+
+    def _collection_path(self, ward, collection):
+        if collection in SHARED_COLLECTIONS:
+            return self._path(SHARED_DIR, f"{collection}.json")
+        return os.path.join(self._ward_dir(ward), f"{collection}.json")
+
+    def _manifest(self):
+        return _read_json(self._path(MANIFEST_FILE), {"wards": [], "sequences": {}})
+
+    def _save_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        _write_json(self._path(MANIFEST_FILE), manifest, self.fsync)
+
+    def _write_collections(self, ward, data):
+        with self.locked():
+            os.makedirs(self._ward_dir(ward), exist_ok=True)
+            os.makedirs(self._path(SHARED_DIR), exist_ok=True)
+            for collection, records in data.items():
+                if collection in SHARED_COLLECTIONS:
+                    serialised = json.dumps(records, sort_keys=True)
+                    if serialised == self._shared_written.get(collection):
+                        continue
+                    self._shared_written[collection] = serialised
+                self._write_collection(ward, collection, records)
+
+    def _write_collection(self, ward, collection, records):
+        """Writes one shard file (under the lock), merged with another process's writes if there were any."""
+        key, path = self._key(ward, collection), self._collection_path(ward, collection)
+        base = self._bases.get(key)
+        written = records
+        if base is not None and self.signature(ward, collection) != self._synced.get(key):
+            theirs = _read_json(path, None)  # written by someone else since we last read or wrote it
+            if theirs is not None:
+                written = merge_records(ID_FIELDS[collection], base, records, theirs)
+        _write_json(path, written, self.fsync)
+        self._bases[key] = {r.get(ID_FIELDS[collection]): r for r in records}
+        if written is records:
+            self._synced[key] = self.signature(ward, collection)
+            self._diverged.discard(key)
+        else:
+            self._synced.pop(key, None)
+            self._diverged.add(key)
+
+    def _split_single_file_shard(self, ward):
+        """Upgrades a ward stored as one ward_<name>.json file to the per-collection layout.
+
+        Checked once per ward by this store, under the lock, so two processes upgrading the
+        same ward cannot both split it (the second finds the files already gone)."""
+        if ward in self._upgraded:
+            return
+        with self.locked():
+            legacy_path = f"{self._ward_dir(ward)}.json"
+            if os.path.exists(legacy_path) and not os.path.isdir(self._ward_dir(ward)):
+                data = _read_json(legacy_path, {})
+                self._write_collections(ward, {c: data.get(c, []) for c in WARD_COLLECTIONS})
+                os.remove(legacy_path)
+            legacy_shared = self._path("_shared.json")
+            if os.path.exists(legacy_shared):
+                shared = _read_json(legacy_shared, {})
+                self._write_collections(ward, {c: shared.get(c, []) for c in SHARED_COLLECTIONS})
+                os.remove(legacy_shared)
+            self._upgraded.add(ward)
+
+    def list_wards(self):
+        return list(self._manifest()["wards"])
+
+    def has_ward(self, ward):
+        return ward in self.list_wards()
+
+    def create_ward(self, ward):
+        """Registers a new, empty ward shard."""
+        with self.locked():
+            manifest = self._manifest()
+            if ward not in manifest["wards"]:
+                manifest["wards"].append(ward)
+                self._save_manifest(manifest)
+                self._write_collections(ward, {c: [] for c in WARD_COLLECTIONS})
+
+    def load_collections(self, ward, collections, track=False):
+        """Reads only the requested collections of one ward (shared ones come from the shared shard).
+
+        `track` marks the records read as the ones this process now holds in memory (the
+        base its next save of them is merged against); reads for reports and backups leave it off."""
+        self._split_single_file_shard(ward)
+        result = {}
+        for collection in collections:
+            result[collection] = self._read_collection(ward, collection, track)
+            if collection in SHARED_COLLECTIONS:
+                self._shared_written[collection] = json.dumps(result[collection], sort_keys=True)
+        return result
+
+    def _read_collection(self, ward, collection, track):
+        try:
+            with open(self._collection_path(ward, collection), 'r') as f:
+                signature = _signature(os.fstat(f.fileno()))  # of the file actually read, even if replaced meanwhile
+                records = json.load(f)
+        except FileNotFoundError:
+            signature, records = None, []
+        if track:
+            key = self._key(ward, collection)
+            self._bases[key] = {r.get(ID_FIELDS[collection]): r for r in records}
+            self._synced[key] = signature
+            self._diverged.discard(key)
+        return records
+
+    def diverged(self, ward, collection):
+        """True if the file holds another process's changes merged in by our last save (not read back yet)."""
+        return self._key(ward, collection) in self._diverged
+
+    def signature(self, ward, collection):
+        """(mtime_ns, size, inode) of a collection's shard file, or None if it does not exist.
+
+        Every write replaces the file, so any write - ours or another process's - changes it."""
+        try:
+            return _signature(os.stat(self._collection_path(ward, collection)))
+        except FileNotFoundError:
+            return None
+
+    def load_ward(self, ward):
+        """Reads every collection of one ward plus the shared collections - never the other wards."""
+        return self.load_collections(ward, COLLECTIONS)
+
+    def save_ward(self, ward, data):
+        """Writes the given collections of a ward; collections not in `data` are left untouched on disk."""
+        with self.locked():
+            if not self.has_ward(ward):
+                self.create_ward(ward)
+            self._write_collections(ward, {c: data[c] for c in COLLECTIONS if c in data})
+            self.sync_sequences(data)
+
+    def sync_sequences(self, data):
+        """Raises the global key sequences to cover the ids present in `data` (e.g. after an import)."""
+        with self.locked():
+            manifest = self._manifest()
+            changed = False
+            for collection, id_field in ID_FIELDS.items():
+                local_max = max_id(data.get(collection, []), id_field)
+                if local_max > manifest["sequences"].get(collection, 0):
+                    manifest["sequences"][collection] = local_max
+                    changed = True
+            if changed:
+                self._save_manifest(manifest)
+
+    def allocate_id(self, collection, local_max=0):
+        """Next primary key for `collection`, unique across every ward shard and every process."""
+        with self.locked():
+            manifest = self._manifest()
+            new_id = max(manifest["sequences"].get(collection, 0), local_max) + 1
+            manifest["sequences"][collection] = new_id
+            self._save_manifest(manifest)
+            return new_id
+
+    def migrate_legacy_file(self, legacy_path):
+        """Splits an old single-file backend into ward shards (only if no shards exist yet)."""
+        with self.locked():
+            if self.list_wards() or not os.path.exists(legacy_path):
+                return False
+            wards, shared = partition_by_ward(_read_json(legacy_path, {}))
+            if not wards:
+                wards = {DEFAULT_WARD: {c: [] for c in WARD_COLLECTIONS}}
+            for ward, data in wards.items():
+                self._write_collections(ward, dict(data, **shared))
+            self._save_manifest({"wards": sorted(wards), "sequences": {}})
+            for data in wards.values():
+                self.sync_sequences(dict(data, **shared))
+            return True
+
+    def fan_out(self, fn, collections=COLLECTIONS):
+        """Applies fn(ward, data) to every ward shard in turn, reading only `collections`."""
+        return {ward: fn(ward, self.load_collections(ward, collections)) for ward in self.list_wards()}
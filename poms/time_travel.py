@@ -0,0 +1,130 @@
+"""Point-in-time reconstruction of a ward from its backups and the audit trail.
+
+The backups (poms.backups) are the checkpoints: the state as of the newest backup taken
+at or before the requested moment is rebuilt from its chain, then the audit entries
+logged after it are replayed forward up to that moment. Moments before the first backup
+are reached by undoing entries backwards from it instead (creates keep the new record,
+deletes the old one and updates both values, so every entry can be undone). Backups are
+taken at least every few minutes of activity, so a reconstruction reads one chain (at
+most `full_every` diffs) and a few minutes of audit entries whatever the date. Rebuilt
+checkpoints and results are kept in small LRUs.
+
+Replay starts `SLACK` before the checkpoint: an entry may be logged just before a backup
+whose save did not yet include it. Replaying forward is idempotent (a create or update
+writes the logged values, a delete removes), so overlapping entries are harmless.
+The room event log is append-only and timestamped, so it is simply filtered by time.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from poms.storage import COLLECTIONS, ID_FIELDS
+
+SLACK = timedelta(seconds=60)
+REPLACE_ACTIONS = ("import", "clear", "restore")  # whole-ward replacements: a backup is taken right after each
+CHECKPOINT_CACHE = 8
+RESULT_CACHE = 8
+
+
+def _apply(state, entry, undo=False):
+    """Applies (or undoes) one audit entry to {collection: {id: record}} in place; records are replaced, never modified."""
+    records = state.get(entry["entity"])
+    if records is None:
+        return
+    key, action, changes = entry["id"], entry["action"], entry["changes"]
+    if action in ("create", "delete"):
+        if (action == "create") != undo:  # a create, or an undone delete, puts the logged record back
+            records[key] = dict(changes["after" if action == "create" else "before"])
+        else:
+            records.pop(key, None)
+    elif action == "update":
+        current = records.get(key)
+        if current is not None:
+            records[key] = {**current, **{field: values[0 if undo else 1] for field, values in changes.items()}}
+    elif action in ("assign", "vacate"):
+        current = records.get(key)
+        if current is not None:
+            patient_id = changes["patient_id"][0 if undo else 1]
+            records[key] = {**current, "patient_id": patient_id,
+                            "occupancy_status": "Occupied" if patient_id is not None else "Vacant"}
+
+
+class TimeMachine:
+    """Rebuilds collections of a ward as they were at a past moment (read-only results)."""
+
+    def __init__(self, backups, audit_log, store):
+        self.backups = backups
+        self.audit_log = audit_log
+        self.store = store
+        self._checkpoints = OrderedDict()  # (ward, seq) -> {collection: {id: record}}
+        self._results = OrderedDict()  # (ward, moment, collections, backups, audit entries) -> result
+        self._lock = threading.Lock()
+        self.replayed = 0  # audit entries replayed by the latest reconstruction
+
+    def _lru_get(self, cache, key):
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        return None
+
+    def _lru_put(self, cache, key, value, size):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > size:
+                cache.popitem(last=False)
+
+    def _checkpoint(self, ward, seq):
+        state = self._lru_get(self._checkpoints, (ward, seq))
+        if state is None:
+            state = {name: {r.get(ID_FIELDS[name]): r for r in records}
+                     for name, records in self.backups.restore(ward, seq, COLLECTIONS).items()}
+            self._lru_put(self._checkpoints, (ward, seq), state, CHECKPOINT_CACHE)
+        return state
+
+    def _entries(self, ward, start, end):
+        """Audit entries of the ward (and hospital-wide doctors) with start <= ts <= end, oldest first."""
+        start_ts, end_ts = start.isoformat(timespec='seconds'), end.isoformat(timespec='seconds')
+        return [e for e in self.audit_log.query(start=start.date(), end=end.date())
+                if start_ts <= e["ts"] <= end_ts and (e["ward"] == ward or e["entity"] == "doctors")]
+
+    def state_as_of(self, ward, moment, collections):
+        """{collection: records} of `ward` as of `moment` (a datetime); empty lists before any backup exists."""
+        collections = tuple(collections)
+        entries = self.backups.backups(ward)
+        self.audit_log.refresh()  # entries appended by batch jobs count towards the cache key
+        key = (ward, moment, collections, entries[-1]["seq"] if entries else 0, self.audit_log.entries)
+        result = self._lru_get(self._results, key)
+        if result is not None:
+            return result
+        moment_ts = moment.isoformat(timespec='seconds')
+        before = [e for e in entries if e["taken_at"] <= moment_ts]
+        state = {name: {} for name in collections if name != "room_events"}
+        if before:
+            checkpoint = before[-1]
+            state.update({name: dict(records) for name, records in self._checkpoint(ward, checkpoint["seq"]).items()
+                          if name in state})
+            log = self._entries(ward, datetime.fromisoformat(checkpoint["taken_at"]) - SLACK, moment)
+            # Entries up to a whole-ward replacement the checkpoint already includes are superseded by it
+            replaced = [i for i, e in enumerate(log) if e["action"] in REPLACE_ACTIONS and e["ts"] <= checkpoint["taken_at"]]
+            log = log[replaced[-1] + 1:] if replaced else log
+            for entry in log:
+                _apply(state, entry)
+        elif entries:
+            first = entries[0]
+            state.update({name: dict(records) for name, records in self._checkpoint(ward, first["seq"]).items()
+                          if name in state})
+            log = self._entries(ward, moment, datetime.fromisoformat(first["taken_at"]))
+            log = [e for e in log if e["ts"] > moment_ts]
+            for entry in reversed(log):
+                _apply(state, entry, undo=True)
+        else:
+            log = []
+        self.replayed = len(log)
+        result = {name: list(records.values()) for name, records in state.items()}
+        if "room_events" in collections:
+            events = self.store.load_collections(ward, ["room_events"])["room_events"]
+            result["room_events"] = [e for e in events if e["timestamp"] <= moment_ts]
+        self._lru_put(self._results, key, result, RESULT_CACHE)
+        return result
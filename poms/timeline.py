@@ -0,0 +1,99 @@
+"""Per-patient clinical timeline: appointments, diagnoses, plan start/end, room events and bills.
+
+`PatientTimelineIndex` keeps, for every patient and source collection, that patient's
+timeline items sorted by date. It is built once from the collections and then kept
+current by delta (`add`/`remove` per record, O(log k + k) for a patient with k items of
+that kind). A timeline is the k-way `heapq.merge` of the patient's per-source lists, so
+reading one page touches only the items before it and never sorts or scans other
+patients' records; `page` slices the merge lazily.
+"""
+import heapq
+from bisect import bisect_left
+from itertools import islice
+from typing import Any, NamedTuple, Optional
+
+from poms.storage import ID_FIELDS
+
+SOURCES = ("appointments", "diagnosis", "treatment_plans", "room_events", "billing")
+ROOM_EVENT_KINDS = {"occupy": "Room occupied", "vacate": "Room vacated", "transfer": "Room transfer"}
+DEFAULT_PAGE_SIZE = 25
+
+
+class TimelineItem(NamedTuple):
+    when: str  # ISO date or date-time; sorts chronologically as a string
+    source: str
+    record_id: Any
+    part: int  # 0, or 1 for a plan's end (one plan contributes two items)
+    kind: str
+    record: Optional[dict]  # never compared: (when, source, record_id, part) is unique
+
+
+def timeline_items(source, record):
+    """The items one record contributes to its patient's timeline (none if it has no date)."""
+    record_id = record.get(ID_FIELDS[source])
+    if source == "appointments":
+        when = f"{record['date']}T{record['time']}" if record.get('date') and record.get('time') else record.get('date')
+        items = [(when, 0, "Appointment")]
+    elif source == "diagnosis":
+        items = [(record.get('date'), 0, "Diagnosis")]
+    elif source == "treatment_plans":
+        items = [(record.get('start_date'), 0, "Plan start"), (record.get('end_date'), 1, "Plan end")]
+    elif source == "room_events":
+        items = [(record.get('timestamp'), 0, ROOM_EVENT_KINDS.get(record.get('event'), "Room"))]
+    else:
+        items = [(record.get('date'), 0, "Bill")]
+    return [TimelineItem(str(when), source, record_id, part, kind, record) for when, part, kind in items if when]
+
+
+class PatientTimelineIndex:
+    """Sorted per-patient, per-source item lists, maintained by delta."""
+
+    def __init__(self, data=None):
+        self._lists = {}  # patient_id -> {source: [TimelineItem, ...] sorted}
+        for source in SOURCES:
+            for record in (data or {}).get(source, ()):
+                if record.get('patient_id') is not None:
+                    self._lists.setdefault(record['patient_id'], {}).setdefault(source, []).extend(timeline_items(source, record))
+        for lists in self._lists.values():
+            for items in lists.values():
+                items.sort(key=lambda item: item[:4])  # one sort per list instead of an insert per item
+
+    def add(self, source, record):
+        patient_id = record.get('patient_id')
+        if patient_id is None:
+            return
+        items = self._lists.setdefault(patient_id, {}).setdefault(source, [])
+        for item in timeline_items(source, record):
+            i = bisect_left(items, item[:4])  # a 4-tuple prefix sorts just before its item
+            if i < len(items) and items[i][:4] == item[:4]:
+                items[i] = item  # already indexed: replace rather than duplicate
+            else:
+                items.insert(i, item)
+
+    def remove(self, source, record):
+        """Removes the items `record` (as it was when added) contributed."""
+        items = self._lists.get(record.get('patient_id'), {}).get(source)
+        if not items:
+            return
+        for item in timeline_items(source, record):
+            i = bisect_left(items, item[:4])
+            if i < len(items) and items[i][:4] == item[:4]:
+                del items[i]
+
+    def update(self, source, before, after):
+        self.remove(source, before)
+        self.add(source, after)
+
+    def count(self, patient_id):
+        return sum(len(items) for items in self._lists.get(patient_id, {}).values())
+
+    def timeline(self, patient_id, newest_first=True, sources=SOURCES):
+        """Lazy k-way merge of the patient's items across `sources`, in date order."""
+        lists = self._lists.get(patient_id, {})
+        streams = [reversed(lists[s]) if newest_first else iter(lists[s]) for s in sources if lists.get(s)]
+        return heapq.merge(*streams, reverse=newest_first)
+
+    def page(self, patient_id, page=0, size=DEFAULT_PAGE_SIZE, newest_first=True, sources=SOURCES):
+        """(items on page `page`, whether another page follows), reading the merge only that far."""
+        items = list(islice(self.timeline(patient_id, newest_first, sources), page * size, (page + 1) * size + 1))
+        return items[:size], len(items) > size
@@ -0,0 +1,184 @@
+"""Sampled tracing spans for offline profiling, written as NDJSON to a rotating file.
+
+`Tracer.trace(name)` opens the root of a trace around one unit of work (a rerun, a writer
+batch); whether the trace is recorded is decided once, at the root, from the sampling rate.
+Inside a sampled trace `Tracer.span(name)` nests, and outside one it returns a shared no-op
+context manager, so unsampled reruns pay one context-variable lookup per span.
+
+A finished trace is written in one block, one line per span, in the order spans opened:
+trace and span ids, parent id, depth, the semicolon-joined stack `path`, start time, total
+and self duration (ms) and attributes. `pd.read_json(path, lines=True)` loads the file as
+is, and `collapsed_stacks` turns it into the "a;b;c <value>" format flame-graph tools read.
+`profiled(path)` is the heavier option: a full cProfile capture of one block (one rerun).
+"""
+import contextvars
+import cProfile
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from logging.handlers import RotatingFileHandler
+
+ENV_SAMPLE = "POMS_TRACE_SAMPLE"
+MAX_BYTES = 5 * 1024 * 1024  # per trace file before it rotates
+BACKUPS = 5  # rotated files kept (traces.ndjson.1 ... .5)
+
+_NOOP = nullcontext()
+_current = contextvars.ContextVar("poms_span", default=None)
+
+
+class _Span:
+    __slots__ = ("trace", "id", "parent", "name", "path", "depth", "attrs", "ts", "start",
+                 "child_ms", "error", "spans", "ids")
+
+    def __init__(self, name, attrs, parent=None):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.ts = time.time()
+        self.start = time.perf_counter()
+        self.child_ms = 0.0
+        self.error = None
+        if parent is None:
+            self.trace = uuid.uuid4().hex[:16]
+            self.ids = itertools.count(1)
+            self.path = name
+            self.depth = 0
+            self.spans = []  # finished spans of the whole trace, shared by every span in it
+        else:
+            self.trace = parent.trace
+            self.spans = parent.spans
+            self.ids = parent.ids
+            self.path = f"{parent.path};{name}"
+            self.depth = parent.depth + 1
+        self.id = next(self.ids)
+
+
+class Tracer:
+    """Process-wide tracer; sessions and the writer thread each nest spans in their own context."""
+
+    def __init__(self, sample_rate=None):
+        self.sample_rate = float(os.environ.get(ENV_SAMPLE, "0")) if sample_rate is None else sample_rate
+        self.path = None
+        self.traces_written = 0
+        self._handler = None
+        self._lock = threading.Lock()
+
+    def configure(self, path, max_bytes=MAX_BYTES, backups=BACKUPS):
+        """Sends finished traces to `path`, rotated at `max_bytes` with `backups` older files kept."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        with self._lock:
+            if self._handler is not None:
+                self._handler.close()
+            self._handler = handler
+            self.path = path
+
+    @contextmanager
+    def trace(self, name, force=False, **attrs):
+        """Root span of a trace, recorded with probability `sample_rate` (always with `force`).
+
+        Inside an active trace this is just a nested span."""
+        if _current.get() is not None:
+            with self.span(name, **attrs):
+                yield
+            return
+        if self._handler is None or not (force or (self.sample_rate > 0 and random.random() < self.sample_rate)):
+            yield
+            return
+        with self._open(_Span(name, attrs)):
+            yield
+
+    def span(self, name, **attrs):
+        """A child of the current span, or a no-op outside a sampled trace."""
+        parent = _current.get()
+        if parent is None:
+            return _NOOP
+        return self._open(_Span(name, attrs, parent))
+
+    @contextmanager
+    def _open(self, span):
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__  # includes Streamlit's rerun/stop control-flow exceptions
+            raise
+        finally:
+            _current.reset(token)
+            self._close(span)
+
+    def _close(self, span):
+        ms = (time.perf_counter() - span.start) * 1000
+        if span.parent is not None:
+            span.parent.child_ms += ms
+        span.spans.append({
+            "trace": span.trace,
+            "span": span.id,
+            "parent": span.parent.id if span.parent is not None else None,
+            "name": span.name,
+            "path": span.path,
+            "depth": span.depth,
+            "ts": round(span.ts, 6),
+            "ms": round(ms, 3),
+            "self_ms": round(ms - span.child_ms, 3),
+            "error": span.error,
+            "attrs": span.attrs,
+        })
+        if span.parent is None:
+            self._write(span.spans)
+
+    def _write(self, spans):
+        spans.sort(key=lambda s: s["span"])
+        block = "\n".join(json.dumps(s, separators=(',', ':'), default=str) for s in spans)
+        with self._lock:
+            handler = self._handler
+            self.traces_written += 1
+        if handler is not None:
+            # Handler used directly (not via a logger), so logging configuration cannot drop traces;
+            # one record per trace, so rotation never splits a tree across files
+            handler.handle(logging.makeLogRecord({"msg": block}))
+
+def collapsed_stacks(path):
+    """Folds a trace file into {'a;b;c': total self time in microseconds} for flame-graph tools."""
+    totals = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                span = json.loads(line)
+                totals[span["path"]] = totals.get(span["path"], 0) + int(span["self_ms"] * 1000)
+    return totals
+
+
+@contextmanager
+def profiled(path, top=25):
+    """cProfiles the block, dumps the stats to `path` (for snakeviz/pstats) and yields a dict
+    whose 'report' is filled with the top `top` functions by cumulative time on exit."""
+    result = {"path": path, "report": None}
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError as e:  # Python 3.12+: only one profiler may be active per process
+        result["report"] = f"Profiling unavailable: {e}"
+        yield result
+        return
+    try:
+        yield result
+    finally:
+        profile.disable()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profile.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(top)
+        result["report"] = out.getvalue()
+
+
+TRACER = Tracer()
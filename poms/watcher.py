@@ -0,0 +1,94 @@
+"""Detection of shard files edited outside the app (another process, an admin with an editor).
+
+`ShardWatcher` remembers the signature (mtime, size, inode) of every shard file as the
+app last read or wrote it. `poll` re-stats the watched files at most once per `interval`
+and parses only the files whose signature changed - once per process, under a lock, so
+however many sessions are open a changed file is read once. `diff_records` then compares
+the file with the in-memory version by primary key: unchanged records keep their
+existing dicts and only the (before, after) pairs of changed records are returned, for
+the caller to publish and apply to its indexes.
+
+The app's own saves are reported with `note` (the writer hook) so they never look like
+external edits, and files are not polled while a save is in flight (the file is then
+older than memory). A batch job's save and the app's are merged by the store (see
+poms.storage): when our save had to merge another process's records into the file,
+`note` leaves the file unknown, so the next poll reads the merged file back. An edit made
+by hand and an app save of the same file race as any two unlocked writers do: the last
+write wins.
+"""
+import threading
+import time
+
+from poms.storage import SHARED_COLLECTIONS
+
+DEFAULT_INTERVAL = 2.0  # seconds between stats of the same file
+
+
+def diff_records(id_field, current, incoming):
+    """(records, changes) turning `current` into `incoming` by primary key.
+
+    `records` keeps the current order and dicts for unchanged records, replaces changed
+    ones in place and appends new ones; `changes` holds (before, after) pairs with None
+    for the missing side of an insert or a delete."""
+    incoming_by_id = {r.get(id_field): r for r in incoming}
+    records, changes, seen = [], [], set()
+    for record in current:
+        key = record.get(id_field)
+        seen.add(key)
+        new = incoming_by_id.get(key)
+        if new is None:
+            changes.append((record, None))
+        elif new != record:
+            changes.append((record, new))
+            records.append(new)
+        else:
+            records.append(record)
+    for key, record in incoming_by_id.items():
+        if key not in seen:
+            changes.append((None, record))
+            records.append(record)
+    return records, changes
+
+
+class ShardWatcher:
+    """mtime polling of the shard files sessions have loaded, shared by every session."""
+
+    def __init__(self, store, interval=DEFAULT_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self._known = {}  # (ward or None, collection) -> file signature as last read or written here
+        self._checked = {}  # (ward or None, collection) -> monotonic time of the last stat
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(ward, collection):
+        return None if collection in SHARED_COLLECTIONS else ward, collection
+
+    def note(self, ward, collections):
+        """Records the current files as the app's own version (call before reading them, or after writing).
+
+        A file our save merged with another process's changes is not ours: it is re-read on the next poll."""
+        with self._lock:
+            for collection in collections:
+                diverged = self.store.diverged(ward, collection)
+                self._known[self._key(ward, collection)] = None if diverged else self.store.signature(ward, collection)
+
+    def poll(self, ward, collections, force=False):
+        """{collection: records read from disk} for the watched files changed by someone else since last seen."""
+        now = time.monotonic()
+        changed = {}
+        with self._lock:
+            for collection in collections:
+                key = self._key(ward, collection)
+                if key not in self._known or (not force and now - self._checked.get(key, 0) < self.interval):
+                    continue
+                self._checked[key] = now
+                signature = self.store.signature(ward, collection)
+                if signature is None or signature == self._known[key]:
+                    continue
+                self._known[key] = signature
+                try:
+                    changed[collection] = self.store.load_collections(ward, [collection], track=True)[collection]
+                except ValueError:  # caught mid-edit (not valid JSON yet): retry on a later poll
+                    self._known[key] = None
+        return changed
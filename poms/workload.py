@@ -0,0 +1,119 @@
+"""Per-doctor workload: active patients, upcoming appointments, active plans and billed revenue.
+
+`DoctorWorkload` is built once from the collections and then kept current by delta
+(`add`/`remove`/`update` per record, like the receivables ledger). Counts that depend on
+today's date are not frozen at build time: each doctor keeps the sorted dates of their
+appointments and of their plans' starts and ends, so "upcoming" and "active" are two
+bisects at read time. Bills carry no doctor, so revenue is attributed to the patient's
+attending doctor; the billed total per patient is kept so that reassigning a patient
+moves their revenue in O(1).
+"""
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+
+COLLECTIONS = ("patients", "appointments", "treatment_plans", "billing")
+
+
+def _remove(items, value):
+    i = bisect_left(items, value)
+    if i < len(items) and items[i] == value:
+        del items[i]
+
+
+def _date(value):
+    return str(value) if value else None
+
+
+class DoctorWorkload:
+    """Incrementally maintained caseload per doctor id."""
+
+    def __init__(self, data=None):
+        self.active_patients = {}  # doctor_id -> Admitted patients
+        self.appointment_dates = {}  # doctor_id -> sorted appointment dates
+        self.plan_starts = {}  # doctor_id -> sorted plan start dates
+        self.plan_ends = {}  # doctor_id -> sorted plan end dates (open-ended plans have none)
+        self.revenue = {}  # doctor_id -> billed amount of their patients' bills
+        self.patient_doctor = {}  # patient_id -> attending doctor_id
+        self.patient_billed = {}  # patient_id -> billed amount
+        self.version = 0
+        data = data or {}
+        for patient in data.get("patients", ()):
+            self.add("patients", patient)
+        for name in COLLECTIONS[1:]:
+            for record in data.get(name, ()):
+                self.add(name, record)
+
+    def _apply(self, collection, record, sign):
+        if collection == "patients":
+            patient_id, doctor_id = record.get('patient_id'), record.get('doctor_id')
+            if sign > 0:
+                self.patient_doctor[patient_id] = doctor_id
+            elif self.patient_doctor.get(patient_id) == doctor_id:
+                self.patient_doctor.pop(patient_id)
+            if doctor_id is None:
+                return
+            if record.get('status') == 'Admitted':
+                self.active_patients[doctor_id] = self.active_patients.get(doctor_id, 0) + sign
+            billed = self.patient_billed.get(patient_id, 0.0)
+            if billed:
+                self.revenue[doctor_id] = self.revenue.get(doctor_id, 0.0) + sign * billed
+        elif collection == "billing":
+            patient_id = record.get('patient_id')
+            amount = sign * float(record.get('amount') or 0.0)
+            self.patient_billed[patient_id] = self.patient_billed.get(patient_id, 0.0) + amount
+            doctor_id = self.patient_doctor.get(patient_id)
+            if doctor_id is not None:
+                self.revenue[doctor_id] = self.revenue.get(doctor_id, 0.0) + amount
+        elif collection == "appointments":
+            self._apply_date(self.appointment_dates, record.get('doctor_id'), _date(record.get('date')), sign)
+        elif collection == "treatment_plans":
+            doctor_id = record.get('doctor_id')
+            self._apply_date(self.plan_starts, doctor_id, _date(record.get('start_date')), sign)
+            if record.get('start_date'):
+                self._apply_date(self.plan_ends, doctor_id, _date(record.get('end_date')), sign)
+        else:
+            return
+        self.version += 1
+
+    @staticmethod
+    def _apply_date(table, doctor_id, value, sign):
+        if doctor_id is None or value is None:
+            return
+        if sign > 0:
+            insort(table.setdefault(doctor_id, []), value)
+        else:
+            _remove(table.get(doctor_id, []), value)
+
+    def add(self, collection, record):
+        """Delta for a newly inserted record."""
+        self._apply(collection, record, 1)
+
+    def remove(self, collection, record):
+        """Delta for a deleted record (as it was when added)."""
+        self._apply(collection, record, -1)
+
+    def update(self, collection, before, after):
+        """Delta for an edited record."""
+        self._apply(collection, before, -1)
+        self._apply(collection, after, 1)
+
+    def row(self, doctor_id, today=None):
+        """{'active_patients', 'upcoming_appointments', 'active_plans', 'billed'} for one doctor."""
+        today = str(today or date.today())
+        appointments = self.appointment_dates.get(doctor_id, [])
+        # A plan is active if it started by today and has not ended before today
+        started = bisect_right(self.plan_starts.get(doctor_id, []), today)
+        ended = bisect_left(self.plan_ends.get(doctor_id, []), today)
+        return {"active_patients": self.active_patients.get(doctor_id, 0),
+                "upcoming_appointments": len(appointments) - bisect_left(appointments, today),
+                "active_plans": started - ended,
+                "billed": round(self.revenue.get(doctor_id, 0.0), 2) + 0.0}  # never -0.0
+
+    def load(self, doctor_id, today=None):
+        """Sort key for assignment: active patients, then upcoming appointments, then active plans."""
+        row = self.row(doctor_id, today)
+        return row["active_patients"], row["upcoming_appointments"], row["active_plans"]
+
+    def least_loaded(self, doctor_ids, today=None):
+        """The doctor id in `doctor_ids` with the lightest load, or None if there are none."""
+        return min(doctor_ids, key=lambda doctor_id: self.load(doctor_id, today), default=None)
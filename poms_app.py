@@ -1,15 +1,62 @@
+import time
+_script_started = time.perf_counter() # Startup measurement: this rerun's imports and, once per process, the cold start
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from datetime import datetime, timedelta
+from collections import Counter
 import json
-import os 
+import functools
+import atexit
+from poms.receivables import ReceivablesLedger
+from poms.occupancy import make_room_event, seed_events_from_rooms, utilisation_report, daily_occupancy
+from poms.stay_analytics import GROUPINGS, build_stay_frame, stay_summary, overall_summary
+from poms.columnar import ColumnarTable
+from poms.chart_data import LEVEL_AXIS, LEVEL_CHOICES, LEVELS, prepare_series
+from poms.figure_cache import FigureCache
+from poms.events import (EventBus, DomainEvent, DataReplaced, RECORD_FIELDS, event_record, PatientAdmitted, PatientUpdated, PatientDischarged,
+                         PatientDeleted, DoctorCreated, DoctorUpdated, DoctorDeleted, RoomCreated, RoomUpdated, RoomDeleted,
+                         RoomAssigned, RoomVacated, AppointmentScheduled, AppointmentUpdated, AppointmentDeleted,
+                         TreatmentPlanCreated, TreatmentPlanUpdated, TreatmentPlanDeleted, DiagnosisRecorded,
+                         DiagnosisUpdated, DiagnosisDeleted, BillCreated, BillUpdated, BillDeleted, RecordsUpdated, RecordsDeleted)
+from poms.audit import ACTIONS, AuditLog, entries_from_event
+from poms.integrity import check as check_integrity, repair_plan
+from poms.room_state import reconcile as reconcile_rooms
+from poms.instrumentation import SESSIONS, STARTUP, TIMINGS, estimate_records_bytes, record_startup, timed
+from poms.lazy import lazy_import
+from poms.tracing import TRACER, profiled
+from poms.persistence import BackgroundWriter, snapshot_collections
+from poms.backups import BackupManager
+from poms.time_travel import TimeMachine
+from poms.timeline import SOURCES as TIMELINE_SOURCES, PatientTimelineIndex
+from poms.workload import COLLECTIONS as WORKLOAD_SOURCES, DoctorWorkload
+from poms.intervals import PlanIntervalIndex
+from poms.watcher import ShardWatcher, diff_records
+from poms.services import (APPOINTMENT_FEE, DIAGNOSIS_FEE, ROOM_CHARGE, TREATMENT_PLAN_FEE, export_payload, make_bill,
+                           prepare_import, summarise_ward)
+from poms.snapshots import SnapshotRegistry, copy_for_edit, copy_rows_for_edit
+from poms.sample_data import load_sample_data
+from poms.storage import COLLECTIONS, DEFAULT_WARD, ID_FIELDS, SHARED_COLLECTIONS, WARD_COLLECTIONS, ShardedStore, max_id
+
+# Heavy modules load on first use: pandas when a page builds a DataFrame, plotly when it draws a chart
+pd = lazy_import("pandas")
+px = lazy_import("plotly.express")
+record_startup("imports", time.perf_counter() - _script_started)
 
 # --- Configuration Constants ---
 PRIMARY_COLOR = '#009688'
 ACCENT_COLOR = '#4db6ac'
-BACKEND_FILE = 'poms_data.json' # Define the JSON file for persistent storage
+BACKEND_FILE = 'poms_data.json' # Legacy single-file backend (migrated into ward shards on first start)
+SHARD_DIR = 'poms_shards' # One JSON shard per ward + shared doctors + manifest
+AUDIT_DIR = f'{SHARD_DIR}/_audit' # Daily NDJSON audit segments (hospital-wide)
+TRACE_DIR = f'{SHARD_DIR}/_traces' # Sampled span traces (rotating NDJSON) and cProfile dumps
+BACKUP_DIR = f'{SHARD_DIR}/_backups' # Per-ward gzipped full snapshots and diffs
+BACKUP_INTERVAL_SECONDS = 300 # Automatic backups: at most one per ward per interval (on the next save)
+BACKUP_FULL_EVERY = 24 # Diffs between full snapshots
+BACKUP_KEEP_CHAINS = 7 # Full snapshots (with their diffs) kept per ward
+WATCH_INTERVAL_SECONDS = 2 # Shard files edited outside the app are picked up within this long (on the next rerun)
+ADMISSION_BUCKETS = 36 # 'Auto' admissions charts: most buckets before rolling up to a coarser level
+TREND_BUCKETS = 60 # 'Auto' receivables trend
+OCCUPANCY_BUCKETS = 366 # 'Auto' occupancy chart: daily for up to a year
 
 # Page configuration
 st.set_page_config(
@@ -59,301 +106,925 @@ st.markdown("""
 
 # --- Backend Persistence Functions (NEW) ---
 
-def save_data_to_backend():
-    """Saves all current session state data to the defined JSON file."""
-    data_to_save = {
-        "patients": st.session_state.patients,
-        "doctors": st.session_state.doctors,
-        "rooms": st.session_state.rooms,
-        "appointments": st.session_state.appointments,
-        "treatment_plans": st.session_state.treatment_plans,
-        "diagnosis": st.session_state.diagnosis,
-        "billing": st.session_state.billing,
-        "lastSaved": datetime.now().isoformat()
-    }
+def bump_data_version():
+    """Marks the in-memory data as changed so version-keyed caches recompute on next use."""
+    st.session_state.data_version = st.session_state.get('data_version', 0) + 1
+
+def cached_by_version(name, compute):
+    """Memoises compute() in the session until the data version changes."""
+    cache = st.session_state.setdefault('version_cache', {})
+    version = st.session_state.get('data_version', 0)
+    if name not in cache or cache[name][0] != version:
+        cache[name] = (version, compute())
+    return cache[name][1]
+
+@st.cache_resource
+def get_store():
+    """Ward-sharded backend, shared by every session in this server process."""
+    return ShardedStore(SHARD_DIR, fsync=True)
+
+@st.cache_resource
+def get_writer():
+    """Background writer thread shared by every session; flushed when the server process exits."""
+    watcher, backups = get_watcher(), get_backups()
+    def on_saved(ward, collections):
+        watcher.note(ward, collections) # Our own write: not an external edit
+        backups.record_save(ward, collections)
+    writer = BackgroundWriter(get_store(), on_saved=on_saved)
+    atexit.register(writer.close)
+    return writer
+
+@st.cache_resource
+def get_watcher():
+    """Polls the shard files sessions have loaded for edits made outside the app (shared by every session)."""
+    return ShardWatcher(get_store(), interval=WATCH_INTERVAL_SECONDS)
+
+@st.cache_resource
+def get_backups():
+    """Rotating per-ward backups (full snapshots plus diffs), taken by the writer thread after saves."""
+    return BackupManager(BACKUP_DIR, get_store(), full_every=BACKUP_FULL_EVERY, keep_chains=BACKUP_KEEP_CHAINS,
+                         min_interval=BACKUP_INTERVAL_SECONDS)
+
+def backup_ward(reason):
+    """PROCEDURE: Writes pending saves, then backs up the current ward now (before replacing its data)."""
+    flush_pending_saves()
+    return get_backups().snapshot(st.session_state.ward, reason=reason)
+
+@st.cache_resource
+def get_audit_log():
+    """Append-only audit trail shared by every session (indexes are rebuilt from the sidecars once)."""
+    return AuditLog(AUDIT_DIR)
+
+@st.cache_resource
+def get_tracer():
+    """Process-wide tracer writing sampled reruns to the rotating trace file (rate: POMS_TRACE_SAMPLE)."""
+    TRACER.configure(f"{TRACE_DIR}/traces.ndjson")
+    return TRACER
+
+@timed("backend.save")
+def save_data_to_backend(collections=None):
+    """Commits the given (default: all loaded) collections as shared snapshots and queues their save.
+
+    The background writer does the disk I/O."""
+    bump_data_version() # Every mutation path ends with a save
+    names = [name for name in (collections or st.session_state.loaded_collections) if name in st.session_state.loaded_collections]
+    commit_snapshots(names)
+    data_to_save = snapshot_collections({name: st.session_state[name] for name in names})
+    get_writer().submit(st.session_state.ward, data_to_save)
+
+def flush_pending_saves():
+    """Waits for queued saves so a shard read sees this session's own (and other sessions') writes."""
+    writer = get_writer()
+    if writer.pending():
+        writer.flush()
+
+@timed("backend.load")
+def load_data_from_backend():
+    """Opens the selected ward's shard for lazy loading, or returns False if not found/error.
+
+    Nothing is parsed here: each collection is read on first use by ensure_collections_loaded()."""
+    store = get_store()
     try:
-        with open(BACKEND_FILE, 'w') as f:
-            # We use the default encoder, assuming all dates are strings/None as per your structure
-            json.dump(data_to_save, f, indent=4)
-        st.toast("✅ Data persistently saved to backend JSON.", icon='💾')
+        store.migrate_legacy_file(BACKEND_FILE)
+        if not store.has_ward(st.session_state.ward):
+            return False
+        for name in st.session_state.get('loaded_collections', ()):
+            st.session_state.pop(name, None)
+        st.session_state.loaded_collections = set()
+        for key in ('snapshot_versions', 'private_records', 'columnar'):
+            st.session_state[key] = {}
+        st.session_state.pop('integrity_report', None) # The new ward is checked as its collections are read
+        st.session_state.pop('timeline_index', None)
+        st.session_state.pop('workload', None)
+        st.session_state.pop('plan_intervals', None)
+        bump_data_version()
+        return True
     except Exception as e:
-        st.error(f"Error saving data to backend: {e}")
-
-def load_data_from_backend():
-    """Loads data from the JSON file, or returns False if not found/error."""
-    if os.path.exists(BACKEND_FILE):
+        st.error(f"Error loading data from backend: {e}")
+        return False
+
+# Collections whose derived state needs other collections in memory first
+COLLECTION_DEPENDENCIES = {"room_events": ("rooms", "patients")}
+
+def ensure_collections_loaded(names):
+    """Makes the named collections current: adopts newer shared snapshots, and loads missing ones.
+
+    A collection another session already holds is taken from its shared snapshot; only the
+    first session to need it reads it from the shard (one file each)."""
+    loaded = st.session_state.loaded_collections
+    poll_external_changes([name for name in names if name in loaded])
+    refresh_from_snapshots([name for name in names if name in loaded])
+    missing = [name for name in names if name not in loaded]
+    if not missing:
+        return
+    for name in missing:
+        ensure_collections_loaded(COLLECTION_DEPENDENCIES.get(name, ()))
+    registry = get_snapshots()
+    to_read = [name for name in missing if registry.get(snapshot_ward(name), name) is None]
+    ward_data = {}
+    if to_read:
         try:
-            with open(BACKEND_FILE, 'r') as f:
-                imported_data = json.load(f)
-            
-            # Populate session state if keys exist in the loaded data
-            st.session_state.patients = imported_data.get('patients', [])
-            st.session_state.doctors = imported_data.get('doctors', [])
-            st.session_state.rooms = imported_data.get('rooms', [])
-            st.session_state.appointments = imported_data.get('appointments', [])
-            st.session_state.treatment_plans = imported_data.get('treatment_plans', [])
-            st.session_state.diagnosis = imported_data.get('diagnosis', [])
-            st.session_state.billing = imported_data.get('billing', [])
-            
-            return True
+            flush_pending_saves()
+            get_watcher().note(st.session_state.ward, to_read) # Before the read: an edit during it is seen next poll
+            with timed("backend.load_collections"):
+                ward_data = get_store().load_collections(st.session_state.ward, to_read, track=True)
         except Exception as e:
             st.error(f"Error loading data from backend: {e}")
-            return False
-    return False
+    for name in missing:
+        records = ward_data.get(name, [])
+        # Older files predate the occupancy log: seed it from the current room state
+        if name == 'room_events' and name in to_read and not records:
+            records = seed_events_from_rooms(st.session_state.rooms, st.session_state.patients)
+        adopt_snapshot(name, registry.publish_initial(snapshot_ward(name), name, records))
+        loaded.add(name)
+    if 'billing' in missing:
+        rebuild_receivables()
+    run_integrity_check(missing) # Keys touching the collections just read or adopted
+    bump_data_version()
+
+# --- Shared Snapshots (copy-on-write across sessions) ---
+# Sessions hold lists of pointers to the shared snapshot's records. A record is copied
+# before its first edit (edit_record) and the next save publishes a new shared version.
+
+@st.cache_resource
+def get_snapshots():
+    """Committed collection versions shared by every session in this server process."""
+    return SnapshotRegistry()
+
+def snapshot_ward(collection):
+    """Registry key: hospital-wide collections (doctors) are shared by every ward."""
+    return None if collection in SHARED_COLLECTIONS else st.session_state.ward
+
+def adopt_snapshot(collection, snapshot, by_delta=False):
+    """Points the session at a committed version (copies pointers, never records).
+
+    With `by_delta` (the session held the previous version) the derived indexes apply the
+    snapshot's changed records instead of being rebuilt."""
+    st.session_state[collection] = list(snapshot.records)
+    st.session_state.setdefault('snapshot_versions', {})[collection] = snapshot.version
+    st.session_state.setdefault('private_records', {})[collection] = set()
+    st.session_state.setdefault('columnar', {}).pop(collection, None)
+    if by_delta:
+        apply_record_changes(collection, snapshot.changes[1])
+        return
+    if collection in TIMELINE_SOURCES:
+        st.session_state.pop('timeline_index', None) # Rebuilt on next use
+    if collection in WORKLOAD_SOURCES:
+        st.session_state.pop('workload', None)
+    if collection == 'treatment_plans':
+        st.session_state.pop('plan_intervals', None)
+
+def refresh_from_snapshots(names):
+    """Adopts versions that other sessions committed since this session last looked."""
+    registry = get_snapshots()
+    versions = st.session_state.setdefault('snapshot_versions', {})
+    changed = []
+    for name in names:
+        snapshot = registry.get(snapshot_ward(name), name)
+        if snapshot is not None and snapshot.version != versions.get(name):
+            by_delta = snapshot.changes is not None and snapshot.changes[0] == versions.get(name)
+            adopt_snapshot(name, snapshot, by_delta)
+            changed.append(name)
+            if name == 'billing' and not by_delta:
+                rebuild_receivables()
+    if changed:
+        bump_data_version()
+
+# --- External Edits (shard files changed outside the app) ---
+# The watcher re-stats loaded shard files at most every WATCH_INTERVAL_SECONDS. A changed
+# file is parsed once per process and diffed by primary key; the result is published as
+# the next shared version, carrying its changed records so sessions update by delta.
+
+# Collection -> (insert, update, delete) event types, for replaying external changes into the indexes
+RECORD_EVENTS = {
+    "patients": (PatientAdmitted, PatientUpdated, PatientDeleted),
+    "doctors": (DoctorCreated, DoctorUpdated, DoctorDeleted),
+    "rooms": (RoomCreated, RoomUpdated, RoomDeleted),
+    "appointments": (AppointmentScheduled, AppointmentUpdated, AppointmentDeleted),
+    "treatment_plans": (TreatmentPlanCreated, TreatmentPlanUpdated, TreatmentPlanDeleted),
+    "diagnosis": (DiagnosisRecorded, DiagnosisUpdated, DiagnosisDeleted),
+    "billing": (BillCreated, BillUpdated, BillDeleted),
+}
+RECORD_FIELD = {collection: field for field, collection in RECORD_FIELDS.items()}
+
+def poll_external_changes(names):
+    """PROCEDURE: Publishes edits made outside the app to the named collections' shard files as new shared versions."""
+    if get_writer().pending():
+        return # A save is in flight: the files are behind memory until it lands
+    ward = st.session_state.ward
+    registry = get_snapshots()
+    for name, incoming in get_watcher().poll(ward, names).items():
+        snapshot = registry.get(snapshot_ward(name), name)
+        if snapshot is None:
+            continue
+        with timed("watcher.apply", collection=name):
+            records, changes = diff_records(ID_FIELDS[name], snapshot.records, incoming)
+            if not changes:
+                continue
+            table = snapshot.table.fork() if snapshot.table is not None else None
+            if table is not None:
+                for before, after in changes:
+                    if after is not None:
+                        table.upsert(after)
+                table.delete_many([before[ID_FIELDS[name]] for before, after in changes if after is None])
+            registry.publish(snapshot_ward(name), name, records, table, changes=changes)
+        st.toast(f"🔄 {len(changes)} {name.replace('_', ' ')} record(s) changed outside the app were reloaded.")
+
+def apply_record_changes(collection, changes):
+    """Replays (before, after) record pairs into this session's derived indexes, without queuing saves or audits."""
+    if collection not in RECORD_EVENTS:
+        st.session_state.pop('timeline_index', None) # Room event log: rebuilt on next use
+        return
+    created, updated, deleted = RECORD_EVENTS[collection]
+    field = RECORD_FIELD[collection]
+    bus = get_event_bus()
+    for before, after in changes:
+        if before is None:
+            event = created(**{field: after})
+        elif after is None:
+            event = deleted(**{field: before})
+        else:
+            event = updated(before=before, **{field: after})
+        bus.notify(event, DERIVED_INDEX_SUBSCRIBERS)
+
+def commit_snapshots(collections):
+    """Publishes the session's versions of `collections` (and their updated columnar tables)."""
+    registry = get_snapshots()
+    tables = st.session_state.setdefault('columnar', {})
+    for name in collections:
+        records = st.session_state[name]
+        table = tables.pop(name, None)
+        if table is not None and (table.source is not records or len(table) != len(records)):
+            table = None
+        snapshot = registry.publish(snapshot_ward(name), name, records, table)
+        st.session_state.setdefault('snapshot_versions', {})[name] = snapshot.version
+        st.session_state.setdefault('private_records', {})[name] = set()
+
+def edit_record(collection, record):
+    """Returns a private copy of `record` that this session may modify in place (copy-on-write)."""
+    private = st.session_state.setdefault('private_records', {}).setdefault(collection, set())
+    return copy_for_edit(st.session_state[collection], record, private)
+
+def uses_collections(*names):
+    """Page decorator: declares the collections a page reads or writes so only those are loaded."""
+    def decorator(page):
+        @functools.wraps(page)
+        def wrapper(*args, **kwargs):
+            with timed(f"page.{page.__name__}"):
+                if st.session_state.get('as_of') is not None:
+                    load_collections_as_of(names)
+                else:
+                    ensure_collections_loaded(names)
+                return page(*args, **kwargs)
+        wrapper.collections = names
+        return wrapper
+    return decorator
+
+# --- As-Of Views (read-only time travel) ---
+# With an as-of date picked in the sidebar, pages render the ward rebuilt as it was at the end of
+# that day (poms.time_travel: nearest backup plus the audit entries after it). Publishing is refused.
+
+@st.cache_resource
+def get_time_machine():
+    """Point-in-time reconstruction shared by every session (caches rebuilt checkpoints)."""
+    return TimeMachine(get_backups(), get_audit_log(), get_store())
+
+def set_as_of(as_of):
+    """PROCEDURE: Switches the session between live data and the read-only view at the end of `as_of` (None = live)."""
+    st.session_state.as_of = as_of
+    load_data_from_backend() # Collections reload, live or historical, as pages need them
+
+def load_collections_as_of(names):
+    """Loads the named collections as they were at the end of the as-of date (private lists, never committed)."""
+    loaded = st.session_state.loaded_collections
+    missing = [name for name in names if name not in loaded]
+    if not missing:
+        return
+    flush_pending_saves()
+    moment = datetime.combine(st.session_state.as_of, datetime.max.time())
+    with timed("time_travel.state_as_of", collections=missing):
+        data = get_time_machine().state_as_of(st.session_state.ward, moment, missing)
+    for name in missing:
+        st.session_state[name] = list(data[name]) # The rebuilt lists are cached and shared: never hand them out
+        loaded.add(name)
+    st.session_state.pop('timeline_index', None)
+    st.session_state.pop('workload', None)
+    st.session_state.pop('plan_intervals', None)
+    if 'billing' in missing:
+        rebuild_receivables()
+    bump_data_version()
 
 # --- Data Management Functions (UPDATED to call Persistence) ---
 
 def init_sample_data():
     if 'initialized' not in st.session_state:
-        # Attempt to load from persistent backend first
-        if load_data_from_backend():
-            st.session_state.initialized = True
-            st.session_state.menu = "Dashboard"
-            return
-        
-        # If no file found, initialize with sample data
-        # --- DOCTORS (6 existing + 8 new = 14 total) ---
-        st.session_state.doctors = [
-            {"doctor_id": 1, "name": "Dr. Meena", "degree": "MD", "specialization": "Oncology", "contact": "987650001"},
-            {"doctor_id": 2, "name": "Dr. Arjun", "degree": "MBBS", "specialization": "Pediatrics", "contact": "987650002"},
-            {"doctor_id": 3, "name": "Dr. Ravi", "degree": "MD", "specialization": "Radiology", "contact": "987650003"},
-            {"doctor_id": 4, "name": "Dr. Sneha", "degree": "MBBS", "specialization": "Surgery", "contact": "987650004"},
-            {"doctor_id": 5, "name": "Dr. Kiran", "degree": "MD", "specialization": "Pathology", "contact": "987650005"},
-            {"doctor_id": 6, "name": "Dr. Priya", "degree": "MBBS", "specialization": "Oncology", "contact": "987650006"},
-            
-            # New doctors
-            {"doctor_id": 7, "name": "Dr. Sameer", "degree": "MD", "specialization": "Pediatrics", "contact": "987650007"},
-            {"doctor_id": 8, "name": "Dr. Neha", "degree": "MBBS", "specialization": "Oncology", "contact": "987650008"},
-            {"doctor_id": 9, "name": "Dr. Vimal", "degree": "MD", "specialization": "Radiology", "contact": "987650009"},
-            {"doctor_id": 10, "name": "Dr. Zoya", "degree": "MBBS", "specialization": "Oncology", "contact": "987650010"},
-            {"doctor_id": 11, "name": "Dr. Imran", "degree": "MD", "specialization": "Surgery", "contact": "987650011"},
-            {"doctor_id": 12, "name": "Dr. Lakshmi", "degree": "MBBS", "specialization": "Pediatrics", "contact": "987650012"},
-            {"doctor_id": 13, "name": "Dr. Rohan", "degree": "MD", "specialization": "Oncology", "contact": "987650013"},
-            {"doctor_id": 14, "name": "Dr. Anjali", "degree": "MBBS", "specialization": "Pathology", "contact": "987650014"}
-        ]
-        
-        # --- PATIENTS (5 existing + 15 new = 20 total) ---
-        st.session_state.patients = [
-            {"patient_id": 1, "name": "Aarav", "age": 10, "dob": "2015-03-10", "gender": "Male", "address": "Bangalore", 
-             "diagnosis": "Leukemia", "admission_date": "2025-01-12", "discharge_date": "2025-02-15", "doctor_id": 1, "status": "Discharged"},
-            {"patient_id": 2, "name": "Diya", "age": 8, "dob": "2017-06-12", "gender": "Female", "address": "Mysore", 
-             "diagnosis": "Lymphoma", "admission_date": "2025-02-01", "discharge_date": None, "doctor_id": 2, "status": "Admitted"},
-            {"patient_id": 3, "name": "Rohan", "age": 11, "dob": "2014-01-18", "gender": "Male", "address": "Chennai", 
-             "diagnosis": "Tumor", "admission_date": "2025-01-20", "discharge_date": "2025-02-25", "doctor_id": 3, "status": "Discharged"},
-            {"patient_id": 4, "name": "Kavya", "age": 9, "dob": "2016-04-25", "gender": "Female", "address": "Hubli", 
-             "diagnosis": "Anemia", "admission_date": "2025-03-05", "discharge_date": None, "doctor_id": 4, "status": "Admitted"},
-            {"patient_id": 5, "name": "Aditi", "age": 7, "dob": "2018-09-09", "gender": "Female", "address": "Hassan", 
-             "diagnosis": "Infection", "admission_date": "2025-03-15", "discharge_date": None, "doctor_id": 5, "status": "Admitted"},
-            
-            # New patients (15 total)
-            {"patient_id": 6, "name": "Vivaan", "age": 6, "dob": "2019-02-20", "gender": "Male", "address": "Pune", 
-             "diagnosis": "Leukemia", "admission_date": "2025-03-20", "discharge_date": None, "doctor_id": 1, "status": "Admitted"},
-            {"patient_id": 7, "name": "Misha", "age": 12, "dob": "2013-05-01", "gender": "Female", "address": "Delhi", 
-             "diagnosis": "Neuroblastoma", "admission_date": "2025-03-22", "discharge_date": None, "doctor_id": 8, "status": "Admitted"},
-            {"patient_id": 8, "name": "Neel", "age": 14, "dob": "2011-08-15", "gender": "Male", "address": "Mumbai", 
-             "diagnosis": "Sarcoma", "admission_date": "2025-03-25", "discharge_date": None, "doctor_id": 10, "status": "Admitted"},
-            {"patient_id": 9, "name": "Tanya", "age": 5, "dob": "2020-11-11", "gender": "Female", "address": "Kochi", 
-             "diagnosis": "Tumor", "admission_date": "2025-03-28", "discharge_date": "2025-04-10", "doctor_id": 7, "status": "Discharged"},
-            {"patient_id": 10, "name": "Jatin", "age": 16, "dob": "2009-01-05", "gender": "Male", "address": "Hyderabad", 
-             "diagnosis": "Anemia", "admission_date": "2025-04-01", "discharge_date": None, "doctor_id": 12, "status": "Admitted"},
-            {"patient_id": 11, "name": "Siya", "age": 4, "dob": "2021-09-30", "gender": "Female", "address": "Jaipur", 
-             "diagnosis": "Leukemia", "admission_date": "2025-04-05", "discharge_date": None, "doctor_id": 6, "status": "Admitted"},
-            {"patient_id": 12, "name": "Aryan", "age": 13, "dob": "2012-07-07", "gender": "Male", "address": "Lucknow", 
-             "diagnosis": "Lymphoma", "admission_date": "2025-04-08", "discharge_date": "2025-05-10", "doctor_id": 13, "status": "Discharged"},
-            {"patient_id": 13, "name": "Zaina", "age": 9, "dob": "2016-02-14", "gender": "Female", "address": "Goa", 
-             "diagnosis": "Tumor", "admission_date": "2025-04-12", "discharge_date": None, "doctor_id": 11, "status": "Admitted"},
-            {"patient_id": 14, "name": "Harsh", "age": 15, "dob": "2010-04-04", "gender": "Male", "address": "Indore", 
-             "diagnosis": "Infection", "admission_date": "2025-04-15", "discharge_date": None, "doctor_id": 4, "status": "Admitted"},
-            {"patient_id": 15, "name": "Esha", "age": 7, "dob": "2018-01-28", "gender": "Female", "address": "Patna", 
-             "diagnosis": "Sarcoma", "admission_date": "2025-04-18", "discharge_date": None, "doctor_id": 8, "status": "Admitted"},
-            {"patient_id": 16, "name": "Karan", "age": 11, "dob": "2014-10-10", "gender": "Male", "address": "Bhopal", 
-             "diagnosis": "Anemia", "admission_date": "2025-04-22", "discharge_date": "2025-05-01", "doctor_id": 2, "status": "Discharged"},
-            {"patient_id": 17, "name": "Lila", "age": 3, "dob": "2022-03-03", "gender": "Female", "address": "Ranchi", 
-             "diagnosis": "Leukemia", "admission_date": "2025-04-25", "discharge_date": None, "doctor_id": 1, "status": "Admitted"},
-            {"patient_id": 18, "name": "Rajat", "age": 17, "dob": "2008-06-06", "gender": "Male", "address": "Surat", 
-             "diagnosis": "Lymphoma", "admission_date": "2025-04-28", "discharge_date": None, "doctor_id": 13, "status": "Admitted"},
-            {"patient_id": 19, "name": "Heena", "age": 8, "dob": "2017-12-12", "gender": "Female", "address": "Nagpur", 
-             "diagnosis": "Infection", "admission_date": "2025-05-01", "discharge_date": None, "doctor_id": 5, "status": "Admitted"},
-            {"patient_id": 20, "name": "Bhavin", "age": 10, "dob": "2015-05-15", "gender": "Male", "address": "Vadodara", 
-             "diagnosis": "Tumor", "admission_date": "2025-05-05", "discharge_date": None, "doctor_id": 10, "status": "Admitted"}
-        ]
-        
-        # --- ROOMS (8 existing + 10 new = 18 total) ---
-        st.session_state.rooms = [
-            {"room_id": 1, "room_type": "General", "occupancy_status": "Occupied", "patient_id": 6, "cost_per_day": 5000.00},
-            {"room_id": 2, "room_type": "Private", "occupancy_status": "Occupied", "patient_id": 2, "cost_per_day": 15000.00},
-            {"room_id": 3, "room_type": "Semi-Private", "occupancy_status": "Occupied", "patient_id": 4, "cost_per_day": 10000.00},
-            {"room_id": 4, "room_type": "ICU", "occupancy_status": "Occupied", "patient_id": 5, "cost_per_day": 30000.00},
-            {"room_id": 5, "room_type": "General", "occupancy_status": "Vacant", "patient_id": None, "cost_per_day": 5000.00},
-            {"room_id": 6, "room_type": "Private", "occupancy_status": "Vacant", "patient_id": None, "cost_per_day": 15000.00},
-            {"room_id": 7, "room_type": "ICU", "occupancy_status": "Vacant", "patient_id": None, "cost_per_day": 30000.00},
-            {"room_id": 8, "room_type": "General", "occupancy_status": "Vacant", "patient_id": None, "cost_per_day": 5000.00},
-
-            # New rooms (10 total)
-            {"room_id": 9, "room_type": "Private", "occupancy_status": "Occupied", "patient_id": 7, "cost_per_day": 15000.00},
-            {"room_id": 10, "room_type": "Semi-Private", "occupancy_status": "Occupied", "patient_id": 8, "cost_per_day": 10000.00},
-            {"room_id": 11, "room_type": "General", "occupancy_status": "Occupied", "patient_id": 10, "cost_per_day": 5000.00},
-            {"room_id": 12, "room_type": "ICU", "occupancy_status": "Occupied", "patient_id": 11, "cost_per_day": 30000.00},
-            {"room_id": 13, "room_type": "Private", "occupancy_status": "Occupied", "patient_id": 13, "cost_per_day": 15000.00},
-            {"room_id": 14, "room_type": "Semi-Private", "occupancy_status": "Occupied", "patient_id": 14, "cost_per_day": 10000.00},
-            {"room_id": 15, "room_type": "General", "occupancy_status": "Occupied", "patient_id": 15, "cost_per_day": 5000.00},
-            {"room_id": 16, "room_type": "ICU", "occupancy_status": "Occupied", "patient_id": 17, "cost_per_day": 30000.00},
-            {"room_id": 17, "room_type": "General", "occupancy_status": "Vacant", "patient_id": None, "cost_per_day": 5000.00},
-            {"room_id": 18, "room_type": "Private", "occupancy_status": "Occupied", "patient_id": 18, "cost_per_day": 15000.00},
-        ]
-        
-        # --- APPOINTMENTS (6 existing + 8 new = 14 total) ---
-        today = datetime.now().strftime("%Y-%m-%d")
-        st.session_state.appointments = [
-            {"appointment_id": 1, "date": "2025-01-10", "time": "10:00", "reason": "Initial Checkup", "doctor_id": 1, "patient_id": 1},
-            {"appointment_id": 2, "date": "2025-02-01", "time": "14:30", "reason": "Follow-up", "doctor_id": 2, "patient_id": 2},
-            {"appointment_id": 3, "date": "2025-01-18", "time": "09:00", "reason": "Scan Review", "doctor_id": 3, "patient_id": 3},
-            {"appointment_id": 4, "date": today, "time": "11:00", "reason": "Routine", "doctor_id": 4, "patient_id": 4},
-            {"appointment_id": 5, "date": "2025-03-15", "time": "16:00", "reason": "Consultation", "doctor_id": 5, "patient_id": 5},
-            {"appointment_id": 6, "date": "2026-01-10", "time": "10:00", "reason": "Annual Follow-up", "doctor_id": 1, "patient_id": 1},
-
-            # New appointments
-            {"appointment_id": 7, "date": "2025-03-21", "time": "09:30", "reason": "First Chemo Round", "doctor_id": 8, "patient_id": 6},
-            {"appointment_id": 8, "date": "2025-04-10", "time": "15:00", "reason": "Discharge Check", "doctor_id": 7, "patient_id": 9},
-            {"appointment_id": 9, "date": "2025-04-15", "time": "10:30", "reason": "Routine Checkup", "doctor_id": 12, "patient_id": 10},
-            {"appointment_id": 10, "date": "2025-05-02", "time": "14:00", "reason": "Scan Review", "doctor_id": 13, "patient_id": 12},
-            {"appointment_id": 11, "date": "2025-05-08", "time": "09:00", "reason": "Pre-Op Consultation", "doctor_id": 11, "patient_id": 13},
-            {"appointment_id": 12, "date": today, "time": "16:00", "reason": "Follow-up", "doctor_id": 10, "patient_id": 15},
-            {"appointment_id": 13, "date": "2025-05-15", "time": "11:30", "reason": "Final Checkup", "doctor_id": 2, "patient_id": 16},
-            {"appointment_id": 14, "date": "2025-05-20", "time": "13:00", "reason": "Biopsy Review", "doctor_id": 1, "patient_id": 17}
-        ]
-        
-        # --- TREATMENT PLANS (3 existing + 10 new = 13 total) ---
-        st.session_state.treatment_plans = [
-            {"plan_id": 1, "patient_id": 1, "doctor_id": 1, "diagnosis_id": 1, "details": "Chemo Protocol A, 4 cycles", 
-             "start_date": "2025-01-14", "end_date": "2025-02-10"},
-            {"plan_id": 2, "patient_id": 2, "doctor_id": 2, "diagnosis_id": 2, "details": "Radiation + Chemo Protocol B", 
-             "start_date": "2025-02-03", "end_date": "2025-05-01"},
-            {"plan_id": 3, "patient_id": 4, "doctor_id": 4, "diagnosis_id": 4, "details": "Iron supplements and monitoring", 
-             "start_date": "2025-03-05", "end_date": "2025-06-01"},
-
-            # New treatment plans
-            {"plan_id": 4, "patient_id": 5, "doctor_id": 5, "diagnosis_id": 5, "details": "Antibiotics (7 days) and observation", 
-             "start_date": "2025-03-15", "end_date": "2025-03-22"},
-            {"plan_id": 5, "patient_id": 6, "doctor_id": 1, "diagnosis_id": 6, "details": "High-dose Chemotherapy, 6 cycles", 
-             "start_date": "2025-03-21", "end_date": "2025-08-30"},
-            {"plan_id": 6, "patient_id": 7, "doctor_id": 8, "diagnosis_id": 7, "details": "Surgery followed by targeted radiation", 
-             "start_date": "2025-03-24", "end_date": "2025-07-01"},
-            {"plan_id": 7, "patient_id": 8, "doctor_id": 10, "diagnosis_id": 8, "details": "Immunotherapy & Chemo Protocol D", 
-             "start_date": "2025-03-26", "end_date": "2025-10-15"},
-            {"plan_id": 8, "patient_id": 10, "doctor_id": 12, "diagnosis_id": 10, "details": "B12 injections and dietary changes", 
-             "start_date": "2025-04-02", "end_date": "2025-07-01"},
-            {"plan_id": 9, "patient_id": 11, "doctor_id": 6, "diagnosis_id": 11, "details": "Milder Chemo Protocol E (maintenance)", 
-             "start_date": "2025-04-07", "end_date": "2026-04-07"},
-            {"plan_id": 10, "patient_id": 13, "doctor_id": 11, "diagnosis_id": 13, "details": "Immediate Surgery (Scheduled May 15)", 
-             "start_date": "2025-04-13", "end_date": "2025-05-30"},
-            {"plan_id": 11, "patient_id": 15, "doctor_id": 8, "diagnosis_id": 15, "details": "Pre-operative assessment for bone tumor", 
-             "start_date": "2025-04-19", "end_date": "2025-06-01"},
-            {"plan_id": 12, "patient_id": 17, "doctor_id": 1, "diagnosis_id": 17, "details": "Induction Phase Chemo", 
-             "start_date": "2025-04-26", "end_date": "2025-06-25"},
-            {"plan_id": 13, "patient_id": 18, "doctor_id": 13, "diagnosis_id": 18, "details": "Palliative care and symptom control", 
-             "start_date": "2025-04-29", "end_date": None}
-        ]
-        
-        # --- DIAGNOSIS (4 existing + 10 new = 14 total) ---
-        st.session_state.diagnosis = [
-            {"diagnosis_id": 1, "patient_id": 1, "diagnosis_type": "Blood", "description": "Complete Blood Count", 
-             "result": "Leukemia confirmed", "date": "2025-01-13", "disease_type": "Leukemia"},
-            {"diagnosis_id": 2, "patient_id": 2, "diagnosis_type": "Scan", "description": "MRI (neck and chest)", 
-             "result": "Lymphoma confirmed, stage 2", "date": "2025-02-02", "disease_type": "Lymphoma"},
-            {"diagnosis_id": 3, "patient_id": 3, "diagnosis_type": "CT", "description": "Brain CT scan", 
-             "result": "Benign Tumor, post-op stable", "date": "2025-01-21", "disease_type": "Tumor"},
-            {"diagnosis_id": 4, "patient_id": 4, "diagnosis_type": "Blood", "description": "Iron level test", 
-             "result": "Severe Anemia (Positive for low iron)", "date": "2025-03-06", "disease_type": "Anemia"},
-            
-            # New diagnosis records
-            {"diagnosis_id": 5, "patient_id": 5, "diagnosis_type": "Culture", "description": "Blood Culture", 
-             "result": "Bacterial infection identified", "date": "2025-03-16", "disease_type": "Infection"},
-            {"diagnosis_id": 6, "patient_id": 6, "diagnosis_type": "Marrow", "description": "Bone Marrow Biopsy", 
-             "result": "ALL (Acute Lymphoblastic Leukemia) confirmed", "date": "2025-03-20", "disease_type": "Leukemia"},
-            {"diagnosis_id": 7, "patient_id": 7, "diagnosis_type": "Scan", "description": "Whole body MIBG Scan", 
-             "result": "Stage 4 Neuroblastoma", "date": "2025-03-23", "disease_type": "Neuroblastoma"},
-            {"diagnosis_id": 8, "patient_id": 8, "diagnosis_type": "Biopsy", "description": "Needle Biopsy (Femur)", 
-             "result": "Ewing Sarcoma", "date": "2025-03-26", "disease_type": "Sarcoma"},
-            {"diagnosis_id": 9, "patient_id": 9, "diagnosis_type": "Blood", "description": "Post-op blood screen", 
-             "result": "Tumor markers negative", "date": "2025-04-10", "disease_type": "Tumor"},
-            {"diagnosis_id": 10, "patient_id": 10, "diagnosis_type": "Blood", "description": "B12/Folate levels", 
-             "result": "Folate deficiency anemia", "date": "2025-04-03", "disease_type": "Anemia"},
-            {"diagnosis_id": 11, "patient_id": 11, "diagnosis_type": "Marrow", "description": "Bone Marrow Aspirate", 
-             "result": "AML (Acute Myeloid Leukemia) confirmed", "date": "2025-04-06", "disease_type": "Leukemia"},
-            {"diagnosis_id": 12, "patient_id": 12, "diagnosis_type": "Scan", "description": "CT Chest", 
-             "result": "Tumor shrinkage post-treatment", "date": "2025-05-01", "disease_type": "Lymphoma"},
-            {"diagnosis_id": 13, "patient_id": 13, "diagnosis_type": "MRI", "description": "Brain MRI", 
-             "result": "Glioblastoma confirmed", "date": "2025-04-13", "disease_type": "Tumor"},
-            {"diagnosis_id": 14, "patient_id": 14, "diagnosis_type": "Culture", "description": "Pus swab culture", 
-             "result": "Staph infection in wound", "date": "2025-04-16", "disease_type": "Infection"}
-        ]
-        
-        # --- BILLING (4 existing + 10 new = 14 total) ---
-        st.session_state.billing = [
-            {"bill_id": 1, "patient_id": 1, "amount": 120000.00, "status": "Paid", "date": "2025-02-11", "description": "Chemo Protocol A"},
-            {"bill_id": 2, "patient_id": 2, "amount": 85000.00, "status": "Unpaid", "date": "2025-03-02", "description": "Room/Board Fee"},
-            {"bill_id": 3, "patient_id": 3, "amount": 150000.00, "status": "Paid", "date": "2025-02-26", "description": "Surgery & Recovery"},
-            {"bill_id": 4, "patient_id": 4, "amount": 5000.00, "status": "Unpaid", "date": "2025-03-07", "description": "Iron Level Test"},
-
-            # New billing records
-            {"bill_id": 5, "patient_id": 5, "amount": 5000.00, "status": "Paid", "date": "2025-03-16", "description": "Blood Culture Diagnosis"},
-            {"bill_id": 6, "patient_id": 6, "amount": 5000.00, "status": "Unpaid", "date": "2025-03-21", "description": "Room & Board (General R1)"},
-            {"bill_id": 7, "patient_id": 7, "amount": 15000.00, "status": "Unpaid", "date": "2025-03-23", "description": "Room & Board (Private R9)"},
-            {"bill_id": 8, "patient_id": 8, "amount": 10000.00, "status": "Unpaid", "date": "2025-03-26", "description": "Room & Board (Semi-Private R10)"},
-            {"bill_id": 9, "patient_id": 10, "amount": 5000.00, "status": "Paid", "date": "2025-04-02", "description": "B12/Folate Diagnosis"},
-            {"bill_id": 10, "patient_id": 11, "amount": 30000.00, "status": "Unpaid", "date": "2025-04-06", "description": "Room & Board (ICU R12)"},
-            {"bill_id": 11, "patient_id": 13, "amount": 15000.00, "status": "Paid", "date": "2025-04-12", "description": "Room & Board (Private R13)"},
-            {"bill_id": 12, "patient_id": 14, "amount": 10000.00, "status": "Unpaid", "date": "2025-04-15", "description": "Room & Board (Semi-Private R14)"},
-            {"bill_id": 13, "patient_id": 15, "amount": 5000.00, "status": "Paid", "date": "2025-04-18", "description": "Room & Board (General R15)"},
-            {"bill_id": 14, "patient_id": 17, "amount": 30000.00, "status": "Unpaid", "date": "2025-04-26", "description": "Room & Board (ICU R16)"},
-        ]
-        
+        started = time.perf_counter()
+        try:
+            _init_session_data()
+        finally:
+            record_startup("session_init", time.perf_counter() - started)
+
+def _init_session_data():
+    """First rerun of a session: opens the ward's shard, or seeds the sample ward if there is none."""
+    if 'ward' not in st.session_state:
+        wards = get_store().list_wards()
+        st.session_state.ward = wards[0] if wards else DEFAULT_WARD
+    
+    # Attempt to load from persistent backend first
+    if load_data_from_backend():
         st.session_state.initialized = True
-        st.session_state.menu = "Dashboard"
-        # Save sample data to create the initial backend file
-        save_data_to_backend() 
+        st.session_state.menu = st.session_state.get('menu', "Dashboard")
+        return
+    
+    # If no file found, initialize with sample data (read from the fixture file only now)
+    for name, records in load_sample_data().items():
+        st.session_state[name] = records
+    
+    # --- ROOM EVENTS (baseline occupy events for the sample rooms) ---
+    st.session_state.room_events = seed_events_from_rooms(st.session_state.rooms, st.session_state.patients)
+    
+    st.session_state.loaded_collections = set(COLLECTIONS)
+    st.session_state.initialized = True
+    st.session_state.menu = "Dashboard"
+    rebuild_receivables()
+    # Register the ward now (the save itself is asynchronous) so other sessions load instead of re-seeding
+    get_store().create_ward(st.session_state.ward)
+    # Save sample data to create the initial backend file
+    save_data_to_backend() 
+
+def switch_ward(ward):
+    """Drops the current ward's data from the session and loads the selected ward's shard."""
+    get_store().create_ward(ward) # no-op for existing wards
+    st.session_state.ward = ward
+    st.session_state.pop('initialized', None)
+    init_sample_data()
+
+def rebuild_receivables():
+    """Builds the receivables rollups from the billing list. Only needed on load, import or clear; every other change is a delta."""
+    st.session_state.receivables = ReceivablesLedger(st.session_state.billing)
+
+# --- Columnar Views ---
+# Pages read typed, zero-copy frames instead of rebuilding pd.DataFrame(list_of_dicts) each rerun.
+# The tables are kept in step by the update_columnar_tables subscriber.
+
+def shared_snapshot_if_clean(collection):
+    """The shared snapshot this session's list still matches exactly, else None (uncommitted changes)."""
+    snapshot = get_snapshots().get(snapshot_ward(collection), collection)
+    if (snapshot is not None and snapshot.version == st.session_state.get('snapshot_versions', {}).get(collection)
+            and len(snapshot.records) == len(st.session_state[collection])):
+        return snapshot
+    return None
+
+def columnar_table(collection):
+    """Returns the columnar table for a collection: the shared snapshot's, or a private one with this session's changes."""
+    tables = st.session_state.setdefault('columnar', {})
+    records = st.session_state[collection]
+    table = tables.get(collection)
+    if table is not None and table.source is records and len(table) == len(records):
+        return table
+    snapshot = shared_snapshot_if_clean(collection)
+    if snapshot is not None:
+        return get_snapshots().table(snapshot, lambda recs: ColumnarTable(ID_FIELDS[collection], recs))
+    table = ColumnarTable(ID_FIELDS[collection], records)
+    table.source = records
+    tables[collection] = table
+    return table
+
+def collection_frame(collection):
+    """FUNCTION: Typed DataFrame view of a collection (categoricals, nullable int ids); safe to modify."""
+    return columnar_table(collection).frame()
+
+# --- Chart Figures (memoised across sessions) ---
+# A chart's aggregation and figure are built once per (chart, ward, input versions, parameters)
+# and served from a shared LRU until a commit to one of its input collections changes the key.
+
+@st.cache_resource
+def get_figure_cache():
+    """Built chart figures shared by every session in this server process."""
+    return FigureCache()
+
+def collection_versions(collections):
+    """Committed snapshot versions of `collections`, or None while this session has uncommitted changes."""
+    versions = []
+    for name in collections:
+        snapshot = shared_snapshot_if_clean(name)
+        if snapshot is None:
+            return None
+        versions.append(snapshot.version)
+    return tuple(versions)
+
+def cached_figure(chart_id, collections, params, build):
+    """FUNCTION: The figure for `chart_id` over `collections` with `params` (hashable), built by build() on a miss.
+
+    build() does the aggregation too and may return None for 'no data'. The result is shared: do not modify it."""
+    versions = collection_versions(collections)
+    if versions is None:
+        with timed(f"chart.{chart_id}"):
+            return build()
+    key = (chart_id, st.session_state.ward, versions, params)
+    def timed_build():
+        with timed(f"chart.{chart_id}"):
+            return build()
+    return get_figure_cache().get_or_build(key, timed_build)
+
+def admissions_series(level="Auto"):
+    """FUNCTION: Admissions per bucket as (frame of admission_date/count, level, downsampled).
+
+    'Auto' keeps monthly buckets for up to three years of data, then quarters or years."""
+    df_patients = collection_frame('patients')
+    admitted = pd.to_datetime(df_patients['admission_date'].astype(str), errors='coerce').dropna() if not df_patients.empty else pd.Series(dtype='datetime64[ns]')
+    daily = pd.DataFrame({'admission_date': admitted, 'count': 1})
+    return prepare_series(daily, 'admission_date', ['count'], level=level, max_buckets=ADMISSION_BUCKETS,
+                          levels=LEVELS[2:] if level == "Auto" else LEVELS, method="minmax")
 
 # --- Utility Functions (UPDATED to use save_data_to_backend) ---
 
 def get_patient_name(patient_id):
     """FUNCTION: Takes an ID and returns a name. Pure look-up with no side effects."""
+    if pd.isna(patient_id):
+        return 'N/A'
     patient = next((p for p in st.session_state.patients if p['patient_id'] == patient_id), None)
     return patient['name'] if patient else 'N/A'
 
 def get_doctor_name(doctor_id):
     """FUNCTION: Takes an ID and returns a name."""
+    if pd.isna(doctor_id):
+        return 'N/A'
     doctor = next((d for d in st.session_state.doctors if d['doctor_id'] == doctor_id), None)
     return doctor['name'] if doctor else 'N/A'
 
+def next_id(collection):
+    """FUNCTION: Returns the next primary key for a collection, unique across all ward shards."""
+    local_max = max_id(st.session_state[collection], ID_FIELDS[collection])
+    return get_store().allocate_id(collection, local_max)
+
+def record_room_event(event_type, room_id, patient_id, from_room_id=None):
+    """PROCEDURE: Appends an occupy/vacate/transfer entry to the append-only room event log."""
+    new_id = next_id('room_events') # Global sequence: a batch job may be appending to the same log
+    st.session_state.room_events.append(make_room_event(new_id, event_type, room_id, patient_id, from_room_id))
+
 def find_patient_room(patient_id):
     """FUNCTION: Takes an ID and returns the associated room object (if occupied)."""
     return next((r for r in st.session_state.rooms if r.get('patient_id') == patient_id and r['occupancy_status'] == 'Occupied'), None)
 
+@timed("billing.add_auto_bill_entry")
 def add_auto_bill_entry(patient_id, record_type, amount, date, description):
-    """PROCEDURE: Performs a side-effect: creates a new record in st.session_state.billing and saves to backend."""
-    new_id = max([b['bill_id'] for b in st.session_state.billing]) + 1 if st.session_state.billing else 1
-    new_bill = {
-        "bill_id": new_id,
-        "patient_id": patient_id,
-        "amount": amount,
-        "status": "Unpaid",
-        "date": date,
-        "description": f"{record_type}"
-    }
+    """PROCEDURE: Performs a side-effect: creates a new record in st.session_state.billing and publishes BillCreated."""
+    new_bill = make_bill(next_id('billing'), patient_id, record_type, amount, date)
     st.session_state.billing.append(new_bill)
-    save_data_to_backend() # <--- NEW: Save to backend after auto-billing
+    publish(BillCreated(bill=new_bill)) # Persistence runs once when the surrounding unit of work ends
     
     # --- FIX: Using st.toast() instead of st.success() to survive the rerun/redirect ---
     st.toast(f"✅ Automated Bill (₹{amount:,.0f}) created for {get_patient_name(patient_id)}.", icon='💰')
 
+# --- Bulk Operations ---
+# Multi-select actions on the list pages change many records in one pass, publish one bulk
+# event (one columnar write per changed column) and end in one backend save.
+
+def bulk_update(collection, ids, changes, action="update"):
+    """PROCEDURE: Applies `changes` to the records with these ids (skipping unchanged ones) as one RecordsUpdated."""
+    records = st.session_state[collection]
+    rows = [row for row in columnar_table(collection).rows_of(ids).tolist()
+            if any(records[row].get(field) != value for field, value in changes.items())]
+    if not rows:
+        return 0
+    before = tuple(dict(records[row]) for row in rows)
+    private = st.session_state.setdefault('private_records', {}).setdefault(collection, set())
+    updated = copy_rows_for_edit(records, rows, private)
+    for record in updated:
+        record.update(changes)
+    publish(RecordsUpdated(collection=collection, before=before, records=tuple(updated), changes=dict(changes),
+                           action=action))
+    return len(updated)
+
+def bulk_delete(collection, values, field=None):
+    """PROCEDURE: Removes every record whose `field` (default: the primary key) is in `values`, as one RecordsDeleted."""
+    field = field or ID_FIELDS[collection]
+    wanted = set(values)
+    records = st.session_state[collection]
+    removed = tuple(r for r in records if r.get(field) in wanted)
+    if removed:
+        st.session_state[collection] = [r for r in records if r.get(field) not in wanted]
+        publish(RecordsDeleted(collection=collection, records=removed))
+    return len(removed)
+
+def vacate_patient_rooms(patient_ids):
+    """PROCEDURE: Frees every room held by these patients (one RoomVacated each, for the occupancy log)."""
+    wanted = set(patient_ids)
+    for room in [r for r in st.session_state.rooms if r['occupancy_status'] == 'Occupied' and r.get('patient_id') in wanted]:
+        patient_id = room['patient_id']
+        room = edit_record('rooms', room)
+        room['occupancy_status'] = 'Vacant'
+        room['patient_id'] = None
+        publish(RoomVacated(room=room, patient_id=patient_id))
+
+def discharge_patients(patient_ids):
+    """PROCEDURE: Discharges the admitted patients among `patient_ids` today and frees their rooms."""
+    df = collection_frame('patients')
+    admitted = df.loc[df['patient_id'].isin(patient_ids) & (df['status'] == 'Admitted'), 'patient_id'].tolist()
+    changed = bulk_update('patients', admitted, {"status": "Discharged", "discharge_date": datetime.now().strftime("%Y-%m-%d")},
+                          action="discharge")
+    vacate_patient_rooms(admitted)
+    return changed
+
+def delete_patients(patient_ids):
+    """PROCEDURE: Cascade delete of many patients: rooms freed, then their records removed from every list."""
+    vacate_patient_rooms(patient_ids)
+    removed = bulk_delete('patients', patient_ids)
+    for collection in ("billing", "appointments", "treatment_plans", "diagnosis"):
+        bulk_delete(collection, patient_ids, field='patient_id')
+    return removed
+
+def show_bulk_actions(collection, display_df, id_column):
+    """Bulk-select toggle for a list page. When on, shows the listed rows as a multi-select table with
+    the collection's bulk actions and returns True (the caller then skips its row-by-row list)."""
+    if not st.toggle("☑️ Bulk select", key=f"bulk_mode_{collection}"):
+        return False
+    bulk_round = st.session_state.get('bulk_round', 0) # bumped after each action so the old selection is dropped
+    selection = st.dataframe(display_df, use_container_width=True, hide_index=True, on_select="rerun",
+                             selection_mode="multi-row", key=f"bulk_table_{collection}_{bulk_round}")
+    rows = list(selection.selection.rows)
+    if st.checkbox(f"Select all {len(display_df)} listed", key=f"bulk_all_{collection}_{bulk_round}"):
+        rows = list(range(len(display_df)))
+    selected = display_df[id_column].iloc[rows].tolist()
+    st.caption(f"{len(selected)} selected")
+    if not selected:
+        return True
+
+    actions = [] # (button label, procedure(ids) -> number of records changed)
+    if collection == 'billing':
+        actions.append(("✅ Mark Paid", lambda ids: bulk_update('billing', ids, {"status": "Paid"})))
+        actions.append(("⏳ Mark Unpaid", lambda ids: bulk_update('billing', ids, {"status": "Unpaid"})))
+    if collection == 'patients':
+        actions.append(("🏠 Discharge", discharge_patients))
+    if collection in ('patients', 'appointments', 'treatment_plans'):
+        doctor_names = {d['doctor_id']: d['name'] for d in st.session_state.doctors}
+        doctor_id = st.selectbox("Reassign selected to", list(doctor_names), format_func=doctor_names.get,
+                                 key=f"bulk_doctor_{collection}")
+        actions.append(("👨‍⚕️ Reassign Doctor", lambda ids: bulk_update(collection, ids, {"doctor_id": doctor_id})))
+    actions.append(("🗑️ Delete", delete_patients if collection == 'patients' else lambda ids: bulk_delete(collection, ids)))
+
+    for col, (label, procedure) in zip(st.columns(len(actions)), actions):
+        if col.button(f"{label} ({len(selected)})", key=f"bulk_{label}_{collection}", use_container_width=True):
+            if label == "🗑️ Delete":
+                flag = f'confirm_bulk_delete_{collection}'
+                if st.session_state.get(flag) != sorted(selected):
+                    st.session_state[flag] = sorted(selected)
+                    st.warning(f"Click Delete again to confirm deleting **{len(selected)}** record(s)"
+                               f"{' and all their associated records' if collection == 'patients' else ''}.")
+                    continue
+                st.session_state.pop(flag)
+            with unit_of_work(): # One bulk event per collection and one backend save for the whole action
+                changed = procedure(selected)
+            st.session_state.bulk_round = bulk_round + 1
+            st.toast(f"{label[2:]}: {changed} record(s) changed.", icon='✅')
+            st.rerun()
+    return True
+
+# --- Referential Integrity ---
+# Every foreign key is checked as one vectorised join (poms.integrity): when a shard is first
+# read, after an import and on demand from Data Management. Repairs go through the bulk procedures.
+
+def run_integrity_check(collections=None):
+    """FUNCTION: Checks the keys of the loaded collections (all, or those touching `collections`) and keeps the report.
+
+    A partial check is merged into the session's report: only the keys it re-checked are replaced."""
+    data = {name: st.session_state[name] for name in st.session_state.loaded_collections}
+    with timed("integrity.check", collections=sorted(collections or data)):
+        report = check_integrity(data, collections)
+    previous = st.session_state.get('integrity_report')
+    if collections is not None and previous is not None:
+        report = previous.merge(report)
+    st.session_state.integrity_report = report
+    return report
+
+def repair_integrity(report):
+    """PROCEDURE: Applies the report's repairs (clear, vacate or cascade delete) as bulk events; returns the records changed."""
+    changed = 0
+    for action, collection, field, values in repair_plan(report):
+        if action == "delete":
+            changed += bulk_delete(collection, values, field=field)
+            continue
+        wanted = set(values)
+        ids = [r[ID_FIELDS[collection]] for r in st.session_state[collection] if r.get(field) in wanted]
+        changes = {field: None}
+        if action == "vacate":
+            vacate_patient_rooms(wanted) # Occupied rooms get a vacate entry in the occupancy log
+            changes["occupancy_status"] = "Vacant"
+        bulk_update(collection, ids, changes)
+        changed += len(ids)
+    return changed
+
+# --- Room State Reconciliation ---
+def remember_room_autofix():
+    """PROCEDURE: Keeps the Rooms page's auto-fix toggle in a non-widget key that survives other pages."""
+    st.session_state.room_autofix_enabled = st.session_state.room_autofix
+
+# Rooms must agree with patient status and the occupancy log (poms.room_state). The rooms touched
+# by each patient or room change are re-checked when its unit of work ends; all rooms on demand.
+
+def find_patients(ids):
+    """FUNCTION: {patient_id: record} for the ids that exist, via the columnar primary-key index."""
+    records = st.session_state.patients
+    return {records[row]['patient_id']: records[row] for row in columnar_table('patients').rows_of(ids).tolist()}
+
+def check_room_state(patient_ids=None, room_ids=None):
+    """FUNCTION: Room/patient inconsistencies for the whole ward, or only the rooms touching these patients or rooms."""
+    with timed("rooms.reconcile", scope="full" if patient_ids is None and room_ids is None else "incremental"):
+        return reconcile_rooms(st.session_state.rooms, find_patients, st.session_state.room_events, patient_ids, room_ids)
+
+def fix_room_issues(issues):
+    """PROCEDURE: Vacates or clears the rooms in `issues` (vacates are logged) and re-logs unlogged occupants, unbilled."""
+    rooms = {r['room_id']: r for r in st.session_state.rooms if r['room_id'] in {issue.room_id for issue in issues}}
+    for issue in issues:
+        room = rooms.get(issue.room_id)
+        if room is None:
+            continue
+        if issue.fix == "log":
+            publish(RoomAssigned(room=room, patient_id=issue.patient_id, charge_room=False))
+            continue
+        before = dict(room)
+        room = rooms[issue.room_id] = edit_record('rooms', room)
+        room['occupancy_status'] = 'Vacant'
+        room['patient_id'] = None
+        if issue.fix == "vacate" and issue.patient_id is not None:
+            publish(RoomVacated(room=room, patient_id=issue.patient_id))
+        else:
+            publish(RoomUpdated(before=before, room=room))
+
+def reconcile_room_state(events):
+    """SUBSCRIBER (deferred): Re-checks the rooms touched by patient and room changes, then fixes them or keeps them for review."""
+    patient_ids, room_ids = set(), set()
+    for event in events:
+        if isinstance(event, DataReplaced):
+            patient_ids = room_ids = None # Whole ward replaced: check every room
+            break
+        if isinstance(event, (RecordsUpdated, RecordsDeleted)):
+            collection, records = event.collection, event.records
+        else:
+            collection, record = event_record(event)
+            records = (record,)
+        if collection == 'patients':
+            patient_ids.update(r['patient_id'] for r in records)
+        elif collection == 'rooms':
+            room_ids.update(r['room_id'] for r in records)
+    if patient_ids == set() and room_ids == set():
+        return
+    ensure_collections_loaded(("rooms", "patients", "room_events"))
+    issues = check_room_state(patient_ids, room_ids)
+    if st.session_state.get('room_autofix_enabled', True):
+        fix_room_issues(issues)
+        st.session_state.pop('room_issues', None) # Any earlier report is out of date
+        return
+    # Report only: replace what was known about the checked rooms and patients
+    known = st.session_state.get('room_issues', []) if patient_ids is not None else []
+    checked_rooms = (room_ids or set()) | {issue.room_id for issue in issues}
+    st.session_state.room_issues = sorted(
+        [i for i in known if i.room_id not in checked_rooms and i.patient_id not in (patient_ids or set())] + issues,
+        key=lambda issue: issue.room_id)
+
+# --- Domain Event Bus & Subscribers (NEW) ---
+# Form handlers only mutate their own records and publish an event; side effects live in subscribers.
+# Immediate subscribers keep indexes current for the rest of the rerun. Deferred subscribers run
+# once per unit of work in priority order: billing rules first, persistence last (one save per submit).
+
+def writable_columnar_table(collection):
+    """This session's own columnar table for `collection` (forking the shared one), or None if none is built yet."""
+    tables = st.session_state.setdefault('columnar', {})
+    table = tables.get(collection)
+    if table is None:
+        snapshot = get_snapshots().get(snapshot_ward(collection), collection)
+        if snapshot is None or snapshot.table is None or snapshot.version != st.session_state.snapshot_versions.get(collection):
+            return None # built lazily by columnar_table()
+        table = tables[collection] = snapshot.table.fork() # copy-on-write: never update a shared table
+    return table
+
+def update_columnar_tables(event):
+    """SUBSCRIBER: Applies the changed record(s) to the columnar table in place (append, update or delete)."""
+    if isinstance(event, (RecordsUpdated, RecordsDeleted)):
+        table = writable_columnar_table(event.collection)
+        if table is not None:
+            keys = [record[ID_FIELDS[event.collection]] for record in event.records]
+            if isinstance(event, RecordsDeleted):
+                table.delete_many(keys)
+            else:
+                table.assign(keys, event.changes)
+            table.source = st.session_state[event.collection]
+        return
+    changed = event_record(event)
+    if changed is None:
+        st.session_state.get('columnar', {}).clear() # DataReplaced: rebuilt lazily by columnar_table()
+        return
+    collection, record = changed
+    table = writable_columnar_table(collection)
+    if table is None:
+        return
+    if event.name.endswith("Deleted"):
+        table.delete(record[ID_FIELDS[collection]])
+    else:
+        table.upsert(record)
+    table.source = st.session_state[collection]
+
+def update_receivables_index(event):
+    """SUBSCRIBER: Keeps the receivables rollups in step with billing, by delta."""
+    ledger = st.session_state.receivables
+    if isinstance(event, BillCreated):
+        ledger.add_bill(event.bill)
+    elif isinstance(event, BillUpdated):
+        ledger.update_bill(event.before, event.bill)
+    elif isinstance(event, BillDeleted):
+        ledger.remove_bill(event.bill)
+    elif isinstance(event, RecordsUpdated):
+        if event.collection == 'billing':
+            for before, bill in zip(event.before, event.records):
+                ledger.update_bill(before, bill)
+    elif isinstance(event, RecordsDeleted):
+        if event.collection == 'billing':
+            for bill in event.records:
+                ledger.remove_bill(bill)
+    else:
+        rebuild_receivables()
+
+def update_room_event_log(event):
+    """SUBSCRIBER: Appends room assignments and vacates to the occupancy event log."""
+    if isinstance(event, RoomAssigned):
+        event_type = "transfer" if event.from_room_id is not None else "occupy"
+        record_room_event(event_type, event.room['room_id'], event.patient_id, from_room_id=event.from_room_id)
+    else:
+        record_room_event("vacate", event.room['room_id'], event.patient_id)
+
+def update_timeline_index(event):
+    """SUBSCRIBER: Keeps the per-patient timeline index in step with its source collections, by delta."""
+    index = st.session_state.get('timeline_index')
+    if index is None:
+        return # Built on first use by patient_timeline_index()
+    if isinstance(event, DataReplaced):
+        st.session_state.pop('timeline_index')
+    elif isinstance(event, (RoomAssigned, RoomVacated)):
+        index.add('room_events', st.session_state.room_events[-1]) # Just appended by update_room_event_log
+    elif isinstance(event, RecordsUpdated):
+        if event.collection in TIMELINE_SOURCES:
+            for before, record in zip(event.before, event.records):
+                index.update(event.collection, before, record)
+    elif isinstance(event, RecordsDeleted):
+        if event.collection in TIMELINE_SOURCES:
+            for record in event.records:
+                index.remove(event.collection, record)
+    else:
+        collection, record = event_record(event)
+        if collection not in TIMELINE_SOURCES:
+            return
+        if event.name.endswith("Deleted"):
+            index.remove(collection, record)
+        elif hasattr(event, 'before'):
+            index.update(collection, event.before, record)
+        else:
+            index.add(collection, record)
+
+def update_doctor_workload(event):
+    """SUBSCRIBER: Keeps the doctor workload model in step with patients, appointments, plans and bills, by delta."""
+    workload = st.session_state.get('workload')
+    if workload is None or isinstance(event, PatientDischarged):
+        return # Built on first use by doctor_workload(); a discharge arrives with its PatientUpdated
+    if isinstance(event, DataReplaced):
+        st.session_state.pop('workload')
+    elif isinstance(event, RecordsUpdated):
+        if event.collection in WORKLOAD_SOURCES:
+            for before, record in zip(event.before, event.records):
+                workload.update(event.collection, before, record)
+    elif isinstance(event, RecordsDeleted):
+        if event.collection in WORKLOAD_SOURCES:
+            for record in event.records:
+                workload.remove(event.collection, record)
+    else:
+        collection, record = event_record(event)
+        if collection not in WORKLOAD_SOURCES:
+            return
+        if event.name.endswith("Deleted"):
+            workload.remove(collection, record)
+        elif hasattr(event, 'before'):
+            workload.update(collection, event.before, record)
+        else:
+            workload.add(collection, record)
+
+def update_plan_intervals(event):
+    """SUBSCRIBER: Keeps the treatment-plan interval index in step with the plans, by delta."""
+    index = st.session_state.get('plan_intervals')
+    if index is None:
+        return # Built on first use by plan_interval_index()
+    if isinstance(event, DataReplaced):
+        st.session_state.pop('plan_intervals')
+    elif isinstance(event, (TreatmentPlanCreated, TreatmentPlanUpdated)):
+        index.add(event.plan) # Re-adding a plan replaces its old window
+    elif isinstance(event, TreatmentPlanDeleted):
+        index.remove(event.plan)
+    elif isinstance(event, RecordsUpdated) and event.collection == 'treatment_plans':
+        for plan in event.records:
+            index.add(plan)
+    elif isinstance(event, RecordsDeleted) and event.collection == 'treatment_plans':
+        for plan in event.records:
+            index.remove(plan)
+
+def count_mutation_kpis(event):
+    """SUBSCRIBER: Counts mutations per event type for the session activity KPIs."""
+    st.session_state.setdefault('mutation_kpis', Counter())[event.name] += 1
+
+def apply_billing_rules(events):
+    """SUBSCRIBER (deferred): Automatic charges for appointments, plans, diagnoses and room assignments."""
+    today = datetime.now().strftime("%Y-%m-%d")
+    for event in events:
+        if isinstance(event, AppointmentScheduled):
+            appointment = event.appointment
+            add_auto_bill_entry(appointment['patient_id'], "Appointment Fee", APPOINTMENT_FEE, today, 
+                                f"Consultation with {get_doctor_name(appointment['doctor_id'])}")
+        elif isinstance(event, TreatmentPlanCreated):
+            add_auto_bill_entry(event.plan['patient_id'], "Treatment Plan", TREATMENT_PLAN_FEE, today, event.plan['details'].split('\n')[0])
+        elif isinstance(event, DiagnosisRecorded):
+            diagnosis = event.diagnosis
+            add_auto_bill_entry(diagnosis['patient_id'], "Diagnosis", DIAGNOSIS_FEE, today, 
+                                f"{diagnosis['disease_type']} - {diagnosis['diagnosis_type']}")
+        elif isinstance(event, RoomAssigned) and event.charge_room:
+            # Initial Room Billing Automation (FIXED TO 1 DAY CHARGE)
+            room = event.room
+            add_auto_bill_entry(event.patient_id, ROOM_CHARGE, room['cost_per_day'] * 1, today, 
+                                f"{room['room_type']} R{room['room_id']} (1-day Charge, Rate: ₹{room['cost_per_day']:,.0f}/day)")
+        else:
+            continue
+        st.session_state.menu = "Billing" # <--- Automated Navigation
+
+def record_audit_entry(event):
+    """SUBSCRIBER: Appends the change (with before/after values) to the audit trail - one line per changed record."""
+    entries = entries_from_event(event)
+    if not entries:
+        return
+    if isinstance(event, DataReplaced):
+        action, entity, entity_id, _ = entries[0]
+        entries = [(action, entity, entity_id, {name: len(st.session_state[name]) for name in WARD_COLLECTIONS
+                                                if name in st.session_state.loaded_collections})]
+    get_audit_log().append_many(entries, actor=st.session_state.get('operator') or "anonymous", ward=st.session_state.ward)
+
+def persist_changes(events):
+    """SUBSCRIBER (deferred, runs last): One backend save of the touched collections for the whole unit of work."""
+    collections = set()
+    for event in events:
+        if isinstance(event, (RecordsUpdated, RecordsDeleted)):
+            collections.add(event.collection)
+            continue
+        changed = event_record(event)
+        if changed is None:
+            collections = None # DataReplaced: save everything loaded
+            break
+        collections.add(changed[0])
+        if isinstance(event, (RoomAssigned, RoomVacated)):
+            collections.add('room_events')
+    save_data_to_backend(collections)
+    if collections is None:
+        backup_ward(f"after {event.source}") # Checkpoint for as-of views: the audit trail cannot replay a replacement
+
+# Immediate subscribers that only maintain this session's derived indexes (safe to replay for external edits)
+DERIVED_INDEX_SUBSCRIBERS = (update_receivables_index, update_timeline_index, update_doctor_workload, update_plan_intervals)
+
+def get_event_bus():
+    """Returns this session's event bus, registering the standard subscribers on first use."""
+    if 'event_bus' not in st.session_state:
+        bus = EventBus()
+        bus.subscribe((BillCreated, BillUpdated, BillDeleted, RecordsUpdated, RecordsDeleted, DataReplaced), update_receivables_index)
+        bus.subscribe((RoomAssigned, RoomVacated), update_room_event_log)
+        bus.subscribe(DomainEvent, update_timeline_index) # After the room event log: reads the entry it appended
+        bus.subscribe(DomainEvent, update_doctor_workload)
+        bus.subscribe((TreatmentPlanCreated, TreatmentPlanUpdated, TreatmentPlanDeleted, RecordsUpdated, RecordsDeleted,
+                       DataReplaced), update_plan_intervals)
+        bus.subscribe(DomainEvent, update_columnar_tables)
+        bus.subscribe(DomainEvent, count_mutation_kpis)
+        bus.subscribe(DomainEvent, record_audit_entry)
+        bus.subscribe((PatientUpdated, PatientDischarged, PatientDeleted, RoomCreated, RoomUpdated, RoomAssigned, RoomVacated,
+                       RecordsUpdated, RecordsDeleted, DataReplaced), reconcile_room_state, priority=5, deferred=True)
+        bus.subscribe((AppointmentScheduled, TreatmentPlanCreated, DiagnosisRecorded, RoomAssigned),
+                      apply_billing_rules, priority=10, deferred=True)
+        bus.subscribe(DomainEvent, persist_changes, priority=100, deferred=True)
+        st.session_state.event_bus = bus
+    return st.session_state.event_bus
+
+def publish(event):
+    """PROCEDURE: Publishes a domain event on this session's bus (refused while viewing an as-of date)."""
+    if st.session_state.get('as_of') is not None:
+        load_data_from_backend() # Drops whatever the handler changed in the historical lists
+        st.error(f"Read-only: viewing data as of {st.session_state.as_of:%d %b %Y}. Clear the as-of date to make changes.")
+        st.stop()
+    get_event_bus().publish(event)
+
+def unit_of_work():
+    """Groups the events of one user action so deferred subscribers (billing, save) run once at the end."""
+    return get_event_bus().unit_of_work()
+
 # --- Page Functions (CRUD Operations updated to call save_data_to_backend) ---
 
+@uses_collections("patients", "doctors", "rooms", "appointments", "treatment_plans")
 def show_dashboard():
     st.markdown('<h1 class="main-header">Dashboard</h1>', unsafe_allow_html=True)
     
     # Metrics cards
-    col1, col2, col3, col4 = st.columns(4)
+    col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
         total_patients = len(st.session_state.patients)
@@ -376,6 +1047,11 @@ def show_dashboard():
         today_appointments = sum(1 for a in st.session_state.appointments if a['date'] == today)
         pending = sum(1 for a in st.session_state.appointments if datetime.strptime(a['date'], '%Y-%m-%d') >= datetime.strptime(today, '%Y-%m-%d'))
         st.metric("Today's Appointments", today_appointments, f"{pending} pending")
+
+    with col5:
+        plans = plan_interval_index()
+        ending = len(plans.ending_within(today, (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")))
+        st.metric("Active Treatments", len(plans.active_on(today)), f"{ending} ending this week", delta_color="off")
     
     st.markdown("---")
     
@@ -384,30 +1060,30 @@ def show_dashboard():
     
     with col1:
         st.subheader("Patient Admissions by Month")
-        df_patients = pd.DataFrame(st.session_state.patients)
-        
-        if not df_patients.empty:
-            df_patients['admission_date'] = df_patients['admission_date'].astype(str)
-            df_patients['admission_date'] = pd.to_datetime(df_patients['admission_date'], errors='coerce')
-            df_patients.dropna(subset=['admission_date'], inplace=True)
-            df_patients['month_year'] = df_patients['admission_date'].dt.strftime('%Y-%m') 
-            df_patients['month_label'] = df_patients['admission_date'].dt.strftime('%b %Y') 
-            monthly_counts = df_patients.groupby(['month_year', 'month_label']).size().reset_index(name='count')
-            monthly_counts = monthly_counts.sort_values('month_year')
-            
-            fig = px.line(monthly_counts, x='month_label', y='count', markers=True, 
+        def build_admissions_chart():
+            counts, level, _ = admissions_series()
+            if counts.empty:
+                return None
+            fig = px.line(counts, x='admission_date', y='count', markers=True, 
                           color_discrete_sequence=[PRIMARY_COLOR]) # Use NEW color
-            fig.update_layout(xaxis_title="Month", yaxis_title="Admissions", showlegend=False)
+            fig.update_layout(xaxis_title=LEVEL_AXIS[level], yaxis_title="Admissions", showlegend=False)
+            return fig
+        fig = cached_figure("dashboard_admissions", ("patients",), (), build_admissions_chart)
+        if fig is not None:
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No admissions data to display.")
     
     with col2:
         st.subheader("Disease Distribution")
-        if not df_patients.empty:
-            disease_counts = df_patients['diagnosis'].value_counts()
-            fig = px.pie(values=disease_counts.values, names=disease_counts.index, 
-                         hole=0.3, color_discrete_sequence=px.colors.sequential.Teal) # Use NEW color
+        def build_diagnosis_mix_chart():
+            if not st.session_state.patients:
+                return None
+            disease_counts = collection_frame('patients')['diagnosis'].value_counts()
+            return px.pie(values=disease_counts.values, names=disease_counts.index, 
+                          hole=0.3, color_discrete_sequence=px.colors.sequential.Teal) # Use NEW color
+        fig = cached_figure("dashboard_diagnosis_mix", ("patients",), (), build_diagnosis_mix_chart)
+        if fig is not None:
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No disease data to display.")
@@ -416,6 +1092,7 @@ def show_dashboard():
     
     # Recent patients table
     st.subheader("Recent Patients")
+    df_patients = collection_frame('patients')
     if not df_patients.empty:
         df_recent = df_patients.sort_values('admission_date', ascending=False).head(5)
         df_recent['Doctor'] = df_recent['doctor_id'].apply(get_doctor_name)
@@ -424,6 +1101,7 @@ def show_dashboard():
         st.dataframe(display_df, use_container_width=True, hide_index=True)
 
 # Patients page
+@uses_collections("patients", "doctors", "rooms", "appointments", "treatment_plans", "diagnosis", "billing", "room_events")
 def show_patients():
     st.markdown('<h1 class="main-header">Patient Management</h1>', unsafe_allow_html=True)
     
@@ -435,6 +1113,7 @@ def show_patients():
             st.rerun()
 
     # Function to display and handle the form (for both add and edit)
+    @timed("form.patient")
     def patient_form_handler(edit_patient=None):
         if edit_patient:
             st.subheader(f"Edit Patient: {edit_patient['name']} (ID: {edit_patient['patient_id']})")
@@ -471,6 +1150,11 @@ def show_patients():
             with col2:
                 address = st.text_area("Address", height=100, value=default_values['address'])
                 diagnosis = st.text_input("Primary Diagnosis*", default_values['diagnosis'])
+                suggestion = least_loaded_oncologist()
+                if suggestion:
+                    doctor, load = suggestion
+                    st.caption(f"💡 Least-loaded oncologist: **{doctor['name']}** ({load['active_patients']} admitted, "
+                               f"{load['upcoming_appointments']} upcoming appointments, {load['active_plans']} active plans)")
                 doctor_id = st.selectbox("Assigned Doctor*", 
                                          options=[d['doctor_id'] for d in st.session_state.doctors],
                                          format_func=lambda x: get_doctor_name(x),
@@ -539,64 +1223,66 @@ def show_patients():
                         st.error("Name and Primary Diagnosis are required.")
                         return 
                     
-                    new_status = "Discharged" if discharge_date else "Admitted"
+                    with unit_of_work(): # Billing rules and the backend save run once, when this block ends
+                        new_status = "Discharged" if discharge_date else "Admitted"
                     
-                    is_new_patient = not edit_patient
-                    patient_id_to_use = edit_patient['patient_id'] if edit_patient else None
-
-                    if is_new_patient:
-                        # Save logic (Add New Patient)
-                        patient_id_to_use = max([p['patient_id'] for p in st.session_state.patients]) + 1 if st.session_state.patients else 1
-                        new_patient = {
-                            "patient_id": patient_id_to_use, "name": name, "age": age, "dob": dob.strftime("%Y-%m-%d"),
-                            "gender": gender, "address": address, "diagnosis": diagnosis, "admission_date": admission_date.strftime("%Y-%m-%d"),
-                            "discharge_date": discharge_date.strftime("%Y-%m-%d") if discharge_date else None,
-                            "doctor_id": doctor_id, "status": new_status
-                        }
-                        st.session_state.patients.append(new_patient)
-                        st.success(f"Patient {name} added successfully!")
-                    else:
-                        # Update logic
-                        patient_index = next((i for i, p in enumerate(st.session_state.patients) if p['patient_id'] == patient_id_to_use), -1)
-                        if patient_index != -1:
-                            st.session_state.patients[patient_index].update({
-                                "name": name, "age": age, "dob": dob.strftime("%Y-%m-%d"), "gender": gender, 
-                                "address": address, "diagnosis": diagnosis, "admission_date": admission_date.strftime("%Y-%M-%d"),
+                        is_new_patient = not edit_patient
+                        patient_id_to_use = edit_patient['patient_id'] if edit_patient else None
+
+                        if is_new_patient:
+                            # Save logic (Add New Patient)
+                            patient_id_to_use = next_id('patients')
+                            new_patient = {
+                                "patient_id": patient_id_to_use, "name": name, "age": age, "dob": dob.strftime("%Y-%m-%d"),
+                                "gender": gender, "address": address, "diagnosis": diagnosis, "admission_date": admission_date.strftime("%Y-%m-%d"),
                                 "discharge_date": discharge_date.strftime("%Y-%m-%d") if discharge_date else None,
                                 "doctor_id": doctor_id, "status": new_status
-                            })
-                            st.success(f"Patient {name} updated successfully!")
-
-                    # Room update and Initial Billing logic
-                    old_room = find_patient_room(patient_id_to_use)
-                    room_changed = old_room and room_id and old_room.get('room_id') != room_id
+                            }
+                            st.session_state.patients.append(new_patient)
+                            publish(PatientAdmitted(patient=new_patient))
+                            st.success(f"Patient {name} added successfully!")
+                        else:
+                            # Update logic
+                            patient_index = next((i for i, p in enumerate(st.session_state.patients) if p['patient_id'] == patient_id_to_use), -1)
+                            if patient_index != -1:
+                                before = dict(st.session_state.patients[patient_index])
+                                edit_record('patients', st.session_state.patients[patient_index]).update({
+                                    "name": name, "age": age, "dob": dob.strftime("%Y-%m-%d"), "gender": gender, 
+                                    "address": address, "diagnosis": diagnosis, "admission_date": admission_date.strftime("%Y-%m-%d"),
+                                    "discharge_date": discharge_date.strftime("%Y-%m-%d") if discharge_date else None,
+                                    "doctor_id": doctor_id, "status": new_status
+                                })
+                                publish(PatientUpdated(before=before, patient=st.session_state.patients[patient_index]))
+                                if before['status'] != 'Discharged' and new_status == 'Discharged':
+                                    publish(PatientDischarged(patient=st.session_state.patients[patient_index]))
+                                st.success(f"Patient {name} updated successfully!")
+
+                        # Room update and Initial Billing logic
+                        old_room = find_patient_room(patient_id_to_use)
+                        room_changed = old_room and room_id and old_room.get('room_id') != room_id
                     
-                    # 1. Clear old room assignment if patient is changing rooms or no longer needs a room
-                    if old_room and (not room_required_new or room_changed):
-                        old_room['occupancy_status'] = 'Vacant'
-                        old_room['patient_id'] = None
+                        # 1. Clear old room assignment if patient is changing rooms or no longer needs a room
+                        if old_room and (not room_required_new or room_changed):
+                            old_room = edit_record('rooms', old_room)
+                            old_room['occupancy_status'] = 'Vacant'
+                            old_room['patient_id'] = None
+                            if not room_changed:
+                                publish(RoomVacated(room=old_room, patient_id=patient_id_to_use))
                         
-                    # 2. Assign new room if required
-                    if room_required_new and room_id:
-                        room_to_update = next(r for r in st.session_state.rooms if r['room_id'] == room_id)
+                        # 2. Assign new room if required
+                        if room_required_new and room_id:
+                            room_to_update = edit_record('rooms', next(r for r in st.session_state.rooms if r['room_id'] == room_id))
                         
-                        # Only add a bill if a NEW room is being assigned (either new patient or patient moving)
-                        if room_to_update and (is_new_patient or room_changed):
-                            room_to_update['occupancy_status'] = 'Occupied'
-                            room_to_update['patient_id'] = patient_id_to_use
-                            
-                            # Initial Room Billing Automation (FIXED TO 1 DAY CHARGE)
-                            room_cost = room_to_update['cost_per_day']
-                            add_auto_bill_entry(patient_id_to_use, "Room & Board ", room_cost * 1, # CHARGED FOR 1 DAY
-                                                datetime.now().strftime("%Y-%m-%d"), 
-                                                f"{room_to_update['room_type']} R{room_id} (1-day Charge, Rate: ₹{room_cost:,.0f}/day)")
-                            st.session_state.menu = "Billing" # <--- Automated Navigation
-                        # If patient is editing and staying in the SAME room
-                        elif room_to_update and room_to_update.get('patient_id') == patient_id_to_use:
-                            room_to_update['occupancy_status'] = 'Occupied'
-                            
-                    
-                    save_data_to_backend() # <--- NEW: Save to backend after patient update/creation
+                            # Only add a bill if a NEW room is being assigned (either new patient or patient moving)
+                            if room_to_update and (is_new_patient or room_changed):
+                                room_to_update['occupancy_status'] = 'Occupied'
+                                room_to_update['patient_id'] = patient_id_to_use
+                                # RoomAssigned drives the occupancy log and the 1-day Room & Board charge (billing rules)
+                                publish(RoomAssigned(room=room_to_update, patient_id=patient_id_to_use,
+                                                     from_room_id=old_room['room_id'] if room_changed else None))
+                            # If patient is editing and staying in the SAME room
+                            elif room_to_update and room_to_update.get('patient_id') == patient_id_to_use:
+                                room_to_update['occupancy_status'] = 'Occupied'
                     
                     st.session_state.show_patient_form = False
                     st.session_state.edit_patient_id = None
@@ -615,66 +1301,161 @@ def show_patients():
     else:
         # Patients table logic
         st.markdown("---")
-        df = pd.DataFrame(st.session_state.patients)
+        df = collection_frame('patients')
         if not df.empty:
             df['Doctor'] = df['doctor_id'].apply(get_doctor_name)
             df['Room'] = df['patient_id'].apply(lambda pid: f"R{find_patient_room(pid)['room_id']}" if find_patient_room(pid) else 'N/A')
             display_df = df[['patient_id', 'name', 'age', 'gender', 'diagnosis', 'Room', 'admission_date', 'Doctor', 'status']].copy()
             display_df.columns = ['ID', 'Name', 'Age', 'Gender', 'Diagnosis', 'Room', 'Admission Date', 'Doctor', 'Status']
             
-            col_list = st.columns(len(display_df.columns) + 2) # +2 for Edit and Delete columns
+            if not show_bulk_actions('patients', display_df, 'ID'):
+                col_list = st.columns(len(display_df.columns) + 2) # +2 for Edit and Delete columns
             
-            # Table Header
-            for i, col_name in enumerate(display_df.columns):
-                col_list[i].write(f"**{col_name}**")
-            col_list[-2].write("**Edit**")
-            col_list[-1].write("**Delete**")
-
-            # Table Rows
-            for i, row in display_df.iterrows():
-                row_cols = st.columns(len(display_df.columns) + 2)
-                for j, col_name in enumerate(display_df.columns):
-                    row_cols[j].write(row[col_name])
-
-                # Edit Button (Accessing the correct key: 'ID')
-                if row_cols[-2].button("✏️", key=f"edit_patient_{row['ID']}"):
-                    st.session_state.edit_patient_id = row['ID']
-                    st.session_state.show_patient_form = True
-                    st.rerun()
+                # Table Header
+                for i, col_name in enumerate(display_df.columns):
+                    col_list[i].write(f"**{col_name}**")
+                col_list[-2].write("**Edit**")
+                col_list[-1].write("**Delete**")
+
+                # Table Rows
+                for i, row in display_df.iterrows():
+                    row_cols = st.columns(len(display_df.columns) + 2)
+                    for j, col_name in enumerate(display_df.columns):
+                        row_cols[j].write(row[col_name])
+
+                    # Edit Button (Accessing the correct key: 'ID')
+                    if row_cols[-2].button("✏️", key=f"edit_patient_{row['ID']}"):
+                        st.session_state.edit_patient_id = row['ID']
+                        st.session_state.show_patient_form = True
+                        st.rerun()
                 
-                # Delete Button (Accessing the correct key: 'ID')
-                if row_cols[-1].button("🗑️", key=f"delete_patient_{row['ID']}"):
-                    patient_id_to_delete = row['ID']
-                    patient_name = row['Name']
-                    if st.session_state.get(f'confirm_delete_patient_{patient_id_to_delete}', False):
-                        
-                        # --- CASCADE DELETION ---
-                        # 1. Clear Room Assignment
-                        room_to_vacate = find_patient_room(patient_id_to_delete)
-                        if room_to_vacate:
-                            room_to_vacate['occupancy_status'] = 'Vacant'
-                            room_to_vacate['patient_id'] = None
-                        
-                        # 2. Remove Patient Data from ALL lists
-                        st.session_state.patients = [p for p in st.session_state.patients if p['patient_id'] != patient_id_to_delete]
-                        st.session_state.billing = [b for b in st.session_state.billing if b['patient_id'] != patient_id_to_delete]
-                        st.session_state.appointments = [a for a in st.session_state.appointments if a['patient_id'] != patient_id_to_delete]
-                        st.session_state.treatment_plans = [t for t in st.session_state.treatment_plans if t['patient_id'] != patient_id_to_delete]
-                        st.session_state.diagnosis = [d for d in st.session_state.diagnosis if d['patient_id'] != patient_id_to_delete]
+                    # Delete Button (Accessing the correct key: 'ID')
+                    if row_cols[-1].button("🗑️", key=f"delete_patient_{row['ID']}"):
+                        patient_id_to_delete = row['ID']
+                        patient_name = row['Name']
+                        if st.session_state.get(f'confirm_delete_patient_{patient_id_to_delete}', False):
                         
-                        save_data_to_backend() # <--- NEW: Save to backend after deletion
+                            # --- CASCADE DELETION ---
+                            with unit_of_work():
+                                # 1. Clear Room Assignment
+                                room_to_vacate = find_patient_room(patient_id_to_delete)
+                                if room_to_vacate:
+                                    room_to_vacate = edit_record('rooms', room_to_vacate)
+                                    room_to_vacate['occupancy_status'] = 'Vacant'
+                                    room_to_vacate['patient_id'] = None
+                                    publish(RoomVacated(room=room_to_vacate, patient_id=patient_id_to_delete))
+                            
+                                # 2. Remove Patient Data from ALL lists (one Deleted event per removed record)
+                                deleted_patient = next(p for p in st.session_state.patients if p['patient_id'] == patient_id_to_delete)
+                                st.session_state.patients = [p for p in st.session_state.patients if p['patient_id'] != patient_id_to_delete]
+                                publish(PatientDeleted(patient=deleted_patient))
+                                for collection, event_type in (("billing", BillDeleted), ("appointments", AppointmentDeleted),
+                                                               ("treatment_plans", TreatmentPlanDeleted), ("diagnosis", DiagnosisDeleted)):
+                                    removed = [r for r in st.session_state[collection] if r['patient_id'] == patient_id_to_delete]
+                                    st.session_state[collection] = [r for r in st.session_state[collection] if r['patient_id'] != patient_id_to_delete]
+                                    for record in removed:
+                                        publish(event_type(record))
                         
-                        st.success(f"Patient {patient_name} and ALL associated records deleted successfully.")
-                        st.session_state.pop(f'confirm_delete_patient_{patient_id_to_delete}')
-                        st.rerun()
-                    else:
-                        st.session_state[f'confirm_delete_patient_{patient_id_to_delete}'] = True
-                        st.warning(f"Click Delete again to confirm deleting **{patient_name}** and **all associated records**.")
+                            st.success(f"Patient {patient_name} and ALL associated records deleted successfully.")
+                            st.session_state.pop(f'confirm_delete_patient_{patient_id_to_delete}')
+                            st.rerun()
+                        else:
+                            st.session_state[f'confirm_delete_patient_{patient_id_to_delete}'] = True
+                            st.warning(f"Click Delete again to confirm deleting **{patient_name}** and **all associated records**.")
                         
         else:
             st.info("No patient records found.")
 
+# Patient Timeline (one patient's records from every page, merged in date order)
+TIMELINE_SOURCE_LABELS = {"appointments": "Appointments", "diagnosis": "Diagnoses", "treatment_plans": "Treatment Plans",
+                          "room_events": "Room Events", "billing": "Bills"}
+
+def patient_timeline_index():
+    """FUNCTION: This session's per-patient timeline index, built from the loaded collections on first use."""
+    if st.session_state.get('timeline_index') is None:
+        with timed("timeline.build"):
+            st.session_state.timeline_index = PatientTimelineIndex({name: st.session_state[name] for name in TIMELINE_SOURCES})
+    return st.session_state.timeline_index
+
+def describe_timeline_item(item):
+    """FUNCTION: One-line description of a timeline item for display."""
+    r = item.record
+    if item.source == "appointments":
+        return f"{r.get('reason', '')} with {get_doctor_name(r.get('doctor_id'))}"
+    if item.source == "diagnosis":
+        return f"{r.get('disease_type', '')} - {r.get('diagnosis_type', '')}: {r.get('result', '')}"
+    if item.source == "treatment_plans":
+        return f"{str(r.get('details') or '').split(chr(10))[0]} ({get_doctor_name(r.get('doctor_id'))})"
+    if item.source == "room_events":
+        return f"Room {r.get('room_id')}" + (f" (from Room {r['from_room_id']})" if r.get('from_room_id') is not None else "")
+    return f"₹{float(r.get('amount') or 0):,.0f} {r.get('status', '')} - {r.get('description', '')}"
+
+@uses_collections("patients", "doctors", "appointments", "diagnosis", "treatment_plans", "billing", "room_events")
+def show_patient_timeline():
+    st.markdown('<h1 class="main-header">Patient Timeline</h1>', unsafe_allow_html=True)
+    patient_names = {p['patient_id']: f"{p['name']} (ID {p['patient_id']})" for p in st.session_state.patients}
+    if not patient_names:
+        st.info("No patient records found.")
+        return
+
+    col1, col2, col3, col4 = st.columns([2, 3, 1, 1])
+    with col1:
+        patient_id = st.selectbox("Patient", list(patient_names), format_func=patient_names.get, key="timeline_patient")
+    with col2:
+        sources = st.multiselect("Show", list(TIMELINE_SOURCES), default=list(TIMELINE_SOURCES),
+                                 format_func=TIMELINE_SOURCE_LABELS.get, key="timeline_sources")
+    with col3:
+        newest_first = st.radio("Order", ["Newest first", "Oldest first"], key="timeline_order") == "Newest first"
+    with col4:
+        page_size = st.selectbox("Per page", [25, 50, 100], key="timeline_page_size")
+
+    # A new patient, filter or order starts again at the first page
+    view = (patient_id, tuple(sources), newest_first, page_size)
+    if st.session_state.get('timeline_view') != view:
+        st.session_state.timeline_view = view
+        st.session_state.timeline_page = 0
+    page = st.session_state.timeline_page
+
+    index = patient_timeline_index()
+    items, has_more = index.page(patient_id, page, page_size, newest_first, tuple(sources))
+    st.caption(f"{index.count(patient_id)} events for {patient_names[patient_id]} · page {page + 1}")
+    if items:
+        st.dataframe(pd.DataFrame([{"When": item.when.replace("T", " ")[:16], "Event": item.kind,
+                                    "Details": describe_timeline_item(item)} for item in items]),
+                     use_container_width=True, hide_index=True)
+    else:
+        st.info("No events on this page.")
+
+    col1, _, col3 = st.columns([1, 4, 1])
+    with col1:
+        if st.button("◀ Previous", disabled=page == 0, use_container_width=True):
+            st.session_state.timeline_page = page - 1
+            st.rerun()
+    with col3:
+        if st.button("Next ▶", disabled=not has_more, use_container_width=True):
+            st.session_state.timeline_page = page + 1
+            st.rerun()
+
+# Doctor Workload (caseload per doctor, kept current by delta)
+WORKLOAD_COLUMNS = {"active_patients": "Active Patients", "upcoming_appointments": "Upcoming Appts",
+                    "active_plans": "Active Plans", "billed": "Billed (₹)"}
+
+def doctor_workload():
+    """FUNCTION: This session's doctor workload model, built from the loaded collections on first use."""
+    if st.session_state.get('workload') is None:
+        with timed("workload.build"):
+            st.session_state.workload = DoctorWorkload({name: st.session_state[name] for name in WORKLOAD_SOURCES})
+    return st.session_state.workload
+
+def least_loaded_oncologist():
+    """FUNCTION: (doctor, workload row) of the oncologist with the lightest caseload, or None if there are none."""
+    oncologists = {d['doctor_id']: d for d in st.session_state.doctors if 'oncolog' in str(d.get('specialization', '')).lower()}
+    workload = doctor_workload()
+    doctor_id = workload.least_loaded(oncologists)
+    return None if doctor_id is None else (oncologists[doctor_id], workload.row(doctor_id))
+
 # Doctors page (same as before)
+@uses_collections("doctors", *WORKLOAD_SOURCES)
 def show_doctors():
     st.markdown('<h1 class="main-header">Doctor Management</h1>', unsafe_allow_html=True)
     
@@ -686,6 +1467,7 @@ def show_doctors():
             st.rerun()
     
     # Form Handler
+    @timed("form.doctor")
     def doctor_form_handler(edit_doctor=None):
         if edit_doctor:
             st.subheader(f"Edit Doctor: {edit_doctor['name']}")
@@ -713,16 +1495,17 @@ def show_doctors():
                     if edit_doctor:
                         doctor_index = next((i for i, d in enumerate(st.session_state.doctors) if d['doctor_id'] == edit_doctor['doctor_id']), -1)
                         if doctor_index != -1:
-                            st.session_state.doctors[doctor_index].update({"name": name, "degree": degree, "specialization": specialization, "contact": contact})
+                            before = dict(st.session_state.doctors[doctor_index])
+                            edit_record('doctors', st.session_state.doctors[doctor_index]).update({"name": name, "degree": degree, "specialization": specialization, "contact": contact})
+                            publish(DoctorUpdated(before=before, doctor=st.session_state.doctors[doctor_index]))
                             st.success(f"Doctor {name} updated successfully!")
                     else:
-                        new_id = max([d['doctor_id'] for d in st.session_state.doctors]) + 1 if st.session_state.doctors else 1
+                        new_id = next_id('doctors')
                         new_doctor = {"doctor_id": new_id, "name": name, "degree": degree, "specialization": specialization, "contact": contact}
                         st.session_state.doctors.append(new_doctor)
+                        publish(DoctorCreated(doctor=new_doctor)) # Subscribers persist the change
                         st.success(f"Doctor {name} added successfully!")
                         
-                    save_data_to_backend() # <--- NEW: Save to backend after doctor update/creation
-                        
                     st.session_state.show_doctor_form = False
                     st.session_state.edit_doctor_id = None
                     st.rerun()
@@ -738,10 +1521,15 @@ def show_doctors():
         doctor_form_handler(doctor_to_edit)
     else:
         st.markdown("---")
-        df = pd.DataFrame(st.session_state.doctors)
+        df = collection_frame('doctors')
         if not df.empty:
             display_df = df[['doctor_id', 'name', 'degree', 'specialization', 'contact']].copy()
             display_df.columns = ['ID', 'Name', 'Degree', 'Specialization', 'Contact']
+            workload = doctor_workload()
+            rows = [workload.row(doctor_id) for doctor_id in display_df['ID']]
+            for key, label in WORKLOAD_COLUMNS.items():
+                display_df[label] = [row[key] for row in rows]
+            display_df['Billed (₹)'] = display_df['Billed (₹)'].map(lambda amount: f"{amount:,.0f}")
             
             col_list = st.columns(len(display_df.columns) + 2)
             for i, col_name in enumerate(display_df.columns):
@@ -764,10 +1552,11 @@ def show_doctors():
                 if row_cols[-1].button("🗑️", key=f"delete_doctor_{row['ID']}"):
                     doctor_id_to_delete = row['ID']
                     if st.session_state.get(f'confirm_delete_doctor_{doctor_id_to_delete}', False):
+                        deleted_doctor = next(d for d in st.session_state.doctors if d['doctor_id'] == doctor_id_to_delete)
                         st.session_state.doctors = [d for d in st.session_state.doctors if d['doctor_id'] != doctor_id_to_delete]
+                        publish(DoctorDeleted(doctor=deleted_doctor))
                         st.success(f"Doctor {row['Name']} deleted successfully.")
                         st.session_state.pop(f'confirm_delete_doctor_{doctor_id_to_delete}')
-                        save_data_to_backend() # <--- NEW: Save to backend after deletion
                         st.rerun()
                     else:
                         st.session_state[f'confirm_delete_doctor_{doctor_id_to_delete}'] = True
@@ -776,6 +1565,7 @@ def show_doctors():
             st.info("No doctor records found.")
 
 # Rooms page (same as before)
+@uses_collections("rooms", "patients", "room_events")
 def show_rooms():
     st.markdown('<h1 class="main-header">Room Management</h1>', unsafe_allow_html=True)
     
@@ -787,6 +1577,7 @@ def show_rooms():
             st.rerun()
     
     # Form Handler
+    @timed("form.room")
     def room_form_handler(edit_room=None):
         if edit_room:
             st.subheader(f"Edit Room: {edit_room['room_id']}")
@@ -835,16 +1626,28 @@ def show_rooms():
                         "patient_id": patient_id if status == 'Occupied' else None, "cost_per_day": cost
                     }
                     
-                    if edit_room:
-                        room_index = next((i for i, r in enumerate(st.session_state.rooms) if r['room_id'] == edit_room['room_id']), -1)
-                        if room_index != -1:
-                            st.session_state.rooms[room_index].update(new_room)
-                            st.success(f"Room {room_id} updated successfully!")
-                    else:
-                        st.session_state.rooms.append(new_room)
-                        st.success(f"Room {room_id} added successfully!")
-
-                    save_data_to_backend() # <--- NEW: Save to backend after room update/creation
+                    old_patient_id = edit_room.get('patient_id') if edit_room and edit_room['occupancy_status'] == 'Occupied' else None
+                    
+                    with unit_of_work():
+                        if edit_room:
+                            room_index = next((i for i, r in enumerate(st.session_state.rooms) if r['room_id'] == edit_room['room_id']), -1)
+                            if room_index != -1:
+                                before = dict(st.session_state.rooms[room_index])
+                                edit_record('rooms', st.session_state.rooms[room_index]).update(new_room)
+                                new_room = st.session_state.rooms[room_index]
+                                publish(RoomUpdated(before=before, room=new_room))
+                                st.success(f"Room {room_id} updated successfully!")
+                        else:
+                            st.session_state.rooms.append(new_room)
+                            publish(RoomCreated(room=new_room))
+                            st.success(f"Room {room_id} added successfully!")
+
+                        # A manual change of occupant is a vacate followed by an (unbilled) assignment
+                        if old_patient_id != new_room['patient_id']:
+                            if old_patient_id is not None:
+                                publish(RoomVacated(room=new_room, patient_id=old_patient_id))
+                            if new_room['patient_id'] is not None:
+                                publish(RoomAssigned(room=new_room, patient_id=new_room['patient_id'], charge_room=False))
 
                     st.session_state.show_room_form = False
                     st.session_state.edit_room_id = None
@@ -861,9 +1664,9 @@ def show_rooms():
         room_form_handler(room_to_edit)
     else:
         st.markdown("---")
-        df = pd.DataFrame(st.session_state.rooms)
+        df = collection_frame('rooms')
         if not df.empty:
-            df['Patient'] = df['patient_id'].apply(lambda x: get_patient_name(x) if x else 'N/A')
+            df['Patient'] = df['patient_id'].apply(get_patient_name)
             df['Cost/Day'] = df['cost_per_day'].apply(lambda x: f"₹{x:,.0f}")
             display_df = df[['room_id', 'room_type', 'occupancy_status', 'Patient', 'Cost/Day']].copy()
             display_df.columns = ['Room ID', 'Type', 'Status', 'Patient', 'Cost/Day']
@@ -891,10 +1694,11 @@ def show_rooms():
                     if row['Status'] == 'Occupied':
                         st.error("Cannot delete an occupied room. Please discharge the patient first.")
                     elif st.session_state.get(f'confirm_delete_room_{room_id_to_delete}', False):
+                        deleted_room = next(r for r in st.session_state.rooms if r['room_id'] == room_id_to_delete)
                         st.session_state.rooms = [r for r in st.session_state.rooms if r['room_id'] != room_id_to_delete]
+                        publish(RoomDeleted(room=deleted_room))
                         st.success(f"Room {room_id_to_delete} deleted successfully.")
                         st.session_state.pop(f'confirm_delete_room_{room_id_to_delete}')
-                        save_data_to_backend() # <--- NEW: Save to backend after deletion
                         st.rerun()
                     else:
                         st.session_state[f'confirm_delete_room_{room_id_to_delete}'] = True
@@ -902,6 +1706,30 @@ def show_rooms():
         else:
             st.info("No room records found.")
 
+        # Room state check: occupants must agree with patient status and the occupancy log
+        st.markdown("---")
+        st.subheader("Room State Check")
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            # The widget's own state is dropped on runs that don't render it: the preference lives in its own key
+            st.toggle("Fix room state automatically after each change", key="room_autofix",
+                      value=st.session_state.get('room_autofix_enabled', True), on_change=remember_room_autofix)
+        with col2:
+            if st.button("🧭 Check All Rooms", use_container_width=True):
+                st.session_state.room_issues = check_room_state()
+        room_issues = st.session_state.get('room_issues', [])
+        with col3:
+            if room_issues and st.button(f"🛠️ Fix {len(room_issues)} Issue(s)", use_container_width=True):
+                with unit_of_work(): # Fixes are room events: logged, audited and saved once
+                    fix_room_issues(room_issues)
+                st.session_state.room_issues = check_room_state()
+                st.toast("Room state reconciled.", icon='🧭')
+                st.rerun()
+        if room_issues:
+            st.dataframe(pd.DataFrame([issue.row() for issue in room_issues]), use_container_width=True, hide_index=True)
+        elif 'room_issues' in st.session_state:
+            st.success("Every room agrees with its patient and the occupancy log.")
+
 # Function to generate the patient summary table
 def generate_patient_summary(df_filtered, patient_name):
     st.subheader(f"Account Summary for {patient_name}")
@@ -930,6 +1758,7 @@ def generate_patient_summary(df_filtered, patient_name):
     st.dataframe(df_summary, use_container_width=True, hide_index=True)
 
 # Billing page
+@uses_collections("billing", "patients")
 def show_billing():
     st.markdown('<h1 class="main-header">Billing & Payments</h1>', unsafe_allow_html=True)
     
@@ -951,19 +1780,18 @@ def show_billing():
     display_options = ['All Bills (All Patients)'] + patient_names
     selected_name = st.selectbox("Select Patient for Account Statement", display_options, index=0)
     
-    if selected_name == 'All Bills (All Patients)':
-        filtered_bills = st.session_state.billing
-    else:
+    df_bills = collection_frame('billing')
+    if selected_name != 'All Bills (All Patients)':
         selected_id = patient_selection_map[selected_name]
-        filtered_bills = [b for b in st.session_state.billing if b['patient_id'] == selected_id]
+        df_bills = df_bills[df_bills['patient_id'] == selected_id] if not df_bills.empty else df_bills
         
         # Display Patient Summary Metrics
-        df_filtered = pd.DataFrame(filtered_bills)
-        generate_patient_summary(df_filtered, selected_name)
+        generate_patient_summary(df_bills, selected_name)
         st.markdown("---")
         st.subheader(f"Detailed Transactions for {selected_name}")
 
     # Form Handler (same as before)
+    @timed("form.billing")
     def billing_form_handler(edit_bill=None):
         if edit_bill:
             st.subheader(f"Edit Bill: {edit_bill['bill_id']}")
@@ -998,16 +1826,17 @@ def show_billing():
                     if edit_bill:
                         bill_index = next((i for i, b in enumerate(st.session_state.billing) if b['bill_id'] == edit_bill['bill_id']), -1)
                         if bill_index != -1:
-                            st.session_state.billing[bill_index].update(new_bill)
+                            old_bill = dict(st.session_state.billing[bill_index])
+                            edit_record('billing', st.session_state.billing[bill_index]).update(new_bill)
+                            publish(BillUpdated(before=old_bill, bill=st.session_state.billing[bill_index]))
                             st.success("Bill updated successfully!")
                     else:
-                        new_id = max([b['bill_id'] for b in st.session_state.billing]) + 1 if st.session_state.billing else 1
+                        new_id = next_id('billing')
                         new_bill['bill_id'] = new_id
                         st.session_state.billing.append(new_bill)
+                        publish(BillCreated(bill=new_bill))
                         st.success("Bill added successfully!")
 
-                    save_data_to_backend() # <--- NEW: Save to backend after billing update/creation
-
                     st.session_state.show_billing_form = False
                     st.session_state.edit_bill_id = None
                     st.rerun()
@@ -1023,48 +1852,53 @@ def show_billing():
         billing_form_handler(bill_to_edit)
     else:
         # Display the filtered/all bills
-        df = pd.DataFrame(filtered_bills).sort_values(by='date', ascending=False)
+        df = df_bills
         if not df.empty:
+            df = df.sort_values(by='date', ascending=False)
             df['Patient'] = df['patient_id'].apply(get_patient_name)
             df['Amount'] = df['amount'].apply(lambda x: f"₹{x:,.2f}")
             display_df = df[['bill_id', 'Patient', 'description', 'Amount', 'status', 'date']].copy()
             display_df.columns = ['Bill ID', 'Patient', 'Description', 'Amount', 'Status', 'Date']
             
-            # Table display and CRUD buttons
-            col_list = st.columns(len(display_df.columns) + 2)
-            for i, col_name in enumerate(display_df.columns):
-                col_list[i].write(f"**{col_name}**")
-            col_list[-2].write("**Edit**")
-            col_list[-1].write("**Delete**")
-
-            for i, row in display_df.iterrows():
-                row_cols = st.columns(len(display_df.columns) + 2)
-                for j, col_name in enumerate(display_df.columns):
-                    row_cols[j].write(row[col_name])
-
-                # Edit Button (Accessing the correct key: 'Bill ID')
-                if row_cols[-2].button("✏️", key=f"edit_bill_{row['Bill ID']}"):
-                    st.session_state.edit_bill_id = row['Bill ID']
-                    st.session_state.show_billing_form = True
-                    st.rerun()
-                
-                # Delete Button (Accessing the correct key: 'Bill ID')
-                if row_cols[-1].button("🗑️", key=f"delete_bill_{row['Bill ID']}"):
-                    bill_id_to_delete = row['Bill ID'] # Use the correct column name
-                    if st.session_state.get(f'confirm_delete_bill_{bill_id_to_delete}', False):
-                        st.session_state.billing = [b for b in st.session_state.billing if b['bill_id'] != bill_id_to_delete]
-                        st.success(f"Bill {bill_id_to_delete} deleted successfully.")
-                        st.session_state.pop(f'confirm_delete_bill_{bill_id_to_delete}')
-                        save_data_to_backend() # <--- NEW: Save to backend after deletion
+            if not show_bulk_actions('billing', display_df, 'Bill ID'):
+                # Table display and CRUD buttons
+                col_list = st.columns(len(display_df.columns) + 2)
+                for i, col_name in enumerate(display_df.columns):
+                    col_list[i].write(f"**{col_name}**")
+                col_list[-2].write("**Edit**")
+                col_list[-1].write("**Delete**")
+
+                for i, row in display_df.iterrows():
+                    row_cols = st.columns(len(display_df.columns) + 2)
+                    for j, col_name in enumerate(display_df.columns):
+                        row_cols[j].write(row[col_name])
+
+                    # Edit Button (Accessing the correct key: 'Bill ID')
+                    if row_cols[-2].button("✏️", key=f"edit_bill_{row['Bill ID']}"):
+                        st.session_state.edit_bill_id = row['Bill ID']
+                        st.session_state.show_billing_form = True
                         st.rerun()
-                    else:
-                        st.session_state[f'confirm_delete_bill_{bill_id_to_delete}'] = True
-                        st.warning(f"Click Delete again to confirm deleting **Bill {bill_id_to_delete}**.")
+                
+                    # Delete Button (Accessing the correct key: 'Bill ID')
+                    if row_cols[-1].button("🗑️", key=f"delete_bill_{row['Bill ID']}"):
+                        bill_id_to_delete = row['Bill ID'] # Use the correct column name
+                        if st.session_state.get(f'confirm_delete_bill_{bill_id_to_delete}', False):
+                            bill_to_delete = next((b for b in st.session_state.billing if b['bill_id'] == bill_id_to_delete), None)
+                            st.session_state.billing = [b for b in st.session_state.billing if b['bill_id'] != bill_id_to_delete]
+                            if bill_to_delete:
+                                publish(BillDeleted(bill=bill_to_delete))
+                            st.success(f"Bill {bill_id_to_delete} deleted successfully.")
+                            st.session_state.pop(f'confirm_delete_bill_{bill_id_to_delete}')
+                            st.rerun()
+                        else:
+                            st.session_state[f'confirm_delete_bill_{bill_id_to_delete}'] = True
+                            st.warning(f"Click Delete again to confirm deleting **Bill {bill_id_to_delete}**.")
         else:
             if selected_name == 'All Bills (All Patients)':
                 st.info(f"No billing records found.")
 
 # Reports page (same as before)
+@uses_collections("patients", "doctors", "rooms", "appointments", "treatment_plans", "billing", "room_events")
 def show_reports():
     st.markdown('<h1 class="main-header">Reports & Analytics</h1>', unsafe_allow_html=True)
     
@@ -1076,7 +1910,7 @@ def show_reports():
         st.metric("Total Doctors", len(st.session_state.doctors))
     
     with col3:
-        total_revenue = sum(b['amount'] for b in st.session_state.billing if b['status'] == 'Paid')
+        total_revenue = st.session_state.receivables.totals()['paid']
         st.metric("Total Revenue", f"₹{total_revenue:,.0f}")
     
     with col4:
@@ -1088,28 +1922,25 @@ def show_reports():
     col1, col2 = st.columns(2)
     
     with col1:
-        st.subheader("Monthly Patient Admissions")
-        df_patients = pd.DataFrame(st.session_state.patients)
-        
-        if not df_patients.empty:
-            df_patients['admission_date'] = df_patients['admission_date'].astype(str)
-            df_patients['admission_date'] = pd.to_datetime(df_patients['admission_date'], errors='coerce')
-            df_patients.dropna(subset=['admission_date'], inplace=True)
-            df_patients['month_year'] = df_patients['admission_date'].dt.strftime('%Y-%m')
-            df_patients['month_label'] = df_patients['admission_date'].dt.strftime('%b %Y')
-            monthly_counts = df_patients.groupby(['month_year', 'month_label']).size().reset_index(name='count')
-            monthly_counts = monthly_counts.sort_values('month_year')
-
-            fig = px.bar(monthly_counts, x='month_label', y='count', color='count', 
+        st.subheader("Patient Admissions")
+        admissions_level = st.selectbox("Aggregation", LEVEL_CHOICES, key="admissions_level")
+        def build_admissions_chart():
+            counts, level, downsampled = admissions_series(admissions_level)
+            if counts.empty:
+                return None
+            fig = px.bar(counts, x='admission_date', y='count', color='count', 
                           color_discrete_sequence=[PRIMARY_COLOR]) # Use NEW color
-            fig.update_layout(xaxis_title="Month", yaxis_title="Admissions", showlegend=False)
+            fig.update_layout(xaxis_title=f"{LEVEL_AXIS[level]}{' (downsampled)' if downsampled else ''}",
+                              yaxis_title="Admissions", showlegend=False)
+            return fig
+        fig = cached_figure("reports_admissions", ("patients",), (admissions_level,), build_admissions_chart)
+        if fig is not None:
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No admissions data to display.")
 
     with col2:
         st.subheader("Revenue by Department (Simulated)")
-        total_revenue = sum(b['amount'] for b in st.session_state.billing if b['status'] == 'Paid')
         revenue_data = {
             'Oncology': total_revenue * 0.4,
             'Pediatrics': total_revenue * 0.25,
@@ -1117,11 +1948,198 @@ def show_reports():
             'Surgery': total_revenue * 0.12,
             'Pathology': total_revenue * 0.08
         }
-        fig = px.pie(values=list(revenue_data.values()), names=list(revenue_data.keys()),
-                     color_discrete_sequence=px.colors.sequential.Teal) # Use NEW color
+        fig = cached_figure("reports_revenue_by_department", (), tuple(revenue_data.items()),
+                            lambda: px.pie(values=list(revenue_data.values()), names=list(revenue_data.keys()),
+                                           color_discrete_sequence=px.colors.sequential.Teal)) # Use NEW color
         st.plotly_chart(fig, use_container_width=True)
 
+    st.markdown("---")
+
+    # --- Accounts Receivable (served from the incremental rollups, never rescans the billing list) ---
+    st.subheader("Accounts Receivable")
+    ledger = st.session_state.receivables
+    totals = ledger.totals()
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Billed", f"₹{totals['billed']:,.0f}")
+    with col2:
+        st.metric("Total Paid", f"₹{totals['paid']:,.0f}")
+    with col3:
+        st.metric("Total Outstanding", f"₹{totals['outstanding']:,.0f}")
+
+    col1, col2 = st.columns([2, 1])
+
+    with col1:
+        granularity = st.radio("Trend Granularity", LEVEL_CHOICES, horizontal=True, key="ar_granularity")
+        def build_receivables_chart():
+            series = ledger.daily_series()
+            if not series:
+                return None
+            df_daily = pd.DataFrame([
+                {'Period': period, 'Billed': row['billed'], 'Paid': row['paid'], 'Outstanding': row['outstanding']}
+                for period, row in series
+            ])
+            df_trend, level, downsampled = prepare_series(df_daily, 'Period', ['Billed', 'Paid', 'Outstanding'],
+                                                          level=granularity, max_buckets=TREND_BUCKETS)
+            df_trend = df_trend.melt(id_vars='Period', var_name='Metric', value_name='Amount')
+            fig = px.line(df_trend, x='Period', y='Amount', color='Metric', markers=True,
+                          color_discrete_sequence=[ACCENT_COLOR, PRIMARY_COLOR, '#ff6b6b'])
+            fig.update_layout(xaxis_title=f"{LEVEL_AXIS[level]}{' (downsampled)' if downsampled else ''}", yaxis_title="Amount (₹)")
+            return fig
+        fig = cached_figure("reports_receivables_trend", ("billing",), (granularity,), build_receivables_chart)
+        if fig is not None:
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("No billing data to display.")
+
+    with col2:
+        st.markdown("**Aging of Unpaid Bills (days)**")
+        def build_aging_chart():
+            aging = ledger.aging()
+            fig = px.bar(x=list(aging.keys()), y=list(aging.values()),
+                         color_discrete_sequence=[PRIMARY_COLOR])
+            fig.update_layout(xaxis_title="Days Outstanding", yaxis_title="Amount (₹)", showlegend=False)
+            return fig
+        fig = cached_figure("reports_aging", ("billing",), (datetime.now().date(),), build_aging_chart)
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.markdown("---")
+
+    # --- Room Utilisation (replayed from the append-only occupancy event log) ---
+    st.subheader("Room Utilisation")
+    today = datetime.now().date()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        util_start = st.date_input("From", today - timedelta(days=30), key="util_start")
+    with col2:
+        util_end = st.date_input("To", today, key="util_end")
+    with col3:
+        room_types = sorted({r['room_type'] for r in st.session_state.rooms})
+        util_type = st.selectbox("Room Type", ["All Room Types"] + room_types, key="util_type")
+
+    if util_start > util_end:
+        st.warning("'From' date must be on or before the 'To' date.")
+    else:
+        report = utilisation_report(st.session_state.room_events, st.session_state.rooms, util_start, util_end)
+        total_rooms = len(st.session_state.rooms)
+        overall_rate = report['bed_days'] / (total_rooms * report['window_days']) if total_rooms else 0.0
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Bed-Days", f"{report['bed_days']:,.1f}")
+        with col2:
+            st.metric("Occupancy Rate", f"{overall_rate:.0%}")
+        with col3:
+            st.metric("Peak Concurrent Occupancy", report['peak_concurrent'], f"of {total_rooms} rooms", delta_color="off")
+
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            df_util = pd.DataFrame(report['by_room_type'])
+            if not df_util.empty:
+                df_util['occupancy_rate'] = df_util['occupancy_rate'].apply(lambda x: f"{x:.0%}")
+                df_util.columns = ['Room Type', 'Rooms', 'Bed-Days', 'Occupancy Rate', 'Peak Concurrent']
+                st.dataframe(df_util, use_container_width=True, hide_index=True)
+        with col2:
+            selected_type = None if util_type == "All Room Types" else util_type
+            capacity = sum(1 for r in st.session_state.rooms if selected_type in (None, r['room_type']))
+            util_level = st.selectbox("Aggregation", LEVEL_CHOICES, key="util_level")
+            def build_occupancy_chart():
+                series = daily_occupancy(st.session_state.room_events, st.session_state.rooms, util_start, util_end, selected_type)
+                if not series or not capacity:
+                    return None
+                df_daily = pd.DataFrame(series, columns=['Date', 'Occupied Beds'])
+                df_daily['Occupancy Rate'] = df_daily['Occupied Beds'] / capacity
+                df_daily, level, downsampled = prepare_series(df_daily, 'Date', ['Occupancy Rate'], level=util_level, how="mean",
+                                                              max_buckets=OCCUPANCY_BUCKETS, start=util_start, end=util_end)
+                fig = px.line(df_daily, x='Date', y='Occupancy Rate', color_discrete_sequence=[PRIMARY_COLOR])
+                fig.update_layout(xaxis_title=f"{LEVEL_AXIS[level]}{' (downsampled)' if downsampled else ''}",
+                                  yaxis_tickformat='.0%', yaxis_range=[0, 1.05], showlegend=False)
+                return fig
+            fig = cached_figure("reports_daily_occupancy", ("room_events", "rooms"), (util_start, util_end, selected_type, util_level),
+                                build_occupancy_chart)
+            if fig is not None:
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No occupancy data to display.")
+
+    st.markdown("---")
+
+    # --- Doctor Workload (served from the incremental workload model) ---
+    st.subheader("Doctor Workload")
+    workload = doctor_workload()
+    df_workload = pd.DataFrame([{"Doctor": d['name'], "Specialization": d.get('specialization', ''), **workload.row(d['doctor_id'])}
+                                for d in st.session_state.doctors])
+    if not df_workload.empty:
+        col1, col2 = st.columns([3, 2])
+        with col1:
+            def build_workload_chart():
+                df_chart = df_workload.melt(id_vars='Doctor', value_vars=['active_patients', 'upcoming_appointments', 'active_plans'],
+                                            var_name='Measure', value_name='Count')
+                df_chart['Measure'] = df_chart['Measure'].map(WORKLOAD_COLUMNS)
+                fig = px.bar(df_chart, x='Doctor', y='Count', color='Measure', barmode='group',
+                             color_discrete_sequence=[PRIMARY_COLOR, ACCENT_COLOR, '#00695c'])
+                fig.update_layout(xaxis_title="Doctor", yaxis_title="Caseload")
+                return fig
+            fig = cached_figure("reports_doctor_workload", ("doctors",) + WORKLOAD_SOURCES, (datetime.now().date(),),
+                                build_workload_chart)
+            st.plotly_chart(fig, use_container_width=True)
+        with col2:
+            display_df = df_workload.sort_values('billed', ascending=False).rename(columns=WORKLOAD_COLUMNS)
+            st.dataframe(display_df, use_container_width=True, hide_index=True)
+    else:
+        st.info("No doctor records found.")
+
+    st.markdown("---")
+
+    # --- Length of Stay & Readmissions (vectorised, cached per data version) ---
+    st.subheader("Length of Stay & Readmissions")
+    st.caption("Still-admitted patients are right-censored: they are excluded from the completed-stay mean/median "
+               "and counted as censored observations in the Kaplan-Meier median.")
+    stay_frame = cached_by_version('stay_frame', lambda: build_stay_frame(st.session_state.patients))
+    overall = cached_by_version('stay_overall', lambda: overall_summary(stay_frame))
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Avg LOS (completed)", f"{overall['mean_los']:.1f} days" if overall['mean_los'] is not None else "N/A")
+    with col2:
+        st.metric("Median LOS (KM)", f"{overall['km_median_los']:.1f} days" if overall['km_median_los'] is not None else "Not reached")
+    with col3:
+        st.metric("Still Admitted", overall['still_admitted'], f"of {overall['stays']} stays", delta_color="off")
+    with col4:
+        st.metric("Readmissions", overall['readmissions'], f"{overall['readmit_30d']} within 30 days", delta_color="off")
+
+    los_by = st.radio("Group Length of Stay by", list(GROUPINGS), horizontal=True, key="los_group_by")
+    df_los = cached_by_version(f'stay_summary_{los_by}', lambda: stay_summary(stay_frame, los_by))
+    if not df_los.empty:
+        df_los = df_los.copy()
+        group_col = df_los.columns[0]
+        if los_by == 'Doctor':
+            df_los[group_col] = df_los[group_col].apply(get_doctor_name)
+        df_los[group_col] = df_los[group_col].astype(str)
+
+        col1, col2 = st.columns([1, 1])
+        with col1:
+            def build_los_chart():
+                df_chart = df_los.melt(id_vars=group_col, value_vars=['mean_los', 'median_los', 'km_median_los'],
+                                       var_name='Statistic', value_name='Days')
+                df_chart['Statistic'] = df_chart['Statistic'].map({'mean_los': 'Mean (completed)', 'median_los': 'Median (completed)',
+                                                                   'km_median_los': 'Median (KM)'})
+                fig = px.bar(df_chart, x=group_col, y='Days', color='Statistic', barmode='group',
+                             color_discrete_sequence=[ACCENT_COLOR, PRIMARY_COLOR, '#00695c'])
+                fig.update_layout(xaxis_title=los_by, yaxis_title="Length of Stay (days)")
+                return fig
+            fig = cached_figure("reports_length_of_stay", ("patients", "doctors"), (los_by, datetime.now().date()), build_los_chart)
+            st.plotly_chart(fig, use_container_width=True)
+        with col2:
+            display_df = df_los.round(1)
+            display_df.columns = [los_by, 'Stays', 'Still Admitted', 'Mean LOS', 'Median LOS', 'KM Median LOS', 'Readmissions', 'Readmit ≤30d']
+            st.dataframe(display_df, use_container_width=True, hide_index=True)
+    else:
+        st.info("No admissions data to display.")
+
 # Appointments page (FIXED: Added $1000 fee and auto-nav)
+@uses_collections("appointments", "patients", "doctors", "billing")
 def show_appointments():
     st.markdown('<h1 class="main-header">Appointments</h1>', unsafe_allow_html=True)
     
@@ -1133,6 +2151,7 @@ def show_appointments():
             st.rerun()
     
     # Form Handler
+    @timed("form.appointment")
     def appointment_form_handler(edit_appointment=None):
         if edit_appointment:
             st.subheader(f"Edit Appointment: {edit_appointment['reason']} on {edit_appointment['date']}")
@@ -1171,22 +2190,16 @@ def show_appointments():
                     if edit_appointment:
                         app_index = next((i for i, a in enumerate(st.session_state.appointments) if a['appointment_id'] == edit_appointment['appointment_id']), -1)
                         if app_index != -1:
-                            st.session_state.appointments[app_index].update(new_appointment)
+                            before = dict(st.session_state.appointments[app_index])
+                            edit_record('appointments', st.session_state.appointments[app_index]).update(new_appointment)
+                            publish(AppointmentUpdated(before=before, appointment=st.session_state.appointments[app_index]))
                             st.success("Appointment updated successfully!")
                     else:
-                        new_id = max([a['appointment_id'] for a in st.session_state.appointments]) + 1 if st.session_state.appointments else 1
+                        new_id = next_id('appointments')
                         new_appointment['appointment_id'] = new_id
                         st.session_state.appointments.append(new_appointment)
+                        publish(AppointmentScheduled(appointment=new_appointment)) # Billing rule adds the appointment fee
                         st.success("Appointment scheduled successfully!")
-                        
-                        # NEW: AUTO-BILLING for Appointment
-                        appointment_fee = 1000.00
-                        add_auto_bill_entry(patient_id, "Appointment Fee", appointment_fee, 
-                                            datetime.now().strftime("%Y-%m-%d"), 
-                                            f"Consultation with {get_doctor_name(doctor_id)}")
-                        st.session_state.menu = "Billing" # <--- Automated Navigation
-
-                    save_data_to_backend() # <--- NEW: Save to backend after appointment update/creation
 
                     st.session_state.show_appointment_form = False
                     st.session_state.edit_appointment_id = None
@@ -1203,46 +2216,77 @@ def show_appointments():
         appointment_form_handler(appointment_to_edit)
     else:
         st.markdown("---")
-        df = pd.DataFrame(st.session_state.appointments)
+        df = collection_frame('appointments')
         if not df.empty:
             df['Patient'] = df['patient_id'].apply(get_patient_name)
             df['Doctor'] = df['doctor_id'].apply(get_doctor_name)
             display_df = df[['appointment_id', 'date', 'time', 'reason', 'Doctor', 'Patient']].copy()
             display_df.columns = ['ID', 'Date', 'Time', 'Reason', 'Doctor', 'Patient']
             
-            col_list = st.columns(len(display_df.columns) + 2)
-            for i, col_name in enumerate(display_df.columns):
-                col_list[i].write(f"**{col_name}**")
-            col_list[-2].write("**Edit**")
-            col_list[-1].write("**Delete**")
-
-            for i, row in display_df.iterrows():
-                row_cols = st.columns(len(display_df.columns) + 2)
-                for j, col_name in enumerate(display_df.columns):
-                    row_cols[j].write(row[col_name])
-
-                # Edit Button (Accessing the correct key: 'ID')
-                if row_cols[-2].button("✏️", key=f"edit_appointment_{row['ID']}"):
-                    st.session_state.edit_appointment_id = row['ID']
-                    st.session_state.show_appointment_form = True
-                    st.rerun()
-                
-                # Delete Button (Accessing the correct key: 'ID')
-                if row_cols[-1].button("🗑️", key=f"delete_appointment_{row['ID']}"):
-                    appointment_id_to_delete = row['ID']
-                    if st.session_state.get(f'confirm_delete_appointment_{appointment_id_to_delete}', False):
-                        st.session_state.appointments = [a for a in st.session_state.appointments if a['appointment_id'] != appointment_id_to_delete]
-                        st.success(f"Appointment {appointment_id_to_delete} deleted successfully.")
-                        st.session_state.pop(f'confirm_delete_appointment_{appointment_id_to_delete}')
-                        save_data_to_backend() # <--- NEW: Save to backend after deletion
+            if not show_bulk_actions('appointments', display_df, 'ID'):
+                col_list = st.columns(len(display_df.columns) + 2)
+                for i, col_name in enumerate(display_df.columns):
+                    col_list[i].write(f"**{col_name}**")
+                col_list[-2].write("**Edit**")
+                col_list[-1].write("**Delete**")
+
+                for i, row in display_df.iterrows():
+                    row_cols = st.columns(len(display_df.columns) + 2)
+                    for j, col_name in enumerate(display_df.columns):
+                        row_cols[j].write(row[col_name])
+
+                    # Edit Button (Accessing the correct key: 'ID')
+                    if row_cols[-2].button("✏️", key=f"edit_appointment_{row['ID']}"):
+                        st.session_state.edit_appointment_id = row['ID']
+                        st.session_state.show_appointment_form = True
                         st.rerun()
-                    else:
-                        st.session_state[f'confirm_delete_appointment_{appointment_id_to_delete}'] = True
-                        st.warning(f"Click Delete again to confirm deleting **Appointment {row['ID']}**.")
+                
+                    # Delete Button (Accessing the correct key: 'ID')
+                    if row_cols[-1].button("🗑️", key=f"delete_appointment_{row['ID']}"):
+                        appointment_id_to_delete = row['ID']
+                        if st.session_state.get(f'confirm_delete_appointment_{appointment_id_to_delete}', False):
+                            deleted_appointment = next(a for a in st.session_state.appointments if a['appointment_id'] == appointment_id_to_delete)
+                            st.session_state.appointments = [a for a in st.session_state.appointments if a['appointment_id'] != appointment_id_to_delete]
+                            publish(AppointmentDeleted(appointment=deleted_appointment))
+                            st.success(f"Appointment {appointment_id_to_delete} deleted successfully.")
+                            st.session_state.pop(f'confirm_delete_appointment_{appointment_id_to_delete}')
+                            st.rerun()
+                        else:
+                            st.session_state[f'confirm_delete_appointment_{appointment_id_to_delete}'] = True
+                            st.warning(f"Click Delete again to confirm deleting **Appointment {row['ID']}**.")
         else:
             st.info("No appointment records found.")
 
+# Treatment plan windows (interval index: active-on-date, overlap and ending-within queries)
+PLAN_WINDOW_FILTERS = ["All plans", "Active on date", "Overlapping range", "Ending within"]
+
+def plan_interval_index():
+    """FUNCTION: This session's interval index over treatment-plan windows, built on first use."""
+    if st.session_state.get('plan_intervals') is None:
+        with timed("plan_intervals.build"):
+            st.session_state.plan_intervals = PlanIntervalIndex(st.session_state.treatment_plans)
+    return st.session_state.plan_intervals
+
+def plan_window_filter():
+    """FUNCTION: Renders the plan window filter; returns the matching plan ids, or None for all plans."""
+    today = datetime.now().date()
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        mode = st.selectbox("Show", PLAN_WINDOW_FILTERS, key="plan_window_filter")
+    if mode == "All plans":
+        return None
+    index = plan_interval_index()
+    with col2:
+        if mode == "Active on date":
+            return set(index.active_on(st.date_input("Active on", today, key="plan_window_date")))
+        window = st.date_input("Between", (today, today + timedelta(days=7)), key="plan_window_range")
+    if len(window) != 2:
+        return set() # Still picking the end of the range
+    query = index.overlapping if mode == "Overlapping range" else index.ending_within
+    return set(query(*window))
+
 # Treatment Plans page (FIXED: KeyError)
+@uses_collections("treatment_plans", "patients", "doctors", "diagnosis", "billing")
 def show_treatment():
     st.markdown('<h1 class="main-header">Treatment Plans</h1>', unsafe_allow_html=True)
     
@@ -1254,6 +2298,7 @@ def show_treatment():
             st.rerun()
 
     # Form Handler
+    @timed("form.treatment")
     def treatment_form_handler(edit_plan=None):
         if edit_plan:
             st.subheader(f"Edit Treatment Plan: {edit_plan['plan_id']}")
@@ -1297,18 +2342,15 @@ def show_treatment():
                     if edit_plan:
                         plan_index = next((i for i, t in enumerate(st.session_state.treatment_plans) if t['plan_id'] == edit_plan['plan_id']), -1)
                         if plan_index != -1:
-                            st.session_state.treatment_plans[plan_index].update(new_plan)
+                            before = dict(st.session_state.treatment_plans[plan_index])
+                            edit_record('treatment_plans', st.session_state.treatment_plans[plan_index]).update(new_plan)
+                            publish(TreatmentPlanUpdated(before=before, plan=st.session_state.treatment_plans[plan_index]))
                             st.success("Treatment plan updated successfully!")
                     else:
-                        new_id = max([t['plan_id'] for t in st.session_state.treatment_plans]) + 1 if st.session_state.treatment_plans else 1
+                        new_id = next_id('treatment_plans')
                         new_plan['plan_id'] = new_id
                         st.session_state.treatment_plans.append(new_plan)
-                        
-                        # AUTO-BILLING
-                        add_auto_bill_entry(patient_id, "Treatment Plan", 10000.00, datetime.now().strftime("%Y-%m-%d"), details.split('\n')[0])
-                        st.session_state.menu = "Billing" # <--- Automated Navigation
-                        
-                    save_data_to_backend() # <--- NEW: Save to backend after plan update/creation
+                        publish(TreatmentPlanCreated(plan=new_plan)) # Billing rule adds the plan charge
                         
                     st.session_state.show_treatment_form = False
                     st.session_state.edit_plan_id = None
@@ -1325,7 +2367,11 @@ def show_treatment():
         treatment_form_handler(plan_to_edit)
     else:
         st.markdown("---")
-        df = pd.DataFrame(st.session_state.treatment_plans)
+        plan_ids = plan_window_filter()
+        df = collection_frame('treatment_plans')
+        if plan_ids is not None and not df.empty:
+            df = df[df['plan_id'].isin(plan_ids)]
+            st.caption(f"{len(df)} of {len(st.session_state.treatment_plans)} plans")
         if not df.empty:
             df['Patient'] = df['patient_id'].apply(get_patient_name)
             df['Doctor'] = df['doctor_id'].apply(get_doctor_name)
@@ -1333,39 +2379,44 @@ def show_treatment():
             # Renamed 'plan_id' to 'Plan ID'
             display_df.columns = ['Plan ID', 'Patient', 'Doctor', 'Start Date', 'End Date', 'Details']
             
-            col_list = st.columns(len(display_df.columns) + 2)
-            for i, col_name in enumerate(display_df.columns):
-                col_list[i].write(f"**{col_name}**")
-            col_list[-2].write("**Edit**")
-            col_list[-1].write("**Delete**")
-
-            for i, row in display_df.iterrows():
-                row_cols = st.columns(len(display_df.columns) + 2)
-                for j, col_name in enumerate(display_df.columns):
-                    row_cols[j].write(row[col_name])
-
-                # FIX APPLIED HERE: Accessing 'Plan ID'
-                if row_cols[-2].button("✏️", key=f"edit_plan_{row['Plan ID']}"):
-                    st.session_state.edit_plan_id = row['Plan ID']
-                    st.session_state.show_treatment_form = True
-                    st.rerun()
-                
-                # FIX APPLIED HERE: Accessing 'Plan ID'
-                if row_cols[-1].button("🗑️", key=f"delete_plan_{row['Plan ID']}"):
-                    plan_id_to_delete = row['Plan ID']
-                    if st.session_state.get(f'confirm_delete_plan_{plan_id_to_delete}', False):
-                        st.session_state.treatment_plans = [t for t in st.session_state.treatment_plans if t['plan_id'] != plan_id_to_delete]
-                        st.success(f"Treatment Plan {plan_id_to_delete} deleted successfully.")
-                        st.session_state.pop(f'confirm_delete_plan_{plan_id_to_delete}')
-                        save_data_to_backend() # <--- NEW: Save to backend after deletion
+            if not show_bulk_actions('treatment_plans', display_df, 'Plan ID'):
+                col_list = st.columns(len(display_df.columns) + 2)
+                for i, col_name in enumerate(display_df.columns):
+                    col_list[i].write(f"**{col_name}**")
+                col_list[-2].write("**Edit**")
+                col_list[-1].write("**Delete**")
+
+                for i, row in display_df.iterrows():
+                    row_cols = st.columns(len(display_df.columns) + 2)
+                    for j, col_name in enumerate(display_df.columns):
+                        row_cols[j].write(row[col_name])
+
+                    # FIX APPLIED HERE: Accessing 'Plan ID'
+                    if row_cols[-2].button("✏️", key=f"edit_plan_{row['Plan ID']}"):
+                        st.session_state.edit_plan_id = row['Plan ID']
+                        st.session_state.show_treatment_form = True
                         st.rerun()
-                    else:
-                        st.session_state[f'confirm_delete_plan_{plan_id_to_delete}'] = True
-                        st.warning(f"Click Delete again to confirm deleting **Plan {plan_id_to_delete}**.")
+                
+                    # FIX APPLIED HERE: Accessing 'Plan ID'
+                    if row_cols[-1].button("🗑️", key=f"delete_plan_{row['Plan ID']}"):
+                        plan_id_to_delete = row['Plan ID']
+                        if st.session_state.get(f'confirm_delete_plan_{plan_id_to_delete}', False):
+                            deleted_plan = next(t for t in st.session_state.treatment_plans if t['plan_id'] == plan_id_to_delete)
+                            st.session_state.treatment_plans = [t for t in st.session_state.treatment_plans if t['plan_id'] != plan_id_to_delete]
+                            publish(TreatmentPlanDeleted(plan=deleted_plan))
+                            st.success(f"Treatment Plan {plan_id_to_delete} deleted successfully.")
+                            st.session_state.pop(f'confirm_delete_plan_{plan_id_to_delete}')
+                            st.rerun()
+                        else:
+                            st.session_state[f'confirm_delete_plan_{plan_id_to_delete}'] = True
+                            st.warning(f"Click Delete again to confirm deleting **Plan {plan_id_to_delete}**.")
+        elif plan_ids is not None and st.session_state.treatment_plans:
+            st.info("No treatment plans match this filter.")
         else:
             st.info("No treatment plan records found.")
 
 # Diagnosis page (same as before, uses auto-nav)
+@uses_collections("diagnosis", "patients", "billing")
 def show_diagnosis():
     st.markdown('<h1 class="main-header">Diagnosis Records</h1>', unsafe_allow_html=True)
     
@@ -1377,6 +2428,7 @@ def show_diagnosis():
             st.rerun()
 
     # Form Handler
+    @timed("form.diagnosis")
     def diagnosis_form_handler(edit_diagnosis=None):
         if edit_diagnosis:
             st.subheader(f"Edit Diagnosis: {edit_diagnosis['diagnosis_id']}")
@@ -1414,18 +2466,15 @@ def show_diagnosis():
                     if edit_diagnosis:
                         diag_index = next((i for i, d in enumerate(st.session_state.diagnosis) if d['diagnosis_id'] == edit_diagnosis['diagnosis_id']), -1)
                         if diag_index != -1:
-                            st.session_state.diagnosis[diag_index].update(new_diagnosis)
+                            before = dict(st.session_state.diagnosis[diag_index])
+                            edit_record('diagnosis', st.session_state.diagnosis[diag_index]).update(new_diagnosis)
+                            publish(DiagnosisUpdated(before=before, diagnosis=st.session_state.diagnosis[diag_index]))
                             st.success("Diagnosis record updated successfully!")
                     else:
-                        new_id = max([d['diagnosis_id'] for d in st.session_state.diagnosis]) + 1 if st.session_state.diagnosis else 1
+                        new_id = next_id('diagnosis')
                         new_diagnosis['diagnosis_id'] = new_id
                         st.session_state.diagnosis.append(new_diagnosis)
-                        
-                        # AUTO-BILLING (Simulated cost for diagnosis)
-                        add_auto_bill_entry(patient_id, "Diagnosis", 5000.00, datetime.now().strftime("%Y-%m-%d"), f"{disease_type} - {diagnosis_type}")
-                        st.session_state.menu = "Billing" # <--- Automated Navigation
-
-                    save_data_to_backend() # <--- NEW: Save to backend after diagnosis update/creation
+                        publish(DiagnosisRecorded(diagnosis=new_diagnosis)) # Billing rule adds the diagnosis charge
 
                     st.session_state.show_diagnosis_form = False
                     st.session_state.edit_diagnosis_id = None
@@ -1442,45 +2491,48 @@ def show_diagnosis():
         diagnosis_form_handler(diagnosis_to_edit)
     else:
         st.markdown("---")
-        df = pd.DataFrame(st.session_state.diagnosis)
+        df = collection_frame('diagnosis')
         if not df.empty:
             df['Patient'] = df['patient_id'].apply(get_patient_name)
             display_df = df[['diagnosis_id', 'Patient', 'diagnosis_type', 'disease_type', 'date', 'result']].copy()
             display_df.columns = ['ID', 'Patient', 'Type', 'Disease Type', 'Date', 'Result']
             
-            col_list = st.columns(len(display_df.columns) + 2)
-            for i, col_name in enumerate(display_df.columns):
-                col_list[i].write(f"**{col_name}**")
-            col_list[-2].write("**Edit**")
-            col_list[-1].write("**Delete**")
-
-            for i, row in display_df.iterrows():
-                row_cols = st.columns(len(display_df.columns) + 2)
-                for j, col_name in enumerate(display_df.columns):
-                    row_cols[j].write(row[col_name])
-
-                # Edit Button (Accessing the correct key: 'ID')
-                if row_cols[-2].button("✏️", key=f"edit_diagnosis_{row['ID']}"):
-                    st.session_state.edit_diagnosis_id = row['ID']
-                    st.session_state.show_diagnosis_form = True
-                    st.rerun()
-                
-                # Delete Button (Accessing the correct key: 'ID')
-                if row_cols[-1].button("🗑️", key=f"delete_diagnosis_{row['ID']}"):
-                    diagnosis_id_to_delete = row['ID']
-                    if st.session_state.get(f'confirm_delete_diagnosis_{diagnosis_id_to_delete}', False):
-                        st.session_state.diagnosis = [d for d in st.session_state.diagnosis if d['diagnosis_id'] != diagnosis_id_to_delete]
-                        st.success(f"Diagnosis Record {diagnosis_id_to_delete} deleted successfully.")
-                        st.session_state.pop(f'confirm_delete_diagnosis_{diagnosis_id_to_delete}')
-                        save_data_to_backend() # <--- NEW: Save to backend after deletion
+            if not show_bulk_actions('diagnosis', display_df, 'ID'):
+                col_list = st.columns(len(display_df.columns) + 2)
+                for i, col_name in enumerate(display_df.columns):
+                    col_list[i].write(f"**{col_name}**")
+                col_list[-2].write("**Edit**")
+                col_list[-1].write("**Delete**")
+
+                for i, row in display_df.iterrows():
+                    row_cols = st.columns(len(display_df.columns) + 2)
+                    for j, col_name in enumerate(display_df.columns):
+                        row_cols[j].write(row[col_name])
+
+                    # Edit Button (Accessing the correct key: 'ID')
+                    if row_cols[-2].button("✏️", key=f"edit_diagnosis_{row['ID']}"):
+                        st.session_state.edit_diagnosis_id = row['ID']
+                        st.session_state.show_diagnosis_form = True
                         st.rerun()
-                    else:
-                        st.session_state[f'confirm_delete_diagnosis_{diagnosis_id_to_delete}'] = True
-                        st.warning(f"Click Delete again to confirm deleting **Record {row['ID']}**.")
+                
+                    # Delete Button (Accessing the correct key: 'ID')
+                    if row_cols[-1].button("🗑️", key=f"delete_diagnosis_{row['ID']}"):
+                        diagnosis_id_to_delete = row['ID']
+                        if st.session_state.get(f'confirm_delete_diagnosis_{diagnosis_id_to_delete}', False):
+                            deleted_diagnosis = next(d for d in st.session_state.diagnosis if d['diagnosis_id'] == diagnosis_id_to_delete)
+                            st.session_state.diagnosis = [d for d in st.session_state.diagnosis if d['diagnosis_id'] != diagnosis_id_to_delete]
+                            publish(DiagnosisDeleted(diagnosis=deleted_diagnosis))
+                            st.success(f"Diagnosis Record {diagnosis_id_to_delete} deleted successfully.")
+                            st.session_state.pop(f'confirm_delete_diagnosis_{diagnosis_id_to_delete}')
+                            st.rerun()
+                        else:
+                            st.session_state[f'confirm_delete_diagnosis_{diagnosis_id_to_delete}'] = True
+                            st.warning(f"Click Delete again to confirm deleting **Record {row['ID']}**.")
         else:
             st.info("No diagnosis records found.")
 
 # Data Management (Procedure Only Demo)
+@uses_collections(*COLLECTIONS)
 def show_data_management():
     st.markdown('<h1 class="main-header">Data Management</h1>', unsafe_allow_html=True)
     
@@ -1499,7 +2551,7 @@ def show_data_management():
         
         if st.button("▶️ Execute Procedure (Updates Billing List)", key="run_proc_demo", use_container_width=True):
             # Trigger: Button Click
-            # PROCEDURE CALL (Side effect: changes st.session_state.billing, calls save_data_to_backend, and redirects)
+            # PROCEDURE CALL (Side effect: publishes BillCreated; the persistence subscriber saves)
             add_auto_bill_entry(demo_patient_id, "Admin Fee", admin_fee, datetime.now().strftime("%Y-%m-%d"), "Demonstration of a side-effect") 
             # Note: st.toast() inside add_auto_bill_entry will display the message
             st.session_state.menu = "Billing"
@@ -1530,11 +2582,14 @@ def show_data_management():
         
     with col_chart:
         # Reinstated Chart (Data Distribution)
-        fig = px.bar(df_metrics, x='Data Type', y='Count', 
-                     color='Data Type', 
-                     color_discrete_sequence=px.colors.sequential.Teal,
-                     title="Record Distribution Across the System")
-        fig.update_layout(xaxis_title="", yaxis_title="Total Count")
+        def build_distribution_chart():
+            fig = px.bar(df_metrics, x='Data Type', y='Count', 
+                         color='Data Type', 
+                         color_discrete_sequence=px.colors.sequential.Teal,
+                         title="Record Distribution Across the System")
+            fig.update_layout(xaxis_title="", yaxis_title="Total Count")
+            return fig
+        fig = cached_figure("data_distribution", (), tuple(data_counts.items()), build_distribution_chart)
         st.plotly_chart(fig, use_container_width=True)
 
     st.markdown("---")
@@ -1557,16 +2612,13 @@ def show_data_management():
     with col2:
         if st.button("🗑️ Clear All Data", use_container_width=True):
             if st.session_state.get('confirm_clear', False):
-                st.session_state.patients = []
-                st.session_state.doctors = []
-                st.session_state.rooms = []
-                st.session_state.appointments = []
-                st.session_state.treatment_plans = []
-                st.session_state.diagnosis = []
-                st.session_state.billing = []
+                backup_ward("before clear") # Restorable from Backups below
+                # Only the current ward's shard is cleared; doctors are shared with the other wards
+                for name in WARD_COLLECTIONS:
+                    st.session_state[name] = []
                 st.session_state.confirm_clear = False
-                save_data_to_backend() # <--- NEW: Save empty lists to backend after clearing
-                st.success("All data cleared!")
+                publish(DataReplaced(source="clear")) # Subscribers rebuild the ledger and save the empty lists
+                st.success(f"All {st.session_state.ward} data cleared!")
                 st.rerun()
             else:
                 st.session_state.confirm_clear = True
@@ -1574,16 +2626,7 @@ def show_data_management():
     
     with col3:
         # Export data
-        export_data = {
-            "patients": st.session_state.patients,
-            "doctors": st.session_state.doctors,
-            "rooms": st.session_state.rooms,
-            "appointments": st.session_state.appointments,
-            "treatment_plans": st.session_state.treatment_plans,
-            "diagnosis": st.session_state.diagnosis,
-            "billing": st.session_state.billing,
-            "exportDate": datetime.now().isoformat()
-        }
+        export_data = export_payload({name: st.session_state[name] for name in COLLECTIONS}, st.session_state.ward)
         
         st.download_button(
             label="📤 Export Data",
@@ -1594,28 +2637,347 @@ def show_data_management():
         )
     
     with col4:
-        uploaded_file = st.file_uploader("📥 Import Data", type=['json'], label_visibility="collapsed")
-        if uploaded_file is not None:
+        # The uploader keeps its file across reruns: importing is an explicit click, and the uploader is reset after it
+        uploaded_file = st.file_uploader("📥 Import Data", type=['json'], label_visibility="collapsed",
+                                         key=f"import_file_{st.session_state.get('import_nonce', 0)}")
+        repair_on_import = st.checkbox("Repair broken references on import", value=False, key="import_repair")
+        if uploaded_file is not None and repair_on_import:
+            try: # Repairs can delete records: say which before the import is clicked
+                preview = check_integrity(json.loads(uploaded_file.getvalue()))
+                if preview.repairable:
+                    st.warning("Repair will " + "; ".join(
+                        f"{'delete' if v.repair == 'delete' else 'clear ' + v.field + ' in'} {len(v.ids)} {v.collection} record(s) "
+                        f"(missing {v.references})" for v in preview.repairable) + ".")
+            except Exception as e:
+                st.error(f"Error reading the import file: {str(e)}")
+        if uploaded_file is not None and st.button("📥 Import", use_container_width=True):
             try:
-                import_data = json.load(uploaded_file)
+                import_data = json.loads(uploaded_file.getvalue())
+                # Dangling references in the file are repaired (if asked) before anything is replaced
+                with timed("integrity.check", collections=COLLECTIONS):
+                    imported, import_report = prepare_import(import_data, repair=repair_on_import)
+                backup_ward("before import") # Restorable from Backups below
                 # Manually update session state with imported data
-                st.session_state.patients = import_data.get('patients', [])
-                st.session_state.doctors = import_data.get('doctors', [])
-                st.session_state.rooms = import_data.get('rooms', [])
-                st.session_state.appointments = import_data.get('appointments', [])
-                st.session_state.treatment_plans = import_data.get('treatment_plans', [])
-                st.session_state.diagnosis = import_data.get('diagnosis', [])
-                st.session_state.billing = import_data.get('billing', [])
+                for name, records in imported.items():
+                    st.session_state[name] = records
+                st.session_state.loaded_collections = set(COLLECTIONS)
                 
                 st.session_state.initialized = True
-                save_data_to_backend() # <--- NEW: Save imported data to backend
-                st.success("Data imported and saved to backend successfully!")
+                publish(DataReplaced(source="import")) # Subscribers rebuild the ledger and save to backend
+                repaired = sum(len(v.ids) for v in import_report.repairable) if repair_on_import else 0
+                if run_integrity_check().ok:
+                    st.toast(f"Integrity check passed ({repaired} record(s) repaired)." if repaired else "Integrity check passed.", icon='✅')
+                else:
+                    st.toast(f"{st.session_state.integrity_report.problems} record(s) with integrity problems imported as they are"
+                             f"{f' ({repaired} repaired)' if repaired else ''}. See Data Integrity.", icon='⚠️')
+                st.session_state.import_nonce = st.session_state.get('import_nonce', 0) + 1 # Clears the uploader
+                st.toast("Data imported and saved to backend successfully!", icon='📥')
                 st.rerun()
             except Exception as e:
                 st.error(f"Error importing data: {str(e)}")
 
+    st.markdown("---")
+
+    # --- Row 4: Data Integrity (every foreign key checked with one vectorised join) ---
+    st.subheader("Data Integrity")
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        if st.button("🔍 Check Integrity", use_container_width=True):
+            run_integrity_check()
+        report = st.session_state.get('integrity_report')
+        if report is not None and report.repairable:
+            if st.button(f"🛠️ Repair {sum(len(v.ids) for v in report.repairable)} Record(s)", use_container_width=True):
+                if st.session_state.get('confirm_repair', False):
+                    with unit_of_work(): # One bulk event per repair step and one backend save
+                        changed = repair_integrity(report)
+                    st.session_state.confirm_repair = False
+                    run_integrity_check()
+                    st.toast(f"Repaired {changed} record(s).", icon='🛠️')
+                    st.rerun()
+                else:
+                    st.session_state.confirm_repair = True
+                    st.warning("Click again to confirm. Records that cannot exist without their patient are deleted.")
+    with col2:
+        if report is None:
+            st.info("No integrity check has run in this session yet.")
+        elif report.ok:
+            st.success(f"All references valid: {report.keys_checked} keys over {report.rows_checked:,} rows checked in {report.seconds * 1000:.0f} ms.")
+        else:
+            st.dataframe(pd.DataFrame(report.rows()), use_container_width=True, hide_index=True)
+            st.caption(f"{report.keys_checked} keys over {report.rows_checked:,} rows checked in {report.seconds * 1000:.0f} ms. "
+                       "Repairs: *nullify* clears the reference, *vacate* frees the room, *delete* removes the record "
+                       "(as deleting its patient would); duplicate ids need a manual fix.")
+
+    st.markdown("---")
+
+    # --- Row 5: Backups (gzipped full snapshots plus diffs, restorable in one click) ---
+    st.subheader("Backups")
+    backups = get_backups()
+    entries = backups.backups(st.session_state.ward)
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        if st.button("📸 Back Up Now", use_container_width=True):
+            entry = backup_ward("manual")
+            st.toast(f"Backup {entry['seq']} written." if entry else "Nothing changed since the last backup.", icon='📸')
+            st.rerun()
+        if entries:
+            labels = {e['seq']: f"#{e['seq']} · {e['taken_at'].replace('T', ' ')} · {e['reason']}" for e in entries}
+            restore_seq = st.selectbox("Restore point", list(reversed(list(labels))), format_func=labels.get, key="restore_seq")
+            restore_doctors = st.checkbox("Also restore the shared doctors", key="restore_doctors",
+                                          help="Rolls back the hospital-wide doctor list for every ward.")
+            if st.button("♻️ Restore", use_container_width=True):
+                if st.session_state.get('confirm_restore') == (restore_seq, restore_doctors):
+                    backup_ward(f"before restore of #{restore_seq}") # The restore itself can be undone
+                    ensure_collections_loaded(SHARED_COLLECTIONS) # Kept as they are unless restored too
+                    restored = WARD_COLLECTIONS + SHARED_COLLECTIONS if restore_doctors else WARD_COLLECTIONS
+                    for name, records in backups.restore(st.session_state.ward, restore_seq, restored).items():
+                        st.session_state[name] = records
+                    st.session_state.loaded_collections = set(COLLECTIONS)
+                    st.session_state.confirm_restore = None
+                    publish(DataReplaced(source="restore")) # Subscribers rebuild the indexes and save to backend
+                    st.toast(f"{st.session_state.ward} restored to backup #{restore_seq}.", icon='♻️')
+                    st.rerun()
+                else:
+                    st.session_state.confirm_restore = (restore_seq, restore_doctors)
+                    scope = " and the shared doctors (all wards)" if restore_doctors else ""
+                    st.warning(f"Click again to replace **{st.session_state.ward}**{scope} with backup #{restore_seq}.")
+        with st.expander("Retention"):
+            backups.min_interval = st.number_input("Seconds between automatic backups", min_value=0, value=backups.min_interval, step=60)
+            backups.full_every = st.number_input("Diffs between full snapshots", min_value=0, value=backups.full_every, step=1)
+            backups.keep_chains = st.number_input("Full snapshots kept", min_value=1, value=backups.keep_chains, step=1)
+            st.caption("Settings apply to every ward until the server restarts.")
+    with col2:
+        if entries:
+            df_backups = pd.DataFrame(entries[::-1])[['seq', 'taken_at', 'kind', 'reason', 'records', 'bytes']]
+            df_backups['bytes'] = df_backups['bytes'] / 1024
+            df_backups.columns = ['#', 'Taken', 'Kind', 'Reason', 'Records', 'Size (KB)']
+            st.dataframe(df_backups.round(1), use_container_width=True, hide_index=True)
+            st.caption(f"{len(entries)} backup(s), {backups.storage_bytes(st.session_state.ward) / 1024:,.1f} KB in total. "
+                       "Diffs hold only the records changed since the backup before.")
+        else:
+            st.info("No backups of this ward yet. The first is taken after the next save.")
+        if backups.last_error:
+            st.error(f"Last backup failed: {backups.last_error}")
+
+    st.markdown("---")
+
+    # --- Row 6: Wards (cross-ward report fans out over every shard) ---
+    st.subheader("Wards (Hospital-wide)")
+    col1, col2 = st.columns([1, 2])
+    
+    with col1:
+        st.caption(f"This session is working on **{st.session_state.ward}**. Each ward is stored in its own shard.")
+        new_ward = st.text_input("New Ward Name", key="new_ward_name")
+        if st.button("➕ Create Ward", use_container_width=True):
+            if not new_ward.strip():
+                st.error("Ward name is required.")
+            elif get_store().has_ward(new_ward.strip()):
+                st.error(f"Ward {new_ward.strip()} already exists.")
+            else:
+                get_store().create_ward(new_ward.strip())
+                st.success(f"Ward {new_ward.strip()} created. Select it in the sidebar to start adding records.")
+    
+    with col2:
+        flush_pending_saves()
+        ward_stats = get_store().fan_out(summarise_ward, ["patients", "rooms", "billing"])
+        if ward_stats:
+            df_wards = pd.DataFrame(ward_stats.values())
+            df_wards['Billed'] = df_wards['Billed'].apply(lambda x: f"₹{x:,.0f}")
+            df_wards['Outstanding'] = df_wards['Outstanding'].apply(lambda x: f"₹{x:,.0f}")
+            st.dataframe(df_wards, use_container_width=True, hide_index=True)
+        else:
+            st.info("No ward shards found.")
+
+    st.markdown("---")
+
+    # --- Row 7: Session Activity (KPI counters maintained by the event bus) ---
+    st.subheader("Session Activity")
+    kpis = st.session_state.get('mutation_kpis')
+    if kpis:
+        df_kpis = pd.DataFrame(sorted(kpis.items()), columns=['Event', 'Count'])
+        st.dataframe(df_kpis, use_container_width=True, hide_index=True)
+    else:
+        st.info("No changes recorded in this session yet.")
+
+    st.markdown("---")
+
+    # --- Row 8: Audit Trail (indexed by record id and by day, so filters never scan every segment) ---
+    st.subheader("Audit Trail")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        audit_entity = st.selectbox("Entity", ["All"] + list(ID_FIELDS) + ["ward"], key="audit_entity")
+    with col2:
+        audit_id = st.number_input("Record ID (0 = any)", min_value=0, step=1, key="audit_record_id")
+    with col3:
+        audit_actions = st.multiselect("Actions", ACTIONS, key="audit_actions")
+    with col4:
+        audit_range = st.date_input("Date Range", value=(datetime.now().date() - timedelta(days=6), datetime.now().date()), key="audit_range")
+
+    if len(audit_range) == 2:
+        entries = get_audit_log().query(
+            entity=None if audit_entity == "All" else audit_entity,
+            entity_id=int(audit_id) if audit_id and audit_entity != "All" else None,
+            actions=audit_actions, start=audit_range[0], end=audit_range[1]
+        )
+        if entries:
+            df_audit = pd.DataFrame(entries)[['ts', 'actor', 'ward', 'action', 'entity', 'id', 'changes']]
+            df_audit['changes'] = df_audit['changes'].apply(lambda c: json.dumps(c, default=str))
+            df_audit.columns = ['Time', 'Operator', 'Ward', 'Action', 'Entity', 'Record ID', 'Changes']
+            st.dataframe(df_audit.iloc[::-1], use_container_width=True, hide_index=True)
+        else:
+            st.info("No audit entries match these filters.")
+    else:
+        st.info("Select a start and end date.")
+
+# Performance page (timings are process-wide; collections are this session's view)
+@timed("page.show_performance")
+def show_performance():
+    st.markdown('<h1 class="main-header">Performance</h1>', unsafe_allow_html=True)
+
+    enabled = st.toggle("Collect timings (all sessions)", value=TIMINGS.enabled, key="perf_instrumentation")
+    if enabled != TIMINGS.enabled:
+        TIMINGS.enabled = enabled
+        st.rerun()
+
+    writer = get_writer()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Live Sessions", SESSIONS.live())
+    with col2:
+        st.metric("Saves Pending", writer.pending())
+    with col3:
+        st.metric("Saves Queued", writer.submitted)
+    with col4:
+        st.metric("Disk Writes", writer.writes)
+
+    # Cold start of this server process (first run of each phase; warm reruns show under Timings)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Cold Imports (ms)", f"{STARTUP.get('imports', 0) * 1000:.0f}")
+    with col2:
+        st.metric("First Session Init (ms)", f"{STARTUP.get('session_init', 0) * 1000:.0f}")
+    with col3:
+        st.metric("First Rerun (ms)", f"{STARTUP.get('first_rerun', 0) * 1000:.0f}")
+    with col4:
+        st.metric("Plotly Loaded", "Yes" if px.loaded else "No")
+
+    st.markdown("---")
+
+    # --- Timings: rolling p50/p95 per page render, backend operation and chart build ---
+    st.subheader("Timings (latest 200 per operation)")
+    rows = TIMINGS.summary()
+    if rows:
+        df_timings = pd.DataFrame(rows)
+        df_timings.insert(0, 'Type', df_timings['operation'].str.split('.').str[0].str.title())
+        df_timings['operation'] = df_timings['operation'].str.split('.', n=1).str[1]
+        df_timings.columns = ['Type', 'Operation', 'Calls', 'p50 (ms)', 'p95 (ms)', 'Max (ms)', 'Last (ms)']
+        st.dataframe(df_timings.round(1), use_container_width=True, hide_index=True)
+        if st.button("🔄 Reset Timings"):
+            TIMINGS.reset()
+            st.rerun()
+    elif TIMINGS.enabled:
+        st.info("No timings recorded yet. Open a few pages to collect samples.")
+    else:
+        st.info("Timing collection is off. Switch it on above (or start the app with POMS_INSTRUMENTATION=1).")
+
+    st.markdown("---")
+
+    # --- Chart figures: shared LRU keyed by (chart, ward, input versions, parameters) ---
+    st.subheader("Chart Figure Cache")
+    figures = get_figure_cache()
+    lookups = figures.hits + figures.misses
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Cached Figures", f"{len(figures)} / {figures.max_entries}")
+    with col2:
+        st.metric("Hits", figures.hits)
+    with col3:
+        st.metric("Misses (built)", figures.misses)
+    with col4:
+        st.metric("Hit Rate", f"{figures.hits / lookups:.0%}" if lookups else "N/A")
+    if st.button("🧹 Clear Figure Cache"):
+        figures.clear()
+        st.rerun()
+
+    st.markdown("---")
+
+    # --- Tracing: sampled span trees to a rotating NDJSON file, and a one-off cProfile capture ---
+    st.subheader("Tracing")
+    tracer = get_tracer()
+    col1, col2 = st.columns(2)
+    with col1:
+        rate = st.slider("Trace sample rate (all sessions)", 0.0, 1.0, float(tracer.sample_rate), 0.05, key="perf_trace_rate")
+        if rate != tracer.sample_rate:
+            tracer.sample_rate = rate
+        st.caption(f"{tracer.traces_written} traces written to `{tracer.path}` (rotated at 5 MB, 5 files kept). "
+                   "Load with `pd.read_json(path, lines=True)`.")
+    with col2:
+        if st.button("🔬 Profile Next Rerun"):
+            st.session_state.profile_next_rerun = True
+            st.info("The next page you open in this session will be captured with cProfile.")
+        profile = st.session_state.get('last_profile')
+        if profile and profile['report']:
+            st.caption(f"Last capture: `{profile['path']}`")
+    if profile and profile['report']:
+        with st.expander("Last cProfile capture (top functions by cumulative time)"):
+            st.code(profile['report'], language=None)
+
+    st.markdown("---")
+
+    # --- Collections: record counts and estimated memory of this session's loaded data ---
+    st.subheader("Collections")
+    collection_rows = []
+    for name in COLLECTIONS:
+        loaded = name in st.session_state.get('loaded_collections', ())
+        records = st.session_state.get(name, []) if loaded else []
+        table = st.session_state.get('columnar', {}).get(name)
+        snapshot = shared_snapshot_if_clean(name) if loaded else None
+        if table is None and snapshot is not None:
+            table = snapshot.table
+        collection_rows.append({
+            'Collection': name,
+            'Loaded': "Yes" if loaded else "No",
+            'Records': len(records),
+            'Est. Memory (KB)': estimate_records_bytes(records) / 1024 if loaded else 0.0,
+            'Columnar Buffers (KB)': table.memory_bytes() / 1024 if table is not None else 0.0,
+            'Shared Snapshot': "Yes" if snapshot is not None else "No"
+        })
+    st.dataframe(pd.DataFrame(collection_rows).round(1), use_container_width=True, hide_index=True)
+    st.caption("Record memory is estimated from a sample of records. Records in a shared snapshot are held once for all sessions.")
+
+@st.fragment(run_every=2)
+def show_save_status():
+    """Sidebar durability indicator, refreshed on its own so it turns 'saved' once the writer catches up."""
+    writer = get_writer()
+    pending = writer.pending(st.session_state.ward)
+    if writer.last_error:
+        st.error(f"Save failed: {writer.last_error}")
+    elif pending:
+        st.caption(f"⏳ {pending} change{'s' if pending != 1 else ''} pending")
+    else:
+        last_saved = writer.last_saved.get(st.session_state.ward)
+        st.caption(f"💾 Saved{' at ' + last_saved.strftime('%H:%M:%S') if last_saved else ''}")
+
 # Main app
 def main():
+    """One rerun: traced as a whole when sampled, and cProfiled once when requested from Performance."""
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        SESSIONS.touch(ctx.session_id)
+    try:
+        with get_tracer().trace("rerun", session=ctx.session_id if ctx is not None else None):
+            if st.session_state.pop('profile_next_rerun', False):
+                path = f"{TRACE_DIR}/profile-{datetime.now():%Y%m%d-%H%M%S}.prof"
+                with profiled(path) as profile:
+                    st.session_state.last_profile = profile # Filled in when the block exits, even on st.rerun()
+                    render_app()
+            else:
+                render_app()
+    finally:
+        if 'first_rerun' not in STARTUP:
+            record_startup("first_rerun", time.perf_counter() - _script_started)
+
+def render_app():
     init_sample_data()
     
     # Sidebar
@@ -1625,10 +2987,30 @@ def main():
         st.caption("Pediatric Oncology Management System")
         st.markdown("---")
         
+        # Ward selection: the session only loads the selected ward's shard
+        wards = get_store().list_wards() or [st.session_state.ward]
+        selected_ward = st.selectbox("Ward", wards, 
+                                     index=wards.index(st.session_state.ward) if st.session_state.ward in wards else 0,
+                                     key='ward_select')
+        if selected_ward != st.session_state.ward:
+            switch_ward(selected_ward)
+            st.rerun()
+        show_save_status()
+        integrity = st.session_state.get('integrity_report')
+        if integrity is not None and not integrity.ok:
+            st.warning(f"⚠️ {integrity.problems} record(s) with integrity problems. See Data Management.")
+        st.text_input("Operator", key='operator', placeholder="Your name (recorded in the audit trail)")
+        as_of = st.date_input("🕰️ View as of", value=None, max_value=datetime.now().date(), key='as_of_date',
+                              help="Show the ward as it was at the end of a past day (read-only). Clear to return to live data.")
+        if as_of != st.session_state.get('as_of'):
+            set_as_of(as_of)
+        st.markdown("---")
+        
         # Define menu items without emojis
         menu_items = [
             "Dashboard", 
             "Patients", 
+            "Patient Timeline", 
             "Doctors", 
             "Appointments", 
             "Treatment Plans", 
@@ -1636,7 +3018,8 @@ def main():
             "Rooms", 
             "Billing", 
             "Reports", 
-            "Data Management"
+            "Data Management",
+            "Performance"
         ]
         
         # Use st.session_state.menu to control the selected radio button
@@ -1656,11 +3039,17 @@ def main():
         st.write("**Admin User**")
         st.caption("Administrator")
     
+    if st.session_state.get('as_of') is not None:
+        st.info(f"🕰️ Read-only view of **{st.session_state.ward}** as of the end of {st.session_state.as_of:%d %b %Y}. "
+                "Changes are disabled until the date is cleared.")
+
     # Main content based on menu selection
     if st.session_state.menu == "Dashboard":
         show_dashboard()
     elif st.session_state.menu == "Patients":
         show_patients()
+    elif st.session_state.menu == "Patient Timeline":
+        show_patient_timeline()
     elif st.session_state.menu == "Doctors":
         show_doctors()
     elif st.session_state.menu == "Appointments":
@@ -1677,6 +3066,8 @@ def main():
         show_reports()
     elif st.session_state.menu == "Data Management":
         show_data_management()
+    elif st.session_state.menu == "Performance":
+        show_performance()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,26 @@
+"""Shared fixtures: a small ward on a temporary shard store."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from poms.occupancy import seed_events_from_rooms  # noqa: E402
+from poms.sample_data import load_sample_data  # noqa: E402
+from poms.storage import DEFAULT_WARD, ShardedStore  # noqa: E402
+
+
+@pytest.fixture
+def sample_data():
+    data = load_sample_data()
+    data["room_events"] = seed_events_from_rooms(data["rooms"], data["patients"])
+    return data
+
+
+@pytest.fixture
+def shard_root(tmp_path, sample_data):
+    """A shard store holding the sample ward, as the app seeds it on first run."""
+    root = str(tmp_path / "poms_shards")
+    ShardedStore(root).save_ward(DEFAULT_WARD, sample_data)
+    return root
@@ -0,0 +1,24 @@
+from poms.audit import AuditLog, entries_from_event
+from poms.events import PatientDischarged, PatientUpdated, RecordsUpdated
+
+
+def test_entries_from_another_process_are_queryable(tmp_path):
+    app = AuditLog(str(tmp_path))
+    app.append("create", "patients", 1, {}, actor="app")
+    job = AuditLog(str(tmp_path))  # e.g. the batch CLI
+    job.append_many([("create", "billing", 7, {}), ("update", "billing", 7, {"amount": [1, 2]})], actor="batch")
+
+    assert [e["action"] for e in app.query("billing", 7)] == ["create", "update"]
+    assert app.entries == 3
+    app.append("delete", "patients", 1, {}, actor="app")
+    assert len(app.query()) == 4 and app.entries == 4
+
+
+def test_bulk_discharge_is_audited_like_a_single_discharge():
+    before = {"patient_id": 4, "status": "Admitted", "discharge_date": None}
+    patient = {"patient_id": 4, "status": "Discharged", "discharge_date": "2026-10-19"}
+    single = entries_from_event(PatientUpdated(before=before, patient=patient)) + entries_from_event(PatientDischarged(patient=patient))
+    bulk = entries_from_event(RecordsUpdated(collection="patients", before=(before,), records=(patient,),
+                                             changes={"status": "Discharged"}, action="discharge"))
+    assert bulk == single
+    assert [entry[0] for entry in bulk] == ["update", "discharge"]
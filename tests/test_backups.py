@@ -0,0 +1,59 @@
+import pytest
+
+from poms.backups import BackupManager, apply_diff, diff_collection
+from poms.storage import DEFAULT_WARD, SHARED_COLLECTIONS, WARD_COLLECTIONS, ShardedStore
+
+
+@pytest.fixture
+def store(shard_root):
+    return ShardedStore(shard_root)
+
+
+@pytest.fixture
+def backups(tmp_path, store):
+    return BackupManager(str(tmp_path / "_backups"), store, full_every=2, keep_chains=2, min_interval=0)
+
+
+def test_diff_round_trip():
+    before = {1: {"bill_id": 1, "amount": 1}, 2: {"bill_id": 2, "amount": 2}}
+    after = {1: {"bill_id": 1, "amount": 5}, 3: {"bill_id": 3, "amount": 3}}
+    change = diff_collection("billing", before, after)
+    assert change == {"upsert": [{"bill_id": 1, "amount": 5}, {"bill_id": 3, "amount": 3}], "delete": [2]}
+    apply_diff("billing", before, change)
+    assert before == after
+    assert diff_collection("billing", after, dict(after)) is None
+
+
+def test_restore_replays_full_snapshot_and_diffs(store, backups):
+    first = backups.snapshot(DEFAULT_WARD)
+    data = store.load_ward(DEFAULT_WARD)
+    store.save_ward(DEFAULT_WARD, {"billing": data["billing"][1:]})
+    second = backups.record_save(DEFAULT_WARD, ["billing"])
+    assert (first["kind"], second["kind"]) == ("full", "diff")
+    assert second["records"] == 1
+    assert backups.restore(DEFAULT_WARD, first["seq"])["billing"] == data["billing"]
+    assert backups.restore(DEFAULT_WARD, second["seq"])["billing"] == data["billing"][1:]
+    with pytest.raises(KeyError):
+        backups.restore(DEFAULT_WARD, 99)
+
+
+def test_restore_leaves_shared_doctors_alone_unless_asked(store, backups):
+    seq = backups.snapshot(DEFAULT_WARD)["seq"]
+    doctors = store.load_collections(DEFAULT_WARD, ["doctors"])["doctors"]
+    store.save_ward("Other Ward", {"doctors": doctors + [{"doctor_id": 500, "name": "Dr Added Elsewhere"}]})
+
+    restored = backups.restore(DEFAULT_WARD, seq)
+    assert sorted(restored) == sorted(WARD_COLLECTIONS)
+    assert "doctors" not in restored
+    with_doctors = backups.restore(DEFAULT_WARD, seq, WARD_COLLECTIONS + SHARED_COLLECTIONS)
+    assert with_doctors["doctors"] == doctors
+
+
+def test_retention_keeps_the_newest_chains(store, backups):
+    for i in range(8):
+        store.save_ward(DEFAULT_WARD, {"billing": [{"bill_id": i, "patient_id": 1, "amount": i}]})
+        backups.snapshot(DEFAULT_WARD)
+    entries = backups.backups(DEFAULT_WARD)
+    assert [e["kind"] for e in entries].count("full") == 2
+    assert entries[0]["kind"] == "full"
+    assert backups.restore(DEFAULT_WARD, entries[-1]["seq"])["billing"] == [{"bill_id": 7, "patient_id": 1, "amount": 7}]
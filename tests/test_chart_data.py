@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from poms.chart_data import aggregate, choose_level, lttb_indices, minmax_indices, prepare_series
+
+
+def test_choose_level_picks_the_finest_that_fits():
+    assert choose_level("2025-01-01", "2025-01-31", 100) == "Daily"
+    assert choose_level("2020-01-01", "2025-01-01", 100) == "Monthly"
+    assert choose_level("1900-01-01", "2025-01-01", 10) == "Yearly"
+
+
+def test_aggregate_includes_empty_buckets():
+    frame = pd.DataFrame({"date": ["2025-01-01", "2025-01-01", "2025-01-03"], "amount": [1.0, 2.0, 4.0]})
+    rolled = aggregate(frame, "date", ["amount"], "Daily")
+    assert rolled["amount"].tolist() == [3.0, 0.0, 4.0]
+
+
+def test_lttb_keeps_endpoints_and_budget():
+    y = np.sin(np.arange(10_000) / 50)
+    keep = lttb_indices(np.arange(10_000), y, 200)
+    assert len(keep) == 200 and keep[0] == 0 and keep[-1] == 9_999
+    assert np.all(np.diff(keep) > 0)
+    assert lttb_indices(np.arange(10), y[:10], 200).tolist() == list(range(10))
+
+
+def test_minmax_keeps_spikes():
+    y = np.zeros(10_000)
+    y[1234], y[8765] = 50, -50
+    keep = minmax_indices(y, 100)
+    assert 1234 in keep and 8765 in keep and len(keep) <= 100
+
+
+def test_prepare_series_caps_points():
+    dates = pd.date_range("2015-01-01", periods=3000, freq="D")
+    frame = pd.DataFrame({"date": dates, "amount": np.arange(3000.0)})
+    capped, level, downsampled = prepare_series(frame, "date", ["amount"], level="Daily", max_points=300)
+    assert level == "Daily" and downsampled and len(capped) <= 300
+    auto, level, _ = prepare_series(frame, "date", ["amount"], max_buckets=200)
+    assert level == "Monthly" and auto["amount"].sum() == frame["amount"].sum()
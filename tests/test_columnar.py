@@ -0,0 +1,32 @@
+import random
+
+from poms.columnar import ColumnarTable
+
+
+def test_deletes_keep_order_and_row_numbers():
+    rng = random.Random(3)
+    table = ColumnarTable("bill_id", [{"bill_id": i, "amount": float(i), "status": "Unpaid"} for i in range(200)])
+    order = list(range(200))
+    for _ in range(60):
+        key = rng.choice(order)
+        order.remove(key)
+        table.delete(key)
+    doomed = rng.sample(order, 20)
+    table.delete_many(doomed)
+    order = [k for k in order if k not in doomed]
+    table = table.fork()
+    table.upsert({"bill_id": 500, "amount": 1.0, "status": "Paid"})
+    order.append(500)
+    assert table.frame()["bill_id"].tolist() == order
+    assert table.rows_of(order).tolist() == list(range(len(order)))
+
+
+def test_non_integer_ids_fall_back_to_object_columns():
+    table = ColumnarTable("patient_id", [{"patient_id": 1, "age": 40, "amount": 2.5}, {"patient_id": 2, "age": None}])
+    table.upsert({"patient_id": "P-7", "age": "unknown", "amount": "n/a"})
+    frame = table.frame()
+    assert frame["patient_id"].tolist() == [1, 2, "P-7"]
+    assert frame["age"].tolist() == [40, None, "unknown"]
+    assert frame["amount"].tolist()[2] == "n/a"
+    table.delete("P-7")
+    assert table.frame()["patient_id"].tolist() == [1, 2]
@@ -0,0 +1,33 @@
+import pytest
+
+from poms.events import BillCreated, EventBus, PatientAdmitted
+
+
+def test_deferred_subscribers_run_once_per_unit_of_work_in_priority_order():
+    bus, calls = EventBus(), []
+    bus.subscribe(PatientAdmitted, lambda e: calls.append(("index", e.patient["patient_id"])))
+    bus.subscribe((PatientAdmitted, BillCreated), lambda batch: calls.append(("save", [e.name for e in batch])),
+                  priority=90, deferred=True)
+
+    def billing_rule(batch):
+        calls.append(("rule", len(batch)))
+        for event in batch:
+            bus.publish(BillCreated(bill={"bill_id": event.patient["patient_id"]}))
+    bus.subscribe(PatientAdmitted, billing_rule, priority=10, deferred=True)
+
+    with bus.unit_of_work():
+        bus.publish(PatientAdmitted(patient={"patient_id": 1}))
+        bus.publish(PatientAdmitted(patient={"patient_id": 2}))
+        assert calls == [("index", 1), ("index", 2)]  # deferred ones wait for the block to end
+    assert calls[2:] == [("rule", 2), ("save", ["PatientAdmitted", "PatientAdmitted", "BillCreated", "BillCreated"])]
+
+
+def test_failed_unit_of_work_drops_its_pending_events():
+    bus, saved = EventBus(), []
+    bus.subscribe(PatientAdmitted, saved.extend, deferred=True)
+    with pytest.raises(RuntimeError):
+        with bus.unit_of_work():
+            bus.publish(PatientAdmitted(patient={"patient_id": 1}))
+            raise RuntimeError("form validation failed")
+    bus.publish(PatientAdmitted(patient={"patient_id": 2}))
+    assert [e.patient["patient_id"] for e in saved] == [2]
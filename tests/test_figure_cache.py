@@ -0,0 +1,18 @@
+from poms.figure_cache import FigureCache
+
+
+def test_least_recently_used_figure_is_evicted():
+    cache, builds = FigureCache(max_entries=2), []
+
+    def build(name):
+        return lambda: builds.append(name) or f"figure {name}"
+
+    cache.get_or_build(("census", 1), build("a"))
+    cache.get_or_build(("census", 2), build("b"))
+    assert cache.get_or_build(("census", 1), build("a again")) == "figure a"  # hit: now most recent
+    cache.get_or_build(("census", 3), build("c"))  # evicts version 2, the least recently used
+    cache.get_or_build(("census", 2), build("b again"))
+
+    assert builds == ["a", "b", "c", "b again"]
+    assert (len(cache), cache.hits, cache.misses) == (2, 1, 4)
+    assert cache.get_or_build(("census", 3), build("c again")) == "figure c"
@@ -0,0 +1,28 @@
+from poms.instrumentation import TIMINGS, Timings, timed
+
+
+def test_summary_covers_only_the_rolling_window():
+    timings = Timings(window=3, enabled=True)
+    for seconds in (5.0, 0.001, 0.002, 0.003, 0.004):
+        timings.record("page.render", seconds)
+    [row] = timings.summary()
+    assert row["calls"] == 5
+    assert row["max_ms"] == 4.0 and row["p50_ms"] == 3.0 and row["last_ms"] == 4.0
+
+
+def test_timed_records_only_while_enabled(monkeypatch):
+    monkeypatch.setattr(TIMINGS, "enabled", False)
+    TIMINGS.reset()
+
+    @timed("chart.build")
+    def build():
+        return "figure"
+
+    assert build() == "figure"
+    assert TIMINGS.summary() == []
+    monkeypatch.setattr(TIMINGS, "enabled", True)
+    build()
+    with timed("backend.save"):
+        pass
+    assert [row["operation"] for row in TIMINGS.summary()] == ["backend.save", "chart.build"]
+    TIMINGS.reset()
@@ -0,0 +1,76 @@
+from poms.integrity import check, key_array, repair_plan, repair_records
+
+
+def data(**collections):
+    base = {"doctors": [{"doctor_id": 1}, {"doctor_id": 5}], "patients": [], "rooms": []}
+    base.update(collections)
+    return base
+
+
+def test_integer_keys_use_int64():
+    values, present = key_array([{"id": 1}, {"id": None}, {"id": 3}, {}], "id")
+    assert values.dtype.name == "int64"
+    assert present.tolist() == [True, False, True, False]
+
+
+def test_clean_data_is_ok():
+    report = check(data(patients=[{"patient_id": 1, "doctor_id": 5}, {"patient_id": 2, "doctor_id": None}]))
+    assert report.ok
+    assert report.checked[("patients", "doctor_id")] == 2
+
+
+def test_string_and_float_ids_are_not_coerced():
+    patients = [{"patient_id": 1, "doctor_id": "5"}, {"patient_id": 2, "doctor_id": 1.7}, {"patient_id": 3, "doctor_id": 5}]
+    report = check(data(patients=patients))
+    [violation] = report.violations
+    assert (violation.collection, violation.field, violation.problem) == ("patients", "doctor_id", "dangling")
+    assert violation.ids == (1, 2)
+    assert set(violation.values) == {"5", 1.7}
+
+
+def test_repair_matches_the_reported_values():
+    patients = [{"patient_id": 1, "doctor_id": "99"}, {"patient_id": 2, "doctor_id": 1}]
+    repaired = repair_records(data(patients=patients), check(data(patients=patients)))
+    assert [p["doctor_id"] for p in repaired["patients"]] == [None, 1]
+    assert patients[0]["doctor_id"] == "99"  # records are copied, not edited
+
+
+def test_duplicates_with_mixed_key_types():
+    patients = [{"patient_id": 4}, {"patient_id": "4"}, {"patient_id": "4"}, {"patient_id": 7}]
+    [violation] = check(data(patients=patients)).violations
+    assert violation.problem == "duplicate"
+    assert violation.values == ("4",)
+    assert violation.repair is None
+
+
+def test_repairs_delete_before_clearing_and_vacate_rooms():
+    d = data(patients=[{"patient_id": 1, "doctor_id": 1}],
+             rooms=[{"room_id": 1, "patient_id": 2, "occupancy_status": "Occupied"}],
+             billing=[{"bill_id": 1, "patient_id": 1}, {"bill_id": 2, "patient_id": 2}])
+    report = check(d)
+    assert repair_plan(report)[0][0] == "delete"
+    repaired = repair_records(d, report)
+    assert [b["bill_id"] for b in repaired["billing"]] == [1]
+    assert repaired["rooms"][0] == {"room_id": 1, "patient_id": None, "occupancy_status": "Vacant"}
+
+
+def test_partial_check_keeps_problems_it_did_not_recheck():
+    d = data(patients=[{"patient_id": 1, "doctor_id": 1}],
+             treatment_plans=[{"plan_id": 1, "patient_id": 1, "doctor_id": 42}],
+             rooms=[{"room_id": 1, "patient_id": 1, "occupancy_status": "Occupied"}])
+    full = check(d)
+    assert full.problems == 1
+    partial = check(d, ["rooms"])
+    assert partial.ok
+    merged = full.merge(partial)
+    assert merged.problems == 1
+    assert merged.keys_checked == full.keys_checked
+
+    d["treatment_plans"][0]["doctor_id"] = 1
+    assert full.merge(check(d, ["treatment_plans"])).ok
+
+
+def test_foreign_keys_without_their_collections_are_skipped():
+    report = check({"patients": [{"patient_id": 1, "doctor_id": 9}]})
+    assert report.ok
+    assert ("patients", "doctor_id") in {(fk.collection, fk.field) for fk in report.skipped}
@@ -0,0 +1,68 @@
+import random
+from datetime import date, timedelta
+
+from poms.intervals import PlanIntervalIndex
+
+START = date(2025, 1, 1)
+
+
+def plan(plan_id, start, end):
+    return {"plan_id": plan_id, "start_date": start and start.isoformat(), "end_date": end and end.isoformat()}
+
+
+def brute_force(plans, first, last):
+    """Ids whose [start, end] (end None = open) overlaps [first, last]."""
+    return sorted(p["plan_id"] for p in plans.values()
+                  if p["start_date"] and (p["end_date"] is None or p["end_date"] >= p["start_date"])
+                  and p["start_date"] <= last.isoformat() and (p["end_date"] is None or p["end_date"] >= first.isoformat()))
+
+
+def random_plan(rng, plan_id):
+    start = START + timedelta(days=rng.randrange(365))
+    end = None if rng.random() < 0.2 else start + timedelta(days=rng.randrange(-3, 90))
+    return plan(plan_id, start, end)
+
+
+def test_queries_match_brute_force_under_edits():
+    rng = random.Random(7)
+    plans = {i: random_plan(rng, i) for i in range(300)}
+    index = PlanIntervalIndex(plans.values())
+    for step in range(600):
+        plan_id = rng.randrange(400)
+        if plan_id in plans and rng.random() < 0.4:
+            index.remove(plans.pop(plan_id))
+        elif plan_id in plans:
+            new = random_plan(rng, plan_id)
+            index.update(plans[plan_id], new)
+            plans[plan_id] = new
+        else:
+            plans[plan_id] = random_plan(rng, plan_id)
+            index.add(plans[plan_id])
+        if step % 50 == 0:
+            day = START + timedelta(days=rng.randrange(-10, 460))
+            assert sorted(index.active_on(day)) == brute_force(plans, day, day)
+            last = day + timedelta(days=rng.randrange(60))
+            assert sorted(index.overlapping(day, last)) == brute_force(plans, day, last)
+            ending = sorted(p["plan_id"] for p in brute_force_ending(plans, day, last))
+            assert sorted(index.ending_within(day, last)) == ending
+
+
+def brute_force_ending(plans, first, last):
+    return [p for p in plans.values() if p["start_date"] and p["end_date"] and p["end_date"] >= p["start_date"]
+            and first.isoformat() <= p["end_date"] <= last.isoformat()]
+
+
+def test_open_ended_and_unindexable_plans():
+    index = PlanIntervalIndex([plan(1, START, None), plan(2, None, START), plan(3, START, START - timedelta(days=1))])
+    assert len(index) == 1
+    assert index.active_on(date(2099, 1, 1)) == [1]
+    assert index.ending_within(START, date(2099, 1, 1)) == []
+    assert index.active_on("not a date") == []
+
+
+def test_inclusive_bounds():
+    index = PlanIntervalIndex([plan(1, START, START + timedelta(days=2))])
+    assert index.active_on(START) == [1]
+    assert index.active_on(START + timedelta(days=2)) == [1]
+    assert index.active_on(START + timedelta(days=3)) == []
+    assert index.overlapping(START + timedelta(days=2), START + timedelta(days=9)) == [1]
@@ -0,0 +1,25 @@
+import sys
+from datetime import datetime
+
+from poms.lazy import lazy_import
+from poms.sample_data import load_sample_data
+
+
+def test_module_is_imported_on_first_attribute_access(tmp_path, monkeypatch):
+    (tmp_path / "lazy_probe.py").write_text("VALUE = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    probe = lazy_import("lazy_probe")
+    assert lazy_import("lazy_probe") is probe
+    assert not probe.loaded and "lazy_probe" not in sys.modules
+    assert probe.VALUE == 42
+    assert probe.loaded and "lazy_probe" in sys.modules
+    monkeypatch.delitem(sys.modules, "lazy_probe")
+
+
+def test_sample_data_dates_today_and_returns_fresh_records():
+    first, second = load_sample_data(), load_sample_data()
+    today = datetime.now().strftime("%Y-%m-%d")
+    assert any(a.get("date") == today for a in first["appointments"])
+    assert not any(v == "@today" for records in first.values() for r in records for v in r.values())
+    first["patients"][0]["name"] = "changed"
+    assert second["patients"][0]["name"] != "changed"
@@ -0,0 +1,27 @@
+from datetime import date, datetime
+
+from poms.occupancy import daily_occupancy, make_room_event, utilisation_report
+
+ROOMS = [{"room_id": 1, "room_type": "Private"}, {"room_id": 2, "room_type": "Private"},
+         {"room_id": 3, "room_type": "Ward"}]
+
+
+def _log():
+    events = [("occupy", 1, None, datetime(2026, 1, 1)), ("occupy", 3, None, datetime(2026, 1, 2)),
+              ("vacate", 3, None, datetime(2026, 1, 2, 12)), ("vacate", 1, None, datetime(2026, 1, 3, 12)),
+              ("occupy", 2, None, datetime(2026, 1, 3, 12)), ("transfer", 1, 2, datetime(2026, 1, 4))]
+    return [make_room_event(i, kind, room, 7, from_room_id=from_room, timestamp=when)
+            for i, (kind, room, from_room, when) in enumerate(events, start=1)]
+
+
+def test_sweep_counts_back_to_back_stays_once():
+    report = utilisation_report(_log(), ROOMS, date(2026, 1, 1), date(2026, 1, 4))
+    assert report["bed_days"] == 4.5
+    assert report["peak_concurrent"] == 2  # rooms 1 and 3 on Jan 2, not the handover on Jan 3
+    private = next(row for row in report["by_room_type"] if row["room_type"] == "Private")
+    assert private["peak_concurrent"] == 1 and private["bed_days"] == 4.0
+
+
+def test_daily_occupancy_splits_partial_days():
+    series = daily_occupancy(_log(), ROOMS, date(2026, 1, 1), date(2026, 1, 4))
+    assert series == [(date(2026, 1, 1), 1), (date(2026, 1, 2), 1.5), (date(2026, 1, 3), 1.0), (date(2026, 1, 4), 1)]
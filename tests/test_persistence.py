@@ -0,0 +1,22 @@
+from poms.persistence import BackgroundWriter
+
+
+class RecordingStore:
+    def __init__(self):
+        self.saves = []
+
+    def save_ward(self, ward, data):
+        self.saves.append((ward, data))
+
+
+def test_saves_in_one_window_are_coalesced_per_ward_newest_first():
+    store = RecordingStore()
+    writer = BackgroundWriter(store, coalesce_seconds=0.5)
+    writer.submit("A", {"patients": [{"patient_id": 1, "v": 1}]})
+    writer.submit("A", {"patients": [{"patient_id": 1, "v": 2}], "billing": []})
+    writer.submit("B", {"rooms": []})
+    writer.flush()
+
+    assert sorted(store.saves) == [("A", {"patients": [{"patient_id": 1, "v": 2}], "billing": []}), ("B", {"rooms": []})]
+    assert (writer.submitted, writer.writes, writer.pending()) == (3, 2, 0)
+    writer.close()
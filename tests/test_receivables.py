@@ -0,0 +1,22 @@
+from datetime import date
+
+from poms.receivables import ReceivablesLedger
+
+
+def test_deltas_match_a_rebuild_and_aging_buckets_unpaid_bills():
+    bills = [
+        {"bill_id": 1, "date": "2026-10-10", "amount": 100.0, "status": "Unpaid"},
+        {"bill_id": 2, "date": "2026-09-01", "amount": 40.0, "status": "Paid"},
+        {"bill_id": 3, "date": "2026-08-01", "amount": 25.0, "status": "Unpaid"},
+    ]
+    ledger = ReceivablesLedger(bills)
+    paid = dict(bills[0], status="Paid")
+    ledger.update_bill(bills[0], paid)
+    ledger.remove_bill(bills[1])
+    ledger.add_bill({"bill_id": 4, "date": "2026-05-01", "amount": 10.0, "status": "Unpaid"})
+
+    rebuilt = ReceivablesLedger([paid, bills[2], {"bill_id": 4, "date": "2026-05-01", "amount": 10.0, "status": "Unpaid"}])
+    assert ledger.monthly_series() == rebuilt.monthly_series()
+    assert "2026-09" not in ledger.monthly  # emptied months are dropped, not left at zero
+    assert ledger.totals() == {"billed": 135.0, "paid": 100.0, "outstanding": 35.0, "bills": 3}
+    assert ledger.aging(as_of=date(2026, 10, 19)) == {"0-30": 0.0, "31-60": 0.0, "61-90": 25.0, "90+": 10.0}
@@ -0,0 +1,27 @@
+from poms.occupancy import make_room_event
+from poms.room_state import patients_by_id, reconcile
+
+PATIENTS = [{"patient_id": 1, "status": "Admitted"}, {"patient_id": 2, "status": "Discharged"},
+            {"patient_id": 3, "status": "Admitted"}]
+ROOMS = [
+    {"room_id": 10, "occupancy_status": "Occupied", "patient_id": 1},  # older assignment of patient 1
+    {"room_id": 11, "occupancy_status": "Occupied", "patient_id": 1},  # patient 1's latest room
+    {"room_id": 12, "occupancy_status": "Occupied", "patient_id": 2},
+    {"room_id": 13, "occupancy_status": "Vacant", "patient_id": 3},
+    {"room_id": 14, "occupancy_status": "Occupied", "patient_id": 9},
+    {"room_id": 15, "occupancy_status": "Occupied", "patient_id": 3},  # never logged
+]
+EVENTS = [make_room_event(1, "occupy", 10, 1), make_room_event(2, "occupy", 12, 2),
+          make_room_event(3, "occupy", 11, 1)]
+
+
+def test_reconcile_finds_each_disagreement_with_its_fix():
+    issues = reconcile(ROOMS, patients_by_id(PATIENTS), EVENTS)
+    assert [(i.room_id, i.problem, i.fix) for i in issues] == [
+        (10, "double_booked", "vacate"), (12, "discharged_occupant", "vacate"), (13, "stale_patient", "clear"),
+        (14, "missing_occupant", "vacate"), (15, "unlogged", "log")]
+
+
+def test_scoped_check_looks_only_at_the_rooms_a_change_touched():
+    issues = reconcile(ROOMS, patients_by_id(PATIENTS), EVENTS, patient_ids=[2], room_ids=[14])
+    assert [(i.room_id, i.problem) for i in issues] == [(12, "discharged_occupant"), (14, "missing_occupant")]
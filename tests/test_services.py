@@ -0,0 +1,103 @@
+import json
+from datetime import date
+
+from poms.__main__ import main
+from poms.integrity import check
+from poms.services import (ROOM_CHARGE, WardSession, accrue_rooms, build_report, check_ward, export_payload, export_ward,
+                           prepare_import, room_accrual)
+from poms.storage import COLLECTIONS, DEFAULT_WARD, ShardedStore
+
+DAY = date(2026, 1, 15)
+
+
+def test_room_accrual_is_idempotent_per_day(shard_root):
+    session = WardSession(shard_root, DEFAULT_WARD)
+    summary, bills = accrue_rooms(session, DAY)
+    data = session.data
+    occupied = [r for r in data["rooms"] if r["occupancy_status"] == "Occupied"]
+    admitted = {p["patient_id"] for p in data["patients"] if p["status"] == "Admitted"}
+    assert len(bills) == len([r for r in occupied if r["patient_id"] in admitted]) > 0
+    assert all(b["description"] == ROOM_CHARGE and b["date"] == str(DAY) for b in bills)
+
+    again = WardSession(shard_root, DEFAULT_WARD)
+    assert accrue_rooms(again, DAY)[1] == []
+    assert len(again.data["billing"]) == len(data["billing"])
+
+
+def test_dry_run_saves_nothing(shard_root):
+    before = ShardedStore(shard_root).load_collections(DEFAULT_WARD, ["billing"])["billing"]
+    _, bills = accrue_rooms(WardSession(shard_root, DEFAULT_WARD), DAY, dry_run=True)
+    assert bills
+    assert ShardedStore(shard_root).load_collections(DEFAULT_WARD, ["billing"])["billing"] == before
+
+
+def test_room_accrual_skips_patients_already_charged():
+    data = {"patients": [{"patient_id": 1, "status": "Admitted"}],
+            "rooms": [{"room_id": 1, "occupancy_status": "Occupied", "patient_id": 1, "cost_per_day": 10}],
+            "billing": [{"bill_id": 1, "patient_id": 1, "date": str(DAY), "description": ROOM_CHARGE}]}
+    assert room_accrual(data, DAY, lambda collection: 2) == []
+
+
+def test_integrity_repair_is_saved_and_audited(shard_root):
+    _, report = check_ward(WardSession(shard_root, DEFAULT_WARD))
+    assert not report.ok  # the sample plans point at missing diagnoses
+    session = WardSession(shard_root, DEFAULT_WARD)
+    check_ward(session, repair=True)
+    assert check_ward(WardSession(shard_root, DEFAULT_WARD))[1].ok
+    assert session.audit_log.query(entity="treatment_plans", actions=["update"])
+
+
+def test_report_and_export(shard_root, sample_data):
+    summary, report = build_report(WardSession(shard_root, DEFAULT_WARD), DAY)
+    assert report["summary"]["Patients"] == len(sample_data["patients"])
+    assert report["receivables"]["totals"]["bills"] == len(sample_data["billing"])
+    json.dumps(report, default=str)
+
+    _, payload = export_ward(WardSession(shard_root, DEFAULT_WARD))
+    assert payload["ward"] == DEFAULT_WARD
+    assert all(len(payload[name]) == len(sample_data[name]) for name in COLLECTIONS)
+
+
+def test_import_round_trip_seeds_room_events(sample_data):
+    payload = export_payload(sample_data, DEFAULT_WARD)
+    payload.pop("room_events")
+    imported, report = prepare_import(payload, repair=True)
+    assert imported["room_events"]
+    assert report.problems  # the sample plans point at missing diagnoses
+    assert check(imported).ok
+
+
+def test_cli_exit_codes(shard_root, tmp_path, capsys):
+    assert main(["batch", "integrity", "--root", shard_root]) == 1
+    assert main(["batch", "integrity", "--root", shard_root, "--repair"]) == 0
+    assert main(["batch", "report", "--root", shard_root, "--ward", "Nope"]) == 2
+    out = tmp_path / "export.json"
+    assert main(["batch", "export", "--root", shard_root, "--out", str(out)]) == 0
+    assert json.loads(out.read_text())["ward"] == DEFAULT_WARD
+    assert "[export]" in capsys.readouterr().out
+
+
+def test_import_keeps_broken_references_unless_repair_is_asked(sample_data):
+    imported, report = prepare_import(export_payload(sample_data, DEFAULT_WARD))
+    assert report.problems
+    assert imported["treatment_plans"] == sample_data["treatment_plans"]
+
+
+def test_repair_vacate_events_take_ids_from_the_global_sequence(shard_root):
+    store = ShardedStore(shard_root)
+    rooms = store.load_collections(DEFAULT_WARD, ["rooms"])["rooms"]
+    room = next(r for r in rooms if r["occupancy_status"] == "Occupied")
+    room["patient_id"] = 999  # dangling: the repair vacates it
+    store.save_ward(DEFAULT_WARD, {"rooms": rooms})
+    taken = store.allocate_id("room_events")  # e.g. an app session's occupy, not yet saved
+
+    session = WardSession(shard_root, DEFAULT_WARD)
+    check_ward(session, repair=True)
+    vacates = [e for e in session.data["room_events"] if e["event"] == "vacate" and e["room_id"] == room["room_id"]]
+    assert len(vacates) == 1 and vacates[0]["event_id"] > taken
+
+
+def test_next_id_ignores_string_ids(shard_root):
+    session = WardSession(shard_root, DEFAULT_WARD)
+    session.load(["billing"])["billing"].append({"bill_id": "B-1", "patient_id": 1})
+    assert isinstance(session.next_id("billing"), int)
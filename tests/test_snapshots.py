@@ -0,0 +1,28 @@
+from poms.snapshots import SnapshotRegistry, copy_for_edit
+
+
+def test_edits_copy_the_record_and_the_next_version_reuses_the_rest():
+    registry = SnapshotRegistry()
+    first = registry.publish_initial("W", "patients", [{"patient_id": 1, "v": 1}, {"patient_id": 2, "v": 1}])
+    mine, theirs = list(first.records), list(first.records)  # two sessions pointing at the shared records
+
+    private = set()
+    edited = copy_for_edit(mine, mine[0], private)
+    edited["v"] = 2
+    assert copy_for_edit(mine, edited, private) is edited  # copied once per commit
+    assert theirs[0] == {"patient_id": 1, "v": 1}  # the other session never sees the uncommitted edit
+
+    second = registry.publish("W", "patients", mine, changes=[(first.records[0], edited)])
+    assert second.version == 2 and second.changes == (1, ((first.records[0], edited),))
+    assert second.records[1] is first.records[1]
+    assert registry.get("W", "patients") is second
+    assert registry.publish_initial("W", "patients", []) is second
+
+
+def test_shared_table_is_built_once_per_version():
+    registry = SnapshotRegistry()
+    snapshot = registry.publish("W", "rooms", [{"room_id": 1}])
+    builds = []
+    build = lambda records: builds.append(records) or object()
+    assert registry.table(snapshot, build) is registry.table(snapshot, build)
+    assert len(builds) == 1
@@ -0,0 +1,25 @@
+from poms.stay_analytics import build_stay_frame, overall_summary, stay_summary
+
+
+def _patient(pid, name, admitted, discharged, doctor_id=1):
+    return {"patient_id": pid, "name": name, "dob": "2015-01-01", "diagnosis": "Asthma", "doctor_id": doctor_id,
+            "admission_date": admitted, "discharge_date": discharged}
+
+
+PATIENTS = [
+    _patient(1, "Ann", "2026-01-01", "2026-01-05"),
+    _patient(2, "Ann", "2026-01-20", "2026-01-30"),  # back 15 days after her first stay
+    _patient(3, "Ben", "2026-01-01", "2026-01-03", doctor_id=2),
+    _patient(4, "Cal", "2026-02-01", None, doctor_id=2),  # still admitted: censored at as_of
+    _patient(5, "Dee", "2026-01-10", "2026-02-09"),
+]
+
+
+def test_censored_stays_count_only_in_the_km_median():
+    frame = build_stay_frame(PATIENTS, as_of="2026-03-01")
+    summary = overall_summary(frame)
+    assert summary == {"stays": 5, "still_admitted": 1, "mean_los": 11.5, "median_los": 7.0,
+                       "km_median_los": 10.0, "readmissions": 1, "readmit_30d": 1}
+    by_doctor = stay_summary(frame, "Doctor").set_index("doctor_id")
+    assert by_doctor.loc[2, "still_admitted"] == 1 and by_doctor.loc[2, "mean_los"] == 2.0
+    assert by_doctor.loc[1, "readmissions"] == 1
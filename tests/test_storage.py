@@ -0,0 +1,63 @@
+import json
+import multiprocessing
+import os
+import shutil
+
+from poms.storage import DEFAULT_WARD, ShardedStore, max_id, merge_records
+
+
+def test_merge_applies_only_our_changes():
+    base = {1: {"id": 1, "v": 1}, 2: {"id": 2, "v": 2}, 3: {"id": 3, "v": 3}}
+    ours = [{"id": 1, "v": 10}, base[3], {"id": 5, "v": 5}]  # edit 1, delete 2, add 5
+    theirs = [base[1], base[2], {"id": 3, "v": 30}, {"id": 4, "v": 4}]  # edit 3, add 4
+    merged = merge_records("id", base, ours, theirs)
+    assert merged == [{"id": 1, "v": 10}, {"id": 3, "v": 30}, {"id": 4, "v": 4}, {"id": 5, "v": 5}]
+
+
+def test_concurrent_saves_from_two_stores_keep_both_sides(shard_root):
+    app, job = ShardedStore(shard_root), ShardedStore(shard_root)
+    bills = app.load_collections(DEFAULT_WARD, ["billing"], track=True)["billing"]
+    theirs = job.load_collections(DEFAULT_WARD, ["billing"], track=True)["billing"]
+    job.save_ward(DEFAULT_WARD, {"billing": theirs + [{"bill_id": job.allocate_id("billing"), "patient_id": 1}]})
+    app.save_ward(DEFAULT_WARD, {"billing": bills[1:] + [{"bill_id": app.allocate_id("billing"), "patient_id": 2}]})
+
+    on_disk = [b["bill_id"] for b in ShardedStore(shard_root).load_collections(DEFAULT_WARD, ["billing"])["billing"]]
+    assert len(on_disk) == len(bills) + 1
+    assert bills[0]["bill_id"] not in on_disk
+    assert len(set(on_disk)) == len(on_disk)
+
+
+def _allocate(root):
+    store = ShardedStore(root)
+    return [store.allocate_id("billing") for _ in range(100)]
+
+
+def test_ids_are_unique_across_processes(shard_root):
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        ids = [i for chunk in pool.map(_allocate, [shard_root] * 4) for i in chunk]
+    assert len(set(ids)) == 400
+
+
+def test_sequences_skip_string_ids_from_imported_files(shard_root):
+    store = ShardedStore(shard_root)
+    store.sync_sequences({"billing": [{"bill_id": "B-1"}, {"bill_id": 5000}, {"bill_id": None}]})
+    assert store.allocate_id("billing") == 5001
+    assert store.allocate_id("patients", max_id([{"patient_id": "P-7"}], "patient_id")) > 0
+
+
+def _load_patients(root):
+    return ShardedStore(root).load_collections("Legacy", ["patients"])["patients"]
+
+
+def test_single_file_ward_is_split_once_under_the_lock(tmp_path):
+    root = str(tmp_path / "shards")
+    ShardedStore(root).create_ward("Legacy")
+    store = ShardedStore(root)
+    shutil.rmtree(store._ward_dir("Legacy"))
+    with open(f"{store._ward_dir('Legacy')}.json", "w") as f:
+        json.dump({"patients": [{"patient_id": 1, "name": "A"}]}, f)
+
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        loads = pool.map(_load_patients, [root] * 4)
+    assert loads == [[{"patient_id": 1, "name": "A"}]] * 4
+    assert not os.path.exists(f"{store._ward_dir('Legacy')}.json")
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+
+from poms.audit import AuditLog
+from poms.backups import BackupManager
+from poms.storage import DEFAULT_WARD, ShardedStore
+from poms.time_travel import TimeMachine
+
+
+def test_replays_forward_from_a_backup_and_undoes_back_before_the_first(tmp_path, shard_root):
+    store = ShardedStore(shard_root)
+    backups = BackupManager(str(tmp_path / "_backups"), store, min_interval=0)
+    audit = AuditLog(str(tmp_path / "_audit"))
+    backups.snapshot(DEFAULT_WARD)
+    taken = datetime.fromisoformat(backups.backups(DEFAULT_WARD)[0]["taken_at"])
+    bill = store.load_collections(DEFAULT_WARD, ["billing"])["billing"][0]
+    audit.append("create", "billing", bill["bill_id"], {"after": bill}, ward=DEFAULT_WARD,
+                 timestamp=taken - timedelta(hours=1))
+    audit.append("update", "billing", bill["bill_id"], {"amount": [bill["amount"], 999.0]}, ward=DEFAULT_WARD,
+                 timestamp=taken + timedelta(hours=1))
+    machine = TimeMachine(backups, audit, store)
+
+    def bill_as_of(moment):
+        billing = machine.state_as_of(DEFAULT_WARD, moment, ["billing"])["billing"]
+        return next((b for b in billing if b["bill_id"] == bill["bill_id"]), None)
+
+    assert bill_as_of(taken + timedelta(hours=2))["amount"] == 999.0
+    assert machine.replayed == 1
+    assert bill_as_of(taken + timedelta(minutes=30)) == bill
+    assert bill_as_of(taken - timedelta(hours=2)) is None  # its create is undone
@@ -0,0 +1,32 @@
+from poms.timeline import PatientTimelineIndex, timeline_items
+
+
+def test_plan_contributes_start_and_end():
+    items = timeline_items("treatment_plans", {"plan_id": 1, "patient_id": 1, "start_date": "2025-01-01", "end_date": "2025-02-01"})
+    assert [(i.when, i.kind) for i in items] == [("2025-01-01", "Plan start"), ("2025-02-01", "Plan end")]
+    assert timeline_items("billing", {"bill_id": 1, "patient_id": 1, "date": None}) == []
+
+
+def test_timeline_merges_sources_in_date_order(sample_data):
+    index = PatientTimelineIndex(sample_data)
+    for patient in sample_data["patients"]:
+        whens = [item.when for item in index.timeline(patient["patient_id"])]
+        assert whens == sorted(whens, reverse=True)
+        assert len(whens) == index.count(patient["patient_id"])
+    oldest_first = [i.when for i in index.timeline(1, newest_first=False)]
+    assert oldest_first == sorted(oldest_first)
+
+
+def test_pages_and_deltas():
+    bills = [{"bill_id": i, "patient_id": 1, "date": f"2025-01-{i:02d}"} for i in range(1, 8)]
+    index = PatientTimelineIndex({"billing": bills})
+    first, more = index.page(1, 0, size=3)
+    assert [i.record_id for i in first] == [7, 6, 5] and more
+    last, more = index.page(1, 2, size=3)
+    assert [i.record_id for i in last] == [1] and not more
+
+    index.update("billing", bills[6], dict(bills[6], date="2024-12-31"))
+    index.remove("billing", bills[5])
+    index.add("billing", {"bill_id": 99, "patient_id": 2, "date": "2025-01-01"})
+    assert [i.record_id for i in index.timeline(1)] == [5, 4, 3, 2, 1, 7]
+    assert index.count(2) == 1
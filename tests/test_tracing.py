@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+from poms.tracing import Tracer, collapsed_stacks
+
+
+def test_sampled_trace_is_written_as_one_nested_block(tmp_path):
+    path = str(tmp_path / "traces.ndjson")
+    tracer = Tracer(sample_rate=0)
+    tracer.configure(path)
+    with tracer.trace("rerun"):  # not sampled: nothing recorded, spans are no-ops
+        with tracer.span("page"):
+            pass
+    with pytest.raises(KeyError):
+        with tracer.trace("rerun", force=True, page="Patients"):
+            with tracer.span("page"):
+                with tracer.span("chart"):
+                    pass
+            with tracer.span("save"):
+                raise KeyError("billing")
+
+    with open(path) as f:
+        spans = [json.loads(line) for line in f]
+    assert tracer.traces_written == 1
+    assert [(s["path"], s["depth"], s["parent"]) for s in spans] == [
+        ("rerun", 0, None), ("rerun;page", 1, 1), ("rerun;page;chart", 2, 2), ("rerun;save", 1, 1)]
+    assert spans[0]["attrs"] == {"page": "Patients"} and spans[3]["error"] == "KeyError"
+    assert set(collapsed_stacks(path)) == {"rerun", "rerun;page", "rerun;page;chart", "rerun;save"}
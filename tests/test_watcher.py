@@ -0,0 +1,46 @@
+import json
+
+from poms.storage import DEFAULT_WARD, ShardedStore
+from poms.watcher import ShardWatcher, diff_records
+
+
+def test_diff_records_keeps_unchanged_dicts():
+    a, b, c = {"id": 1, "v": 1}, {"id": 2, "v": 2}, {"id": 3, "v": 3}
+    records, changes = diff_records("id", [a, b, c], [dict(a), {"id": 2, "v": 20}, {"id": 4, "v": 4}])
+    assert records[0] is a
+    assert [r["id"] for r in records] == [1, 2, 4]
+    assert changes == [(b, {"id": 2, "v": 20}), (c, None), (None, {"id": 4, "v": 4})]
+    assert diff_records("id", [a], [dict(a)]) == ([a], [])
+
+
+def test_poll_reports_external_edits_only(shard_root):
+    store = ShardedStore(shard_root)
+    watcher = ShardWatcher(store, interval=0)
+    watcher.note(DEFAULT_WARD, ["billing"])
+    bills = store.load_collections(DEFAULT_WARD, ["billing"], track=True)["billing"]
+
+    store.save_ward(DEFAULT_WARD, {"billing": bills[1:]})
+    watcher.note(DEFAULT_WARD, ["billing"])  # our own write
+    assert watcher.poll(DEFAULT_WARD, ["billing"]) == {}
+
+    path = store._collection_path(DEFAULT_WARD, "billing")
+    with open(path, "w") as f:
+        json.dump(bills, f)
+    assert watcher.poll(DEFAULT_WARD, ["billing"]) == {"billing": bills}
+    assert watcher.poll(DEFAULT_WARD, ["billing"]) == {}
+
+
+def test_a_merged_save_is_read_back(shard_root):
+    app, job = ShardedStore(shard_root), ShardedStore(shard_root)
+    watcher = ShardWatcher(app, interval=0)
+    bills = app.load_collections(DEFAULT_WARD, ["billing"], track=True)["billing"]
+    watcher.note(DEFAULT_WARD, ["billing"])
+    theirs = job.load_collections(DEFAULT_WARD, ["billing"], track=True)["billing"]
+    job.save_ward(DEFAULT_WARD, {"billing": theirs + [{"bill_id": 900, "patient_id": 1, "amount": 1.0}]})
+
+    app.save_ward(DEFAULT_WARD, {"billing": bills + [{"bill_id": 901, "patient_id": 1, "amount": 2.0}]})
+    watcher.note(DEFAULT_WARD, ["billing"])
+    assert app.diverged(DEFAULT_WARD, "billing")
+    reloaded = watcher.poll(DEFAULT_WARD, ["billing"])["billing"]
+    assert {900, 901} <= {b["bill_id"] for b in reloaded}
+    assert not app.diverged(DEFAULT_WARD, "billing")
@@ -0,0 +1,37 @@
+from poms.workload import DoctorWorkload
+
+DATA = {
+    "patients": [{"patient_id": 1, "doctor_id": 1, "status": "Admitted"},
+                 {"patient_id": 2, "doctor_id": 1, "status": "Discharged"}],
+    "appointments": [{"appointment_id": 1, "doctor_id": 1, "date": "2026-10-01"},
+                     {"appointment_id": 2, "doctor_id": 1, "date": "2026-10-19"},
+                     {"appointment_id": 3, "doctor_id": 1, "date": "2026-11-02"}],
+    "treatment_plans": [{"plan_id": 1, "doctor_id": 1, "start_date": "2026-10-01", "end_date": "2026-10-10"},
+                        {"plan_id": 2, "doctor_id": 1, "start_date": "2026-10-15", "end_date": None},
+                        {"plan_id": 3, "doctor_id": 1, "start_date": "2026-11-01", "end_date": "2026-11-30"}],
+    "billing": [{"bill_id": 1, "patient_id": 1, "amount": 100.0}, {"bill_id": 2, "patient_id": 2, "amount": 50.0}],
+}
+
+
+def test_date_counts_are_bisected_at_read_time():
+    workload = DoctorWorkload(DATA)
+    assert workload.row(1, "2026-10-19") == {"active_patients": 1, "upcoming_appointments": 2, "active_plans": 1,
+                                             "billed": 150.0}
+    assert workload.row(1, "2026-10-05")["active_plans"] == 1  # plan 1 only
+    assert workload.row(1, "2026-11-15") == {"active_patients": 1, "upcoming_appointments": 0, "active_plans": 2,
+                                             "billed": 150.0}
+
+
+def test_deltas_match_a_rebuild_and_reassignment_moves_revenue():
+    workload = DoctorWorkload(DATA)
+    moved = dict(DATA["patients"][0], doctor_id=2)
+    workload.update("patients", DATA["patients"][0], moved)
+    workload.remove("appointments", DATA["appointments"][2])
+    workload.add("billing", {"bill_id": 3, "patient_id": 1, "amount": 25.0})
+
+    rebuilt = DoctorWorkload(dict(DATA, patients=[moved, DATA["patients"][1]], appointments=DATA["appointments"][:2],
+                                  billing=DATA["billing"] + [{"bill_id": 3, "patient_id": 1, "amount": 25.0}]))
+    for doctor_id in (1, 2):
+        assert workload.row(doctor_id, "2026-10-19") == rebuilt.row(doctor_id, "2026-10-19")
+    assert workload.row(2, "2026-10-19")["billed"] == 125.0 and workload.row(1, "2026-10-19")["billed"] == 50.0
+    assert workload.least_loaded([1, 2], "2026-10-19") == 1  # its only admitted patient moved to doctor 2